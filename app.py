@@ -1,9 +1,12 @@
 import time
+import uuid
 import streamlit as st
-from modules.models import create_llama3_model, create_nova_model
-from modules.vectorstore import load_vector_store
-from modules.qa_chain import get_response_with_prompt
-from modules.ui import inject_global_styles, render_header, render_footer, sidebar_controls
+from modules.pipeline import registry
+from modules.qa_chain import stream_response_with_prompt
+from modules.ui import (
+    inject_global_styles, render_header, render_footer, sidebar_controls, render_trace_panel, render_router_stats,
+    MODEL_NAMES,
+)
 from modules.ui_texts import TEXTS
 
 st.set_page_config(page_title=TEXTS["app_title"], page_icon=TEXTS["page_icon"], layout="wide")
@@ -12,79 +15,90 @@ inject_global_styles()
 render_header()
 
 # Sidebar config
-max_tokens, temperature, cleared_chat = sidebar_controls()
+selected_model, max_tokens, temperature, cleared_chat, show_traces = sidebar_controls()
 
 # Session state
 if "messages" not in st.session_state:
     st.session_state.messages = []
-if "selected_model" not in st.session_state:
-    st.session_state.selected_model = None
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 if cleared_chat:
     st.session_state.messages = []
+    st.session_state.session_id = uuid.uuid4().hex  # fresh conversation memory
     st.rerun()
 
-# Vector store
-vector_store = load_vector_store()
-
-# Model picker
-st.markdown(f"### {TEXTS['choose_model']}")
-col_a, col_b = st.columns(2)
-with col_a:
-    if st.button(TEXTS["model_llama"]):
-        st.session_state.selected_model = "llama3"
-with col_b:
-    if st.button(TEXTS["model_nova"]):
-        st.session_state.selected_model = "nova"
-
-selected_model = st.session_state.selected_model
-if selected_model:
-    model_name = TEXTS["active_llama"] if selected_model == "llama3" else TEXTS["active_nova"]
-    st.success(f"✅ Active model: {model_name}")
-else:
-    st.info(TEXTS["select_model_tip"])
+# Pipelines (model client + vector store + chain) are built once per process
+@st.cache_resource(show_spinner=False)
+def get_pipeline(model: str, max_tokens: int, temperature: float):
+    return registry.get(model, max_tokens, temperature)
+
+# "auto" routes each question to Llama 3 or Nova Pro (modules/router.py)
+model_name = TEXTS[MODEL_NAMES[selected_model]]
+st.success(f"✅ Active model: {model_name}")
 
 # Show chat history
 for msg in st.session_state.messages:
     with st.chat_message(msg["role"], avatar="👩🏻‍💻" if msg["role"] == "user" else "🟧"):
         st.markdown(msg["content"])
 
-def stream_text(text: str):
-    container = st.empty()
-    typed = ""
-    for ch in text:
-        typed += ch
-        container.markdown(typed)
-        time.sleep(0.006)
+STREAM_RENDER_INTERVAL_S = 0.05  # re-render markdown at most ~20×/s while tokens arrive
+
+def render_stream(events, container, waiting_text: str):
+    """Render pipeline events into `container` in throttled chunks; returns the final result."""
+    container.markdown(waiting_text)
+    typed, last_render, result = "", 0.0, {}
+    for kind, payload in events:
+        if kind == "token":
+            typed += payload
+            now = time.monotonic()
+            if now - last_render >= STREAM_RENDER_INTERVAL_S:
+                container.markdown(typed + "▌")
+                last_render = now
+        elif kind == "reset":
+            typed = ""
+            container.markdown(TEXTS["escalate_text"] if payload == "escalate" else TEXTS["fallback_text"])
+        elif kind == "done":
+            result = payload
+    return result
 
 # Chat box
 prompt = st.chat_input(TEXTS["chat_placeholder"])
 
-if prompt and selected_model:
+if prompt:
     st.session_state.messages.append({"role": "user", "content": prompt})
     with st.chat_message("user", avatar="👩🏻‍💻"):
         st.markdown(prompt)
 
-    with st.spinner(f"🟧 {model_name} {TEXTS['processing_text']}"):
+    with st.chat_message("assistant", avatar="🟧"):
+        container = st.empty()
         try:
-            llm = (
-                create_llama3_model(max_tokens=max_tokens, temperature=temperature)
-                if selected_model == "llama3"
-                else create_nova_model(max_tokens=max_tokens, temperature=temperature)
+            pipeline = get_pipeline(selected_model, max_tokens, temperature)
+            events = stream_response_with_prompt(
+                pipeline.llm, pipeline.vector_store, prompt, session_id=st.session_state.session_id
             )
-            result = get_response_with_prompt(llm, vector_store, prompt)
-            answer = result.get("answer", TEXTS["no_response"])
+            result = render_stream(events, container, f"🟧 {model_name} {TEXTS['processing_text']}")
+            answer = result.get("answer") or TEXTS["no_response"]
             sources = result.get("sources", [])
+            trace_id = result.get("trace_id")
+            route = result.get("route")
         except Exception as e:
             answer = f"{TEXTS['error_prefix']} {e}"
             sources = []
-
-    reply = answer
-    if sources:
-        reply += "\n\n---\n" + TEXTS["sources_heading"] + "\n" + "\n".join([f"- {s}" for s in sources])
+            trace_id = None
+            route = None
+
+        reply = answer
+        if route:
+            reply += f"\n\n_{TEXTS['answered_by']} {TEXTS[MODEL_NAMES[route]]} ({result.get('route_reason', '')})_"
+        if sources:
+            reply += "\n\n---\n" + TEXTS["sources_heading"] + "\n" + "\n".join([f"- {s}" for s in sources])
+        container.markdown(reply)
+        if show_traces:
+            render_trace_panel(trace_id)
+            if selected_model == "auto":
+                render_router_stats(get_pipeline(selected_model, max_tokens, temperature).llm.stats)
 
     st.session_state.messages.append({"role": "assistant", "content": reply})
-    with st.chat_message("assistant", avatar="🟧"):
-        stream_text(reply)
 
 render_footer()
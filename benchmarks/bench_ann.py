@@ -0,0 +1,84 @@
+"""
+Recall vs. latency of the ANN index against exact search on the live collection.
+Query vectors are stored embeddings with a little Gaussian noise, so no Bedrock
+calls are needed; exact top-k is the ground truth.
+
+    python -m benchmarks.bench_ann [--queries 200] [--k 3] [--ef 10 20 40 80 160]
+"""
+
+import sys
+import time
+import random
+import argparse
+import statistics
+from sqlalchemy import text
+from modules.ann_index import ANN_INDEX, EMBEDDING_TABLE, collection_uuid
+from modules.db import get_engine
+from modules.retrieval import VectorRetriever
+from modules.tracing import percentile
+from modules.vectorstore import COLLECTION_NAME
+
+
+class _Store:
+    """Just enough of a vector store for VectorRetriever (queries are passed as vectors)."""
+    collection_name = COLLECTION_NAME
+    embeddings = None
+
+
+def _sample_queries(n, noise, seed):
+    with get_engine().connect() as conn:
+        uuid = collection_uuid(conn, COLLECTION_NAME)
+        if uuid is None:
+            raise SystemExit(f"Collection '{COLLECTION_NAME}' not found — run build_index.py first.")
+        rows = conn.execute(
+            text(f"SELECT embedding::text FROM {EMBEDDING_TABLE} WHERE collection_id = :u ORDER BY random() LIMIT :n"),
+            {"u": uuid, "n": n},
+        ).all()
+    rng = random.Random(seed)
+    return [[float(x) + rng.gauss(0, noise) for x in row[0].strip("[]").split(",")] for row in rows]
+
+
+def _run(retriever, queries, k, exact=False):
+    latencies, results = [], []
+    for vector in queries:
+        t0 = time.perf_counter()
+        scored = retriever.search("", vector=vector, k=k, exact=exact)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        results.append([doc.page_content for doc, _ in scored])
+    return latencies, results
+
+
+def _recall(truth, found):
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / max(1, sum(len(t) for t in truth))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--noise", type=float, default=0.01, help="stddev added to each sampled embedding")
+    parser.add_argument("--ef", type=int, nargs="+", default=[10, 20, 40, 80, 160], help="hnsw.ef_search values")
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 5, 10, 20, 50], help="ivfflat.probes values")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    queries = _sample_queries(args.queries, args.noise, args.seed)
+    print(f"{len(queries)} queries, k={args.k}, index={ANN_INDEX}")
+    exact_ms, truth = _run(VectorRetriever(_Store()), queries, args.k, exact=True)
+
+    print(f"{'setting':>18} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    print(f"{'exact':>18} {1.0:9.3f} {statistics.median(exact_ms):8.2f} {percentile(sorted(exact_ms), 0.95):8.2f}")
+    if ANN_INDEX == "hnsw":
+        settings = [(f"ef_search={ef}", VectorRetriever(_Store(), ef_search=ef)) for ef in args.ef]
+    elif ANN_INDEX == "ivfflat":
+        settings = [(f"probes={p}", VectorRetriever(_Store(), probes=p)) for p in args.probes]
+    else:
+        settings = []
+    for label, retriever in settings:
+        ms, found = _run(retriever, queries, args.k)
+        print(f"{label:>18} {_recall(truth, found):9.3f} {statistics.median(ms):8.2f} {percentile(sorted(ms), 0.95):8.2f}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""
+Benchmark AWS Docs text extraction on saved pages: the original
+html.parser + find_all(["p", "li", "div"]) approach vs. extract_page_text().
+
+    python -m benchmarks.bench_extraction saved_pages/*.html [--repeat 5]
+"""
+
+import sys
+import time
+import argparse
+import statistics
+import tracemalloc
+from bs4 import BeautifulSoup
+from modules.web_search import extract_page_text, HTML_PARSER
+
+
+def legacy_extract(html):
+    soup = BeautifulSoup(html, "html.parser")
+    elements = soup.find_all(["p", "li", "div"])
+    content = " ".join(el.get_text(" ", strip=True) for el in elements)
+    return content[:6000]
+
+
+def measure(fn, html, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(html)
+        times.append((time.perf_counter() - t0) * 1000)
+    tracemalloc.start()
+    fn(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(times), peak / 1024, len(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pages", nargs="+", help="saved HTML files")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"parser backend: {HTML_PARSER}")
+    print(f"{'page':40} {'legacy ms':>10} {'new ms':>8} {'legacy KiB':>11} {'new KiB':>8} {'chars':>11}")
+    totals = [0.0, 0.0, 0.0, 0.0]
+    for path in args.pages:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            html = f.read()
+        old_ms, old_kb, old_len = measure(legacy_extract, html, args.repeat)
+        new_ms, new_kb, new_len = measure(extract_page_text, html, args.repeat)
+        for i, v in enumerate((old_ms, new_ms, old_kb, new_kb)):
+            totals[i] += v
+        print(f"{path[-40:]:40} {old_ms:10.1f} {new_ms:8.1f} {old_kb:11.0f} {new_kb:8.0f} {old_len:>5}/{new_len:<5}")
+    n = len(args.pages)
+    print(f"{'mean':40} {totals[0]/n:10.1f} {totals[1]/n:8.1f} {totals[2]/n:11.0f} {totals[3]/n:8.0f}")
+    print(f"speedup ×{totals[0] / max(totals[1], 1e-9):.1f}, peak memory ×{totals[2] / max(totals[3], 1e-9):.1f} lower")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,467 @@
+"""
+End-to-end offline benchmark: ingestion and question answering with local stand-ins
+for Bedrock, SerpAPI, AWS Docs and Groq (see `benchmarks.fakes`). No AWS credentials,
+API keys, Postgres or network access are needed.
+
+    python -m benchmarks.bench_pipeline [--docs 24] [--queries 120] [--concurrency 4] [--json out.json]
+
+1. Ingestion: synthetic PDFs (or `--data DIR`) stream through `data_ingestion()` and
+   `create_vector_store()` with fake Titan embeddings behind `ConcurrentEmbeddings`,
+   and are exported as a local (numpy / faiss) vector index.
+2. Queries: the question set is replayed through `get_response_with_prompt()` over that
+   index with a fake chat model; the web fallback is served from recorded pages
+   (`--web-pages DIR`, see `--record`) or synthetic ones. Chat history lives in SQLite.
+   A `QueryService` batch then runs while every worker slot is held (`--service-batch`);
+   any failed batch record makes the run exit with status 1.
+3. Allocations: a separate tracemalloc pass over a few files / queries, so the timed
+   runs are not slowed by tracing.
+
+Latencies of every stand-in are flags (`--embed-ms`, `--llm-ttft-ms`, ...); set them to
+0 to measure pure CPU overhead. Reports throughput, p50/p95/p99 per request and per
+pipeline stage (from `modules.tracing`), counters, and allocation peaks.
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import resource
+import tracemalloc
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from benchmarks import corpus
+
+
+def _configure_env(args, workdir):
+    """Point every external dependency at local files; must run before `modules` is imported."""
+    os.environ["PG_CONNECTION_STRING"] = f"sqlite:///{os.path.join(workdir, 'bench.sqlite')}"
+    os.environ["SERPAPI_API_KEY"] = "offline"
+    os.environ["GROQ_API_KEY"] = "offline"
+    os.environ["WEB_CACHE_PATH"] = os.path.join(workdir, "web.sqlite") if args.web_cache else ""
+    os.environ["EMBED_CACHE_PATH"] = ""
+    os.environ["ANSWER_CACHE_ENABLED"] = "true" if args.answer_cache else "false"
+    os.environ["VECTOR_BACKEND"] = args.backend
+    os.environ["LOCAL_INDEX_PATH"] = os.path.join(workdir, "local_index")
+    os.environ["EMBED_DIM"] = str(args.dim)
+    os.environ["EMBED_QUANTIZATION"] = args.quantization
+    os.environ["TRACE_BUFFER"] = str(4 * (args.queries * args.spike + args.warmup) + 100)
+    os.environ.setdefault("AWS_EC2_METADATA_DISABLED", "true")  # no credential probing at client creation
+
+
+def _latency(values) -> dict:
+    from modules.tracing import percentile  # after _configure_env: tracing reads TRACE_BUFFER at import
+
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 0.50) or 0.0, 1),
+        "p95_ms": round(percentile(values, 0.95) or 0.0, 1),
+        "p99_ms": round(percentile(values, 0.99) or 0.0, 1),
+        "max_ms": round(values[-1] if values else 0.0, 1),
+    }
+
+
+@contextlib.contextmanager
+def _quiet(enabled):
+    """The pipeline logs every step; keep the report readable unless --verbose."""
+    if not enabled:
+        yield
+        return
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def _peak_rss_mib() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class _ExportStore:
+    """`create_vector_store` target: embeds each batch and keeps the rows for a local index export."""
+
+    def __init__(self, embeddings, keep: bool = True):
+        self.embeddings = embeddings
+        self.keep = keep
+        self.rows = []
+        self.pages = set()
+
+    def add_documents(self, docs):
+        vectors = self.embeddings.embed_documents([d.page_content for d in docs])
+        for doc, vector in zip(docs, vectors):
+            self.pages.add((doc.metadata.get("source"), doc.metadata.get("page")))
+            if self.keep:
+                self.rows.append((doc, vector))
+
+    def export(self, path, backend, collection, quantization="none"):
+        from modules.local_index import LocalIndexWriter
+
+        writer = LocalIndexWriter(path, len(self.rows), len(self.rows[0][1]) if self.rows else 0)
+        for doc, vector in self.rows:
+            custom_id = hashlib.sha256(f"{doc.metadata.get('source')}\0{doc.page_content}".encode("utf-8")).hexdigest()
+            writer.add(custom_id, doc.page_content, doc.metadata, vector)
+        return writer.close(backend=backend, quantization=quantization, collection=collection, index_version=1)
+
+
+def _alloc_pass(fn, items, top: int):
+    """tracemalloc peak / retained bytes over `fn(item)` for each item, plus the top allocation sites."""
+    gc.collect()
+    tracemalloc.start(8)
+    before = tracemalloc.take_snapshot()
+    base, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    for item in items:
+        fn(item)
+    current, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    sites = [
+        {"site": str(stat.traceback[0]), "kib": round(stat.size_diff / 1024, 1), "blocks": stat.count_diff}
+        for stat in after.compare_to(before, "lineno")[:top]
+    ]
+    n = max(1, len(items))
+    return {
+        "items": len(items),
+        "peak_kib": round((peak - base) / 1024, 1),
+        "retained_kib": round((current - base) / 1024, 1),
+        "retained_kib_per_item": round((current - base) / 1024 / n, 1),
+        "top_sites": sites,
+    }
+
+
+# ------------------------------
+# 📥 Ingestion
+# ------------------------------
+def bench_ingestion(args, data_dir, index_path):
+    from modules.embeddings import ConcurrentEmbeddings
+    from modules.vectorstore import data_ingestion, create_vector_store, COLLECTION_NAME
+    from benchmarks.fakes import FakeEmbeddings
+
+    fake = FakeEmbeddings(dim=args.dim, latency_ms=args.embed_ms, seed=args.seed)
+    embeddings = ConcurrentEmbeddings(fake, max_concurrency=args.embed_concurrency)
+    store = _ExportStore(embeddings)
+    t0 = time.perf_counter()
+    create_vector_store(data_ingestion(data_dir), batch_size=args.batch, store=store)
+    ingest_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    info = store.export(index_path, args.backend, COLLECTION_NAME, args.quantization)
+    export_s = time.perf_counter() - t0
+
+    files = sorted({source for source, _ in store.pages})
+    report = {
+        "files": len(files),
+        "pages": len(store.pages),
+        "chunks": len(store.rows),
+        "seconds": round(ingest_s, 2),
+        "chunks_per_s": round(len(store.rows) / ingest_s, 1) if ingest_s else 0.0,
+        "pages_per_s": round(len(store.pages) / ingest_s, 1) if ingest_s else 0.0,
+        "export_s": round(export_s, 2),
+        "index_backend": info["backend"],
+        "embed_calls": fake.calls,
+    }
+    del store
+    if args.alloc_files:
+        from modules.ingest import iter_pdf_chunks
+        from modules.vectorstore import CHUNK_SIZE, CHUNK_OVERLAP
+
+        def ingest_file(path):
+            chunks = (c for page in iter_pdf_chunks(path, CHUNK_SIZE, CHUNK_OVERLAP) for c in page)
+            create_vector_store(chunks, batch_size=args.batch, store=_ExportStore(embeddings, keep=False))
+
+        report["alloc"] = _alloc_pass(ingest_file, files[:args.alloc_files], args.alloc_top)
+    return report
+
+
+# ------------------------------
+# 💬 Queries
+# ------------------------------
+def _sessions(questions, turns):
+    """Group questions into conversations of `turns` questions (run in order within a session)."""
+    turns = max(1, turns)
+    return [(f"bench-{i // turns}", questions[i:i + turns]) for i in range(0, len(questions), turns)]
+
+
+def _stage_latencies(records) -> dict:
+    durations = {}
+    for record in records:
+        durations.setdefault(record["name"], []).append(record["duration_ms"])
+        for s in record["spans"]:
+            durations.setdefault(s["name"], []).append(s["duration_ms"])
+            if "ttft_ms" in s["attrs"]:
+                durations.setdefault(f"{s['name']}.ttft", []).append(s["attrs"]["ttft_ms"])
+    return {name: _latency(values) for name, values in sorted(durations.items())}
+
+
+def _service_pass(args, llm, store, questions):
+    """
+    A JSONL batch through `QueryService` while `/query`-style callers hold every worker
+    slot: batch records must wait for a slot, never fail for lack of one.
+    """
+    from types import SimpleNamespace
+    from modules.service import QueryService, QueryRequest
+
+    pipeline = SimpleNamespace(llm=llm, vector_store=store)
+    service = QueryService(max_concurrency=args.concurrency,
+                           registry=SimpleNamespace(get=lambda *settings: pipeline, stats={}))
+    with ThreadPoolExecutor(max_workers=args.concurrency) as holders:
+        held = [holders.submit(service.answer, QueryRequest(q)) for q in questions[:args.concurrency]]
+        while service.in_flight < service.max_concurrency and not all(f.done() for f in held):
+            time.sleep(0.001)
+        saturated = service.in_flight == service.max_concurrency
+        t0 = time.perf_counter()
+        results = list(service.run_batch(questions[:args.service_batch]))
+        wall = time.perf_counter() - t0
+    errors = [r["error"] for r in results if "error" in r]
+    return {
+        "records": len(results),
+        "saturated": saturated,
+        "seconds": round(wall, 2),
+        "failures": len(errors),
+        "errors": errors[:3],
+        "latency": _latency([r["latency_ms"] for r in results if "latency_ms" in r]),
+        "service": service.stats,
+    }
+
+
+def bench_queries(args, pages_dir, index_path):
+    from modules import tracing, web_search, qa_chain
+    from modules.config import MEMORY_SUMMARIZE_EVERY, MEMORY_KEEP_RECENT_TURNS, COALESCE_INFLIGHT
+    from modules.db import get_engine
+    from modules.embeddings import CachedEmbeddings
+    from modules.local_index import LocalVectorStore
+    from modules.memory import SessionMemoryStore
+    from modules.vectorstore import COLLECTION_NAME
+    from benchmarks.fakes import FakeEmbeddings, FakeChatModel, RecordedWebAdapter, load_pages
+
+    fake = FakeEmbeddings(dim=args.dim, latency_ms=args.embed_ms, seed=args.seed)
+    store = LocalVectorStore(index_path, CachedEmbeddings(fake, coalesce=COALESCE_INFLIGHT), COLLECTION_NAME, backend=args.backend)
+    llm = FakeChatModel(model_id=args.model_id, max_tokens=1024, ttft_ms=args.llm_ttft_ms,
+                        token_ms=args.llm_token_ms, answer_words=args.answer_words)
+    summary_llm = FakeChatModel(model_id=args.model_id, max_tokens=256, ttft_ms=args.llm_ttft_ms,
+                                token_ms=args.llm_token_ms)
+    answer_llm, nova = llm, None
+    if args.route:
+        from modules.router import ModelRouter
+
+        nova = FakeChatModel(model_id="fake-nova", max_tokens=1024, ttft_ms=args.nova_ttft_ms,
+                             token_ms=args.nova_token_ms, answer_words=args.answer_words)
+        answer_llm = ModelRouter({"llama3": llm, "nova": nova})
+    qa_chain.get_session_memories.override(SessionMemoryStore(
+        get_engine(), summary_llm, summarize_every=MEMORY_SUMMARIZE_EVERY, keep_recent=MEMORY_KEEP_RECENT_TURNS
+    ))
+    web = RecordedWebAdapter(load_pages(pages_dir), serp_ms=args.serp_ms, page_ms=args.page_ms, groq_ms=args.groq_ms)
+    web_search.session.mount("https://", web)
+    web_search.session.mount("http://", web)
+
+    questions = corpus.questions(args.queries, seed=args.seed, web_fraction=args.web_fraction,
+                                 off_topic_fraction=args.off_topic_fraction)
+    if args.spike > 1:
+        # Incident spike: every question asked by `spike` users at once
+        questions = [q for q in questions for _ in range(args.spike)]
+    warmup = corpus.questions(args.warmup, seed=args.seed + 1)
+
+    def run_session(session):
+        session_id, turns = session
+        out = []
+        for question in turns:
+            t0 = time.perf_counter()
+            try:
+                result = qa_chain.get_response_with_prompt(answer_llm, store, question, session_id=session_id)
+                ok = bool(result.get("answer"))
+            except Exception as e:
+                print(f"❌ {question!r}: {e}", file=sys.stderr)
+                ok = False
+            out.append(((time.perf_counter() - t0) * 1000, ok))
+        return out
+
+    for session in _sessions(warmup, 1):
+        run_session((f"warmup-{session[0]}", session[1]))
+
+    started = time.time()
+    latencies, failures = [], 0
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [pool.submit(run_session, s) for s in _sessions(questions, args.turns)]
+        for future in as_completed(futures):
+            for ms, ok in future.result():
+                latencies.append(ms)
+                failures += not ok
+    wall = time.perf_counter() - t0
+
+    records = [r for r in tracing.recent_traces(tracing.TRACE_BUFFER) if r["start"] >= started]
+    gate = qa_chain.retrieval_gate
+    report = {
+        "queries": len(latencies),
+        "concurrency": args.concurrency,
+        "turns_per_session": args.turns,
+        "seconds": round(wall, 2),
+        "throughput_qps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "failures": failures,
+        "latency": _latency(latencies),
+        "stages": _stage_latencies(records),
+        "counters": {
+            "embed_calls": fake.calls,
+            "llm_calls": llm.calls + (nova.calls if nova else 0),
+            "summary_calls": summary_llm.calls,
+            "web_requests": dict(web.requests),
+            "web_cache": web_search.cache_stats(),
+            "coalesced_answers": qa_chain.inflight_answers.stats["coalesced"],
+            "gate_insufficient": f"{gate.insufficient}/{gate.decisions}",
+        },
+    }
+    if nova is not None:
+        report["counters"]["routes"] = answer_llm.stats
+    retriever = qa_chain.get_qa_chain(answer_llm, store).retriever
+    if hasattr(retriever, "stats"):
+        report["counters"]["retriever"] = retriever.stats
+    if args.service_batch:
+        report["service"] = _service_pass(args, answer_llm, store, questions)
+    if args.alloc_queries:
+        sessions = _sessions(questions[:args.alloc_queries], 1)
+        report["alloc"] = _alloc_pass(run_session, [(f"alloc-{s}", q) for s, q in sessions], args.alloc_top)
+    return report
+
+
+# ------------------------------
+# 🧾 Report
+# ------------------------------
+def _print_latency_table(rows):
+    print(f"  {'stage':24} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, s in rows.items():
+        print(f"  {name:24} {s['count']:6} {s['p50_ms']:9.1f} {s['p95_ms']:9.1f} {s['p99_ms']:9.1f} {s['max_ms']:9.1f}")
+
+
+def _print_alloc(alloc):
+    print(f"  allocations over {alloc['items']} item(s): peak {alloc['peak_kib']:.0f} KiB, "
+          f"retained {alloc['retained_kib']:.0f} KiB ({alloc['retained_kib_per_item']:.1f} KiB/item)")
+    for site in alloc["top_sites"]:
+        print(f"    {site['kib']:9.1f} KiB {site['blocks']:7} blocks  {site['site']}")
+
+
+def print_report(report):
+    ingest = report.get("ingestion")
+    if ingest:
+        print(f"\n📥 Ingestion: {ingest['files']} files, {ingest['pages']} pages, {ingest['chunks']} chunks "
+              f"in {ingest['seconds']:.2f}s → {ingest['chunks_per_s']:.1f} chunks/s, {ingest['pages_per_s']:.1f} pages/s; "
+              f"export {ingest['export_s']:.2f}s ({ingest['index_backend']})")
+        if "alloc" in ingest:
+            _print_alloc(ingest["alloc"])
+    q = report["queries"]
+    lat = q["latency"]
+    print(f"\n💬 Queries: {q['queries']} in {q['seconds']:.2f}s at concurrency {q['concurrency']} → "
+          f"{q['throughput_qps']:.2f} q/s, {q['failures']} failed")
+    print(f"  request latency p50 {lat['p50_ms']:.1f} / p95 {lat['p95_ms']:.1f} / p99 {lat['p99_ms']:.1f} ms")
+    _print_latency_table(q["stages"])
+    print("  counters: " + json.dumps(q["counters"], default=str))
+    service = q.get("service")
+    if service:
+        print(f"  service batch: {service['records']} records in {service['seconds']:.2f}s "
+              f"{'behind saturated slots' if service['saturated'] else '(slots were not saturated)'}, "
+              f"{service['failures']} failed, p95 {service['latency']['p95_ms']:.1f} ms")
+        for error in service["errors"]:
+            print(f"    ❌ {error}")
+    if "alloc" in q:
+        _print_alloc(q["alloc"])
+    print(f"\n💾 peak RSS {report['peak_rss_mib']:.0f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    corpus_args = parser.add_argument_group("corpus")
+    corpus_args.add_argument("--data", help="directory of PDFs (default: synthetic corpus)")
+    corpus_args.add_argument("--docs", type=int, default=24, help="synthetic PDFs")
+    corpus_args.add_argument("--pages", type=int, default=8, help="pages per synthetic PDF")
+    corpus_args.add_argument("--web-pages", dest="pages_dir", help="recorded AWS Docs pages (default: synthetic)")
+    corpus_args.add_argument("--record", nargs="+", metavar="URL", help="save live pages into --web-pages and exit")
+    corpus_args.add_argument("--seed", type=int, default=0)
+
+    load = parser.add_argument_group("load")
+    load.add_argument("--queries", type=int, default=120)
+    load.add_argument("--warmup", type=int, default=5)
+    load.add_argument("--concurrency", type=int, default=4)
+    load.add_argument("--turns", type=int, default=1, help="questions per conversation (>1 exercises memory)")
+    load.add_argument("--web-fraction", type=float, default=0.1, help="questions that force the web fallback")
+    load.add_argument("--off-topic-fraction", type=float, default=0.05)
+    load.add_argument("--spike", type=int, default=1, help="concurrent askers per question (identical in-flight requests)")
+    load.add_argument("--service-batch", type=int, default=16,
+                      help="QueryService batch run while every worker slot is held (0 = skip)")
+    load.add_argument("--skip-ingestion", action="store_true", help="reuse the index in --workdir")
+
+    fakes = parser.add_argument_group("stand-in latency (ms)")
+    fakes.add_argument("--embed-ms", type=float, default=25)
+    fakes.add_argument("--llm-ttft-ms", type=float, default=250)
+    fakes.add_argument("--llm-token-ms", type=float, default=4)
+    fakes.add_argument("--nova-ttft-ms", type=float, default=700, help="with --route")
+    fakes.add_argument("--nova-token-ms", type=float, default=8, help="with --route")
+    fakes.add_argument("--serp-ms", type=float, default=400)
+    fakes.add_argument("--page-ms", type=float, default=150)
+    fakes.add_argument("--groq-ms", type=float, default=600)
+
+    pipeline = parser.add_argument_group("pipeline")
+    pipeline.add_argument("--backend", choices=("numpy", "faiss"), default="numpy")
+    pipeline.add_argument("--dim", type=int, choices=(256, 512, 1024), default=1024)
+    pipeline.add_argument("--quantization", choices=("none", "int8", "binary"), default="none",
+                          help="search codes in the local export (rescored at full precision)")
+    pipeline.add_argument("--batch", type=int, default=64, help="chunks per embedding batch")
+    pipeline.add_argument("--embed-concurrency", type=int, default=16)
+    pipeline.add_argument("--model-id", default="fake-llama3", help="selects the context budget family")
+    pipeline.add_argument("--answer-words", type=int, default=80)
+    pipeline.add_argument("--route", action="store_true",
+                          help="answer through the \"auto\" ModelRouter (fake Nova Pro for hard questions)")
+    pipeline.add_argument("--answer-cache", action="store_true", help="enable the semantic answer cache")
+    pipeline.add_argument("--no-web-cache", dest="web_cache", action="store_false")
+
+    output = parser.add_argument_group("output")
+    output.add_argument("--alloc-files", type=int, default=2, help="PDFs in the allocation pass (0 = skip)")
+    output.add_argument("--alloc-queries", type=int, default=20, help="queries in the allocation pass (0 = skip)")
+    output.add_argument("--alloc-top", type=int, default=8, help="allocation sites to list")
+    output.add_argument("--json", help="also write the report here")
+    output.add_argument("--workdir", help="keep corpus, index and caches here (default: a temp dir)")
+    output.add_argument("--verbose", action="store_true", help="show the pipeline's own logging")
+    args = parser.parse_args()
+
+    if args.record:
+        if not args.pages_dir:
+            parser.error("--record needs --web-pages DIR")
+        from benchmarks.fakes import record_pages
+
+        record_pages(args.record, args.pages_dir)
+        return 0
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="rag-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    _configure_env(args, workdir)
+    index_path = os.path.join(workdir, "local_index")
+    report = {"args": vars(args)}
+    try:
+        data_dir = args.data
+        if not data_dir:
+            data_dir = os.path.join(workdir, "data")
+            if not args.skip_ingestion:
+                corpus.write_pdf_corpus(data_dir, args.docs, args.pages, seed=args.seed)
+        pages_dir = args.pages_dir
+        if not pages_dir:
+            pages_dir = os.path.join(workdir, "pages")
+            corpus.write_html_pages(pages_dir, seed=args.seed)
+
+        with _quiet(not args.verbose):
+            if not args.skip_ingestion:
+                report["ingestion"] = bench_ingestion(args, data_dir, index_path)
+            report["queries"] = bench_queries(args, pages_dir, index_path)
+        report["peak_rss_mib"] = round(_peak_rss_mib(), 1)
+        print_report(report)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2, default=str)
+            print(f"📝 Report written to {args.json}")
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return 1 if report["queries"].get("service", {}).get("failures") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
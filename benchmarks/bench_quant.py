@@ -0,0 +1,161 @@
+"""
+Recall, latency and size of reduced-dimension and quantized vectors, measured on
+local exports (modules/local_index.py); no AWS or Postgres needed.
+
+    python -m benchmarks.bench_quant [--chunks 20000] [--queries 200] [--k 5] [--rescore 10 40]
+    python -m benchmarks.bench_quant --index .cache/local_index   # real Titan vectors from an export
+
+Every (dimension, quantization, rescore candidates) variant is written as an export
+and searched with query vectors that are stored vectors plus a little noise.
+"recall" is against exact float32 search at the same dimension (the quantization
+loss), "vs full" against exact search at the largest dimension. Smaller dimensions
+are emulated by truncating and re-normalizing; Titan v2's native 256/512 outputs are
+trained for that size, so expect them to do at least as well. Without --index the
+vectors are dense synthetic clusters, which only exercise the mechanics — use a real
+export to decide on a setting. "pg B/row" is the size of one pgvector index entry
+(vector / halfvec / bit), before the HNSW graph overhead.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import numpy as np
+
+PG_ENTRY_BYTES = {
+    "none": lambda dim: 4 * dim + 8,     # vector
+    "int8": lambda dim: 2 * dim + 8,     # halfvec (pgvector has no int8 type)
+    "binary": lambda dim: dim // 8 + 8,  # bit
+}
+
+
+def _synthetic(args, rng):
+    """Clustered unit vectors at the largest dimension, with placeholder texts."""
+    dim = max(args.dims)
+    centers = rng.standard_normal((max(1, args.chunks // 50), dim)).astype(np.float32)
+    labels = rng.integers(0, len(centers), size=args.chunks)
+    vectors = centers[labels] + 0.8 * rng.standard_normal((args.chunks, dim)).astype(np.float32)
+    return vectors, [f"synthetic chunk {i}" for i in range(args.chunks)]
+
+
+def _from_export(args):
+    from modules.local_index import LocalIndex
+
+    index = LocalIndex(args.index)
+    vectors = np.array(index.vectors, dtype=np.float32)
+    texts = [index._row(i)["text"] for i in range(index.count)]
+    index.close()
+    return vectors, texts
+
+
+def _truncate(vectors, dim):
+    cut = vectors[:, :dim]
+    return cut / np.linalg.norm(cut, axis=1, keepdims=True)
+
+
+def _write_export(path, vectors, texts, quantization):
+    from modules.local_index import LocalIndexWriter
+
+    writer = LocalIndexWriter(path, len(vectors), vectors.shape[1])
+    for i, (vector, text) in enumerate(zip(vectors, texts)):
+        writer.add(str(i), text, {}, vector)
+    writer.close(backend="numpy", quantization=quantization, collection="bench")
+
+
+def _exact_top(vectors, queries, k):
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    q = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    sims = q @ unit.T
+    return [set(np.argsort(-row)[:k].tolist()) for row in sims]
+
+
+def _recall(truth, found):
+    return sum(len(t & f) for t, f in zip(truth, found)) / max(1, sum(len(t) for t in truth))
+
+
+def _run(index, queries, k):
+    latencies, found = [], []
+    for query in queries:
+        t0 = time.perf_counter()
+        hits = index.search(query, k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        found.append({int(row["id"]) for row, _ in hits})
+    return found, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", help="LocalIndex export to take real vectors from (default: synthetic)")
+    parser.add_argument("--chunks", type=int, default=20000, help="synthetic corpus size")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--dims", type=int, nargs="+", default=[1024, 512, 256])
+    parser.add_argument("--quantizations", nargs="+", choices=("none", "int8", "binary"),
+                        default=["none", "int8", "binary"])
+    parser.add_argument("--rescore", type=int, nargs="+", default=[40], help="full-precision rescoring candidates")
+    parser.add_argument("--noise", type=float, default=0.01, help="stddev added to each sampled query vector")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results here")
+    args = parser.parse_args()
+
+    from modules.local_index import LocalIndex
+    from modules.tracing import percentile
+
+    rng = np.random.default_rng(args.seed)
+    vectors, texts = _from_export(args) if args.index else _synthetic(args, rng)
+    dims = sorted({d for d in args.dims if d <= vectors.shape[1]}, reverse=True)
+    if not dims:
+        raise SystemExit(f"No dimension in {args.dims} fits the {vectors.shape[1]}-dim vectors.")
+    picks = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    queries = vectors[picks] + rng.normal(0, args.noise, size=(len(picks), vectors.shape[1])).astype(np.float32)
+    full_truth = _exact_top(_truncate(vectors, dims[0]), queries[:, :dims[0]], args.k)
+    print(f"{len(texts)} vectors, {len(queries)} queries, k={args.k}")
+    print(f"{'dims':>5} {'quant':>7} {'rescore':>8} {'recall':>7} {'vs full':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'scan MiB':>9} {'disk MiB':>9} {'pg B/row':>9}")
+
+    workdir = tempfile.mkdtemp(prefix="rag-quant-")
+    results = []
+    try:
+        for dim in dims:
+            reduced, reduced_queries = _truncate(vectors, dim), queries[:, :dim]
+            truth = _exact_top(reduced, reduced_queries, args.k)
+            for quantization in args.quantizations:
+                path = os.path.join(workdir, f"{dim}-{quantization}")
+                _write_export(path, reduced, texts, quantization)
+                disk = sum(os.path.getsize(os.path.join(path, f)) for f in ("vectors.npy", "codes.npy", "scales.npy")
+                           if os.path.exists(os.path.join(path, f)))
+                for rescore in (args.rescore if quantization != "none" else [0]):
+                    index = LocalIndex(path, rescore_candidates=rescore)
+                    found, latencies = _run(index, reduced_queries, args.k)
+                    sizes = index.nbytes
+                    index.close()
+                    row = {
+                        "dims": dim,
+                        "quantization": quantization,
+                        "rescore": rescore,
+                        "recall": round(_recall(truth, found), 3),
+                        "recall_vs_full": round(_recall(full_truth, found), 3),
+                        "p50_ms": round(statistics.median(latencies), 3),
+                        "p95_ms": round(percentile(sorted(latencies), 0.95), 3),
+                        "scan_mib": round(sizes.get("codes", sizes["vectors"]) / 2 ** 20, 2),
+                        "disk_mib": round(disk / 2 ** 20, 2),
+                        "pg_bytes_per_row": PG_ENTRY_BYTES[quantization](dim),
+                    }
+                    results.append(row)
+                    print(f"{dim:5} {quantization:>7} {rescore or '-':>8} {row['recall']:7.3f} "
+                          f"{row['recall_vs_full']:8.3f} {row['p50_ms']:8.2f} {row['p95_ms']:8.2f} "
+                          f"{row['scan_mib']:9.2f} {row['disk_mib']:9.2f} {row['pg_bytes_per_row']:9}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
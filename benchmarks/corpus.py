@@ -0,0 +1,222 @@
+"""
+Synthetic AWS-flavoured corpus for offline benchmarks: PDFs for ingestion, AWS Docs
+style HTML pages for the web fallback, and a matching question set. Everything is
+derived from a seed, so two runs with the same arguments see identical inputs.
+"""
+
+import os
+import random
+
+TOPICS = {
+    "Amazon S3": {
+        "features": ["bucket policies", "S3 Object Lock", "lifecycle rules", "cross-region replication",
+                     "server-side encryption with KMS", "presigned URLs", "S3 Intelligent-Tiering"],
+        "identifiers": ["s3:PutObject", "s3:GetObject", "AccessDenied", "x-amz-server-side-encryption"],
+    },
+    "Amazon DynamoDB": {
+        "features": ["global secondary indexes", "on-demand capacity", "DynamoDB Streams",
+                     "point-in-time recovery", "adaptive capacity", "TTL attributes"],
+        "identifiers": ["ProvisionedThroughputExceededException", "dynamodb:Query", "ConsistentRead"],
+    },
+    "AWS Lambda": {
+        "features": ["provisioned concurrency", "reserved concurrency", "Lambda layers", "SnapStart",
+                     "event source mappings", "function URLs"],
+        "identifiers": ["TooManyRequestsException", "lambda:InvokeFunction", "AWS_LAMBDA_EXEC_WRAPPER"],
+    },
+    "Amazon RDS": {
+        "features": ["Multi-AZ deployments", "read replicas", "RDS Proxy", "automated backups",
+                     "Performance Insights", "parameter groups"],
+        "identifiers": ["rds:CreateDBInstance", "max_connections", "db.r6g.large"],
+    },
+    "Amazon EKS": {
+        "features": ["managed node groups", "Fargate profiles", "IAM roles for service accounts",
+                     "cluster autoscaler", "VPC CNI prefix delegation"],
+        "identifiers": ["eks:DescribeCluster", "aws-auth ConfigMap", "m5.xlarge"],
+    },
+    "AWS IAM": {
+        "features": ["permission boundaries", "service control policies", "IAM Access Analyzer",
+                     "role session tags", "least-privilege policies"],
+        "identifiers": ["sts:AssumeRole", "iam:PassRole", "aws:PrincipalOrgID"],
+    },
+    "Amazon CloudWatch": {
+        "features": ["metric alarms", "Logs Insights queries", "composite alarms", "embedded metric format",
+                     "anomaly detection"],
+        "identifiers": ["PutMetricData", "ThrottlingException", "cloudwatch:GetMetricData"],
+    },
+    "Amazon VPC": {
+        "features": ["VPC endpoints", "NAT gateways", "security groups", "network ACLs",
+                     "Transit Gateway attachments", "VPC Flow Logs"],
+        "identifiers": ["ec2:CreateVpcEndpoint", "0.0.0.0/0", "vpce-0a1b2c3d"],
+    },
+}
+
+_SENTENCES = [
+    "Use {feature} in {service} to reduce operational overhead for production workloads.",
+    "When you configure {feature}, {service} applies the change without downtime.",
+    "A common cause of {identifier} errors is a missing permission or an exhausted quota.",
+    "Monitor {feature} with Amazon CloudWatch metrics and alarm on sustained anomalies.",
+    "For multi-account environments, combine {feature} with AWS Organizations guardrails.",
+    "The {identifier} setting controls how {service} handles {feature} at scale.",
+    "Test {feature} in a staging account before enabling it for every {service} resource.",
+    "Cost scales with request volume, so right-size {feature} after observing real traffic.",
+    "Automate {feature} with AWS CloudFormation or Terraform to keep environments consistent.",
+    "Encrypt data at rest and in transit; {service} integrates with AWS KMS for key management.",
+]
+
+_QUESTIONS = [
+    "How do I configure {feature} in {service}?",
+    "What are best practices for {feature}?",
+    "Why am I getting {identifier} in {service}?",
+    "How should I monitor {feature} for {service}?",
+    "Give me a boto3 example for {feature} in {service}.",
+    "What does {identifier} mean for {feature}?",
+]
+
+_WEB_QUESTIONS = [
+    "What is the latest {service} release for {feature}?",
+    "Is the new {feature} preview available in {service}?",
+]
+
+_OFF_TOPIC = [
+    "What is a good recipe for banana bread?",
+    "Who won the football world cup in 1998?",
+]
+
+
+def _sentence(rng, service):
+    topic = TOPICS[service]
+    return rng.choice(_SENTENCES).format(
+        service=service, feature=rng.choice(topic["features"]), identifier=rng.choice(topic["identifiers"])
+    )
+
+
+def paragraphs(rng, service, count, sentences=5):
+    return [" ".join(_sentence(rng, service) for _ in range(sentences)) for _ in range(count)]
+
+
+def document_pages(rng, service, pages, paragraphs_per_page=6):
+    """[[paragraph, ...] per page] for one synthetic guide."""
+    return [paragraphs(rng, service, paragraphs_per_page) for _ in range(pages)]
+
+
+def questions(n, seed=0, web_fraction=0.1, off_topic_fraction=0.05):
+    """`n` questions: mostly answerable from the corpus, some forcing the web fallback or off topic."""
+    rng = random.Random(seed)
+    services = sorted(TOPICS)
+    out = []
+    for _ in range(n):
+        roll = rng.random()
+        if roll < off_topic_fraction:
+            out.append(rng.choice(_OFF_TOPIC))
+            continue
+        service = rng.choice(services)
+        topic = TOPICS[service]
+        template = rng.choice(_WEB_QUESTIONS if roll < off_topic_fraction + web_fraction else _QUESTIONS)
+        out.append(template.format(
+            service=service, feature=rng.choice(topic["features"]), identifier=rng.choice(topic["identifiers"])
+        ))
+    return out
+
+
+# ------------------------------
+# 📄 PDFs
+# ------------------------------
+def _pdf_text(value: str) -> str:
+    value = value.encode("latin-1", "replace").decode("latin-1")
+    return value.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _wrap(paragraph, width=95):
+    lines, line = [], ""
+    for word in paragraph.split():
+        if line and len(line) + len(word) + 1 > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def write_pdf(path: str, pages):
+    """Minimal text-only PDF (Helvetica, one content stream per page) that pypdf can extract."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in pages:
+        lines = [line for paragraph in page for line in _wrap(paragraph) + [""]]
+        body = "BT /F1 9 Tf 11 TL 40 800 Td " + " ".join(f"({_pdf_text(line)}) Tj T*" for line in lines) + " ET"
+        stream = body.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids)
+    )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def write_pdf_corpus(directory: str, docs: int, pages: int, seed: int = 0) -> list:
+    """`docs` guides of `pages` pages each, cycling through the topics; returns the paths."""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    services = sorted(TOPICS)
+    paths = []
+    for i in range(docs):
+        service = services[i % len(services)]
+        path = os.path.join(directory, f"{i:03d}-{service.lower().replace(' ', '-')}.pdf")
+        write_pdf(path, document_pages(rng, service, pages))
+        paths.append(path)
+    return paths
+
+
+# ------------------------------
+# 🌐 AWS Docs pages
+# ------------------------------
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8"><title>{title} - AWS Documentation</title>
+<script>window.awsdocs = {{"page": "{slug}"}};</script><style>body {{ font-family: sans-serif; }}</style></head>
+<body><header><nav><a href="/">AWS Documentation</a> / <a href="#">{service}</a></nav></header>
+<div id="left-column"><aside><ul>{toc}</ul></aside></div>
+<div id="main-col-body"><h1>{title}</h1>{body}</div>
+<footer><p>Privacy | Site terms | Cookie preferences</p></footer></body></html>
+"""
+
+
+def write_html_pages(directory: str, per_topic: int = 3, seed: int = 0) -> dict:
+    """AWS Docs style pages per topic; returns {url: filename} (also saved as pages.json)."""
+    import json
+
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed + 1)
+    mapping = {}
+    for service in sorted(TOPICS):
+        topic = TOPICS[service]
+        for feature in topic["features"][:per_topic]:
+            slug = f"{service}-{feature}".lower().replace(" ", "-")
+            title = f"{feature[0].upper()}{feature[1:]} in {service}"
+            body = "".join(f"<p>{p}</p>" for p in paragraphs(rng, service, 8))
+            body += "<ul>" + "".join(f"<li>{_sentence(rng, service)}</li>" for _ in range(5)) + "</ul>"
+            toc = "".join(f"<li><a href='#'>{f}</a></li>" for f in topic["features"])
+            filename = f"{slug}.html"
+            with open(os.path.join(directory, filename), "w", encoding="utf-8") as f:
+                f.write(HTML_TEMPLATE.format(title=title, slug=slug, service=service, toc=toc, body=body))
+            mapping[f"https://docs.aws.amazon.com/offline/{slug}.html"] = filename
+    with open(os.path.join(directory, "pages.json"), "w") as f:
+        json.dump(mapping, f, indent=1)
+    return mapping
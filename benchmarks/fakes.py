@@ -0,0 +1,263 @@
+"""
+Deterministic local stand-ins for Bedrock (Titan embeddings, chat models), SerpAPI,
+AWS Docs pages and Groq, each with configurable latency. They plug in where the real
+clients do, so the benchmarked code paths (caches, pools, retries, extraction) are
+the production ones.
+"""
+
+import os
+import re
+import json
+import time
+import zlib
+import hashlib
+import threading
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+import requests
+from requests.adapters import BaseAdapter
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from modules.lexical import tokenize
+from modules.context import estimate_tokens
+
+
+def _sleep_ms(ms):
+    if ms > 0:
+        time.sleep(ms / 1000)
+
+
+# ------------------------------
+# 🧮 Embeddings
+# ------------------------------
+class FakeEmbeddings(Embeddings):
+    """
+    Hashed bag-of-words vectors plus a shared "domain" direction, L2-normalized.
+    Texts sharing terms land close together and unrelated ones sit around cosine
+    distance 0.65 — roughly where Titan v2 puts them — so the retrieval gate behaves.
+    """
+
+    model_id = "fake-titan-embed"
+
+    def __init__(self, dim: int = 1024, latency_ms: float = 0.0, domain_weight: float = 0.7, seed: int = 0):
+        self.dim = dim
+        self.latency_ms = latency_ms
+        self.domain_weight = domain_weight
+        domain = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+        self._domain = domain / np.linalg.norm(domain)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _vector(self, text):
+        bag = np.zeros(self.dim, dtype=np.float32)
+        for term in tokenize(text):
+            h = zlib.crc32(term.encode("utf-8"))
+            bag[h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norm = float(np.linalg.norm(bag))
+        vec = self.domain_weight * self._domain + (bag / norm if norm else bag)
+        return (vec / float(np.linalg.norm(vec))).tolist()
+
+    def embed_query(self, text):
+        _sleep_ms(self.latency_ms)
+        with self._lock:
+            self.calls += 1
+        return self._vector(text)
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+
+# ------------------------------
+# 🤖 Chat model
+# ------------------------------
+_CONTEXT = re.compile(r"<context>\s*(.*?)\s*</context>", re.S)
+_FOLLOW_UP = re.compile(r"Follow Up Input:\s*(.*?)\s*(?:\n|$)")
+_WEB_SUMMARY = re.compile(r"Based on latest AWS docs:\s*(.*?)\s*Question:", re.S)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Bedrock chat stand-in: answers are the opening words of the prompt's context, so the
+    output is deterministic and grounded (an empty context yields a refusal, which
+    triggers the web fallback like a real model would). Condense and summary prompts
+    get short, plausible replies. Latency = `ttft_ms` + `token_ms` per streamed word.
+    """
+
+    model_id: str = "fake-llama3"
+    max_tokens: int = 1024
+    ttft_ms: float = 0.0
+    token_ms: float = 0.0
+    answer_words: int = 80
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-bedrock"
+
+    def _reply(self, prompt: str) -> str:
+        follow_up = _FOLLOW_UP.search(prompt)
+        if "Standalone question" in prompt and follow_up:
+            return follow_up.group(1)
+        if "New summary:" in prompt:
+            return "The user asked about AWS services and received grounded answers."
+        match = _CONTEXT.search(prompt) or _WEB_SUMMARY.search(prompt)
+        words = (match.group(1) if match else "").split()
+        if not words:
+            return "I don't know."
+        words = words[:min(self.answer_words, self.max_tokens)]
+        return "🟧 **Overview:** " + " ".join(words) + "\n📊 **Confidence:** Medium"
+
+    def _usage(self, prompt: str, reply: str) -> dict:
+        input_tokens, output_tokens = estimate_tokens(prompt), estimate_tokens(reply)
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens}
+
+    @staticmethod
+    def _prompt(messages) -> str:
+        return "\n".join(m.content if isinstance(m.content, str) else str(m.content) for m in messages)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = self._prompt(messages)
+        reply = self._reply(prompt)
+        self.calls += 1
+        _sleep_ms(self.ttft_ms + self.token_ms * len(reply.split()))
+        message = AIMessage(content=reply, usage_metadata=self._usage(prompt, reply))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = self._prompt(messages)
+        reply = self._reply(prompt)
+        self.calls += 1
+        _sleep_ms(self.ttft_ms)
+        for i, word in enumerate(reply.split(" ")):
+            if i:
+                _sleep_ms(self.token_ms)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(prompt, reply)))
+
+
+# ------------------------------
+# 🌐 SerpAPI / AWS Docs / Groq
+# ------------------------------
+def load_pages(directory: str) -> dict:
+    """{url: html} from a directory of recorded pages (`pages.json` maps url → file)."""
+    manifest = os.path.join(directory, "pages.json")
+    if os.path.exists(manifest):
+        with open(manifest) as f:
+            mapping = json.load(f)
+    else:
+        mapping = {
+            f"https://docs.aws.amazon.com/offline/{name}": name
+            for name in sorted(os.listdir(directory)) if name.endswith(".html")
+        }
+    pages = {}
+    for url, name in mapping.items():
+        with open(os.path.join(directory, name), encoding="utf-8", errors="replace") as f:
+            pages[url] = f.read()
+    return pages
+
+
+def record_pages(urls, directory: str, timeout: float = 15) -> dict:
+    """Save live pages (needs network) so later runs can replay them offline."""
+    from modules.web_search import BROWSER_HEADERS
+
+    os.makedirs(directory, exist_ok=True)
+    manifest = os.path.join(directory, "pages.json")
+    mapping = {}
+    if os.path.exists(manifest):
+        with open(manifest) as f:
+            mapping = json.load(f)
+    for url in urls:
+        res = requests.get(url, headers=BROWSER_HEADERS, timeout=timeout)
+        res.raise_for_status()
+        name = hashlib.sha256(url.encode("utf-8")).hexdigest()[:16] + ".html"
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            f.write(res.text)
+        mapping[url] = name
+        print(f"💾 {url} → {name} ({len(res.text)} bytes)")
+    with open(manifest, "w") as f:
+        json.dump(mapping, f, indent=1)
+    return mapping
+
+
+class RecordedWebAdapter(BaseAdapter):
+    """
+    `requests` transport that answers SerpAPI, the recorded AWS Docs pages and Groq
+    locally (honouring `If-None-Match`), and refuses every other host. SerpAPI returns
+    the pages sharing the most terms with the query.
+    """
+
+    SERP_HOST = "serpapi.com"
+    GROQ_HOST = "api.groq.com"
+
+    def __init__(self, pages: dict, serp_ms: float = 0.0, page_ms: float = 0.0, groq_ms: float = 0.0,
+                 results: int = 5):
+        super().__init__()
+        from modules.web_search import extract_page_text
+
+        self.pages = pages
+        self.latency = {"serpapi": serp_ms, "page": page_ms, "groq": groq_ms}
+        self.results = results
+        self._etags = {url: '"%s"' % hashlib.md5(html.encode("utf-8")).hexdigest() for url, html in pages.items()}
+        self._terms = {url: set(tokenize(extract_page_text(html))) for url, html in pages.items()}
+        self._lock = threading.Lock()
+        self.requests = {"serpapi": 0, "page": 0, "page_304": 0, "groq": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.requests[name] += 1
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        parsed = urlparse(request.url)
+        if parsed.netloc == self.SERP_HOST:
+            self._count("serpapi")
+            _sleep_ms(self.latency["serpapi"])
+            query = parse_qs(parsed.query).get("q", [""])[0]
+            return self._response(request, 200, json.dumps({"organic_results": self._search(query)}))
+        if parsed.netloc == self.GROQ_HOST:
+            self._count("groq")
+            _sleep_ms(self.latency["groq"])
+            return self._response(request, 200, json.dumps(self._summary(request.body)))
+        url = request.url.split("#")[0]
+        if url in self.pages:
+            _sleep_ms(self.latency["page"])
+            etag = self._etags[url]
+            if request.headers.get("If-None-Match") == etag:
+                self._count("page_304")
+                return self._response(request, 304, "", {"ETag": etag})
+            self._count("page")
+            return self._response(request, 200, self.pages[url], {"ETag": etag, "Content-Type": "text/html"})
+        if parsed.netloc.endswith("amazon.com"):
+            return self._response(request, 404, "Not Found")
+        raise requests.ConnectionError(f"offline benchmark: no network access to {parsed.netloc}")
+
+    def _search(self, query):
+        terms = set(tokenize(query))
+        ranked = sorted(self.pages, key=lambda u: (-len(terms & self._terms[u]), u))
+        return [{"link": url} for url in ranked[:self.results] if terms & self._terms[url]]
+
+    @staticmethod
+    def _summary(body):
+        payload = json.loads(body or b"{}")
+        text = next((m["content"] for m in payload.get("messages", []) if m.get("role") == "user"), "")
+        summary = " ".join(text.split()[:250])
+        return {
+            "choices": [{"message": {"role": "assistant", "content": summary}}],
+            "usage": {"prompt_tokens": estimate_tokens(text), "completion_tokens": estimate_tokens(summary)},
+        }
+
+    @staticmethod
+    def _response(request, status, body, headers=None):
+        res = requests.Response()
+        res.status_code = status
+        res._content = body.encode("utf-8") if isinstance(body, str) else body
+        res.headers.update(headers or {})
+        res.encoding = "utf-8"
+        res.url = request.url
+        res.request = request
+        return res
+
+    def close(self):
+        pass
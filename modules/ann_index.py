@@ -0,0 +1,237 @@
+"""
+Search indexes for the PGVector collection.
+langchain's `embedding` column has no fixed dimension, so the ANN index is built
+on `embedding::vector(EMBED_DIM)` and is partial on the collection id; queries use
+the same expression and predicate so the planner can pick it up. A GIN full-text
+index over the chunk text backs the lexical half of hybrid retrieval.
+
+With EMBED_QUANTIZATION the index covers a compact expression instead
+(`::halfvec(EMBED_DIM)` for int8, `binary_quantize(...)::bit(EMBED_DIM)` for binary);
+the index picks candidates and the full-precision column rescores them.
+"""
+
+import re
+from sqlalchemy import text
+from .config import (
+    EMBED_DIM,
+    EMBED_QUANTIZATION,
+    EMBED_RESCORE_CANDIDATES,
+    ANN_INDEX,
+    HNSW_M,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_SEARCH,
+    IVFFLAT_LISTS,
+    IVFFLAT_PROBES,
+    FTS_CONFIG,
+)
+
+EMBEDDING_TABLE = "langchain_pg_embedding"
+COLLECTION_TABLE = "langchain_pg_collection"
+ANN_KINDS = ("hnsw", "ivfflat")
+
+
+def index_name(collection: str, kind: str) -> str:
+    return "rag_" + re.sub(r"\W", "_", collection.lower()) + f"_{kind}"
+
+
+# quantization → (indexed expression, operator class, distance operator, query expression)
+QUANTIZATIONS = {
+    "none": ("({column}::vector({dim}))", "vector_cosine_ops", "<=>", "{query}"),
+    "int8": ("({column}::halfvec({dim}))", "halfvec_cosine_ops", "<=>", "CAST({query} AS halfvec({dim}))"),
+    "binary": ("(binary_quantize({column})::bit({dim}))", "bit_hamming_ops", "<~>", "binary_quantize({query})::bit({dim})"),
+}
+
+
+def _quantization():
+    if EMBED_QUANTIZATION not in QUANTIZATIONS:
+        raise ValueError(f"Invalid EMBED_QUANTIZATION {EMBED_QUANTIZATION!r}; expected one of {sorted(QUANTIZATIONS)}")
+    return QUANTIZATIONS[EMBED_QUANTIZATION]
+
+
+def _vector_expr(column: str = "embedding") -> str:
+    return _quantization()[0].format(column=column, dim=EMBED_DIM)
+
+
+def collection_uuid(conn, collection: str):
+    row = conn.execute(
+        text(f"SELECT uuid FROM {COLLECTION_TABLE} WHERE name = :c"), {"c": collection}
+    ).fetchone()
+    return str(row[0]) if row else None
+
+
+def ivfflat_lists(rows: int) -> int:
+    """pgvector's guidance: rows/1000 up to 1M rows, sqrt(rows) beyond."""
+    if IVFFLAT_LISTS > 0:
+        return IVFFLAT_LISTS
+    if rows <= 1_000_000:
+        return max(1, rows // 1000)
+    return int(rows ** 0.5)
+
+
+def _with_clause(kind: str, rows: int) -> dict:
+    if kind == "hnsw":
+        return {"m": HNSW_M, "ef_construction": HNSW_EF_CONSTRUCTION}
+    return {"lists": ivfflat_lists(rows)}
+
+
+def _existing_indexes(conn, collection: str) -> dict:
+    names = [index_name(collection, k) for k in ANN_KINDS]
+    rows = conn.execute(
+        text("SELECT indexname, indexdef FROM pg_indexes WHERE tablename = :t AND indexname = ANY(:n)"),
+        {"t": EMBEDDING_TABLE, "n": names},
+    )
+    return {name: indexdef for name, indexdef in rows}
+
+
+def _index_param(indexdef: str, key: str):
+    match = re.search(rf"\b{key}\s*=\s*'?(\d+)", indexdef)
+    return int(match.group(1)) if match else None
+
+
+def _index_current(indexdef: str, params: dict, uuid: str) -> bool:
+    """
+    Same collection, dimension, quantization and build parameters; IVFFlat lists may
+    drift up to 2× as rows grow.
+    """
+    if uuid not in indexdef or f"({EMBED_DIM})" not in indexdef or _quantization()[1] not in indexdef:
+        return False
+    for key, want in params.items():
+        have = _index_param(indexdef, key)
+        if have is None:
+            return False
+        if key == "lists" and IVFFLAT_LISTS <= 0:
+            if not want / 2 <= have <= want * 2:
+                return False
+        elif have != want:
+            return False
+    return True
+
+
+def ensure_ann_index(conn, collection: str, rebuild: bool = False) -> str:
+    """
+    Create (or re-create, when its parameters changed) the ANN index for `collection`
+    and drop the other kind. Returns a short description of what was done.
+    """
+    kind = ANN_INDEX
+    existing = _existing_indexes(conn, collection)
+    for other in ANN_KINDS:
+        name = index_name(collection, other)
+        if other != kind and name in existing:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    if kind not in ANN_KINDS:
+        return "ANN index disabled (exact search)"
+
+    uuid = collection_uuid(conn, collection)
+    if uuid is None:
+        return "collection not found, no index"
+    rows = conn.execute(
+        text(f"SELECT count(*) FROM {EMBEDDING_TABLE} WHERE collection_id = :u"), {"u": uuid}
+    ).scalar()
+    name = index_name(collection, kind)
+    params = _with_clause(kind, rows)
+    current = existing.get(name)
+    if current is not None and not rebuild and _index_current(current, params, uuid):
+        conn.execute(text(f"ANALYZE {EMBEDDING_TABLE}"))
+        return f"{kind} index up to date ({rows} rows)"
+
+    conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    with_sql = ", ".join(f"{k} = {int(v)}" for k, v in params.items())
+    conn.execute(text(
+        f"CREATE INDEX {name} ON {EMBEDDING_TABLE} "
+        f"USING {kind} ({_vector_expr()} {_quantization()[1]}) WITH ({with_sql}) "
+        f"WHERE collection_id = '{uuid}'"
+    ))
+    conn.execute(text(f"ANALYZE {EMBEDDING_TABLE}"))
+    return f"built {kind} index {name} ({with_sql}, {EMBED_QUANTIZATION}, {rows} rows)"
+
+
+def ann_index_size(conn, collection: str):
+    """On-disk bytes of the collection's ANN index, or None when there is none."""
+    if ANN_INDEX not in ANN_KINDS:
+        return None
+    return conn.execute(
+        text("SELECT pg_relation_size(to_regclass(:n))"), {"n": index_name(collection, ANN_INDEX)}
+    ).scalar()
+
+
+def _tsvector_expr(column: str = "document") -> str:
+    return f"to_tsvector('{FTS_CONFIG}'::regconfig, coalesce({column}, ''))"
+
+
+def ensure_fts_index(conn, collection: str) -> str:
+    """GIN index on the chunk text for this collection (re-created if the collection id changed)."""
+    if not re.fullmatch(r"\w+", FTS_CONFIG):
+        raise ValueError(f"Invalid FTS_CONFIG {FTS_CONFIG!r}")
+    uuid = collection_uuid(conn, collection)
+    if uuid is None:
+        return "collection not found, no full-text index"
+    name = index_name(collection, "fts")
+    row = conn.execute(
+        text("SELECT indexdef FROM pg_indexes WHERE tablename = :t AND indexname = :n"),
+        {"t": EMBEDDING_TABLE, "n": name},
+    ).fetchone()
+    if row and uuid in row[0] and f"'{FTS_CONFIG}'" in row[0]:
+        return "full-text index up to date"
+    conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    conn.execute(text(
+        f"CREATE INDEX {name} ON {EMBEDDING_TABLE} USING gin ({_tsvector_expr()}) "
+        f"WHERE collection_id = '{uuid}'"
+    ))
+    return f"built full-text index {name} ({FTS_CONFIG})"
+
+
+def search_settings(ef_search: int = None, probes: int = None) -> list:
+    """SET LOCAL statements for the query-time knobs (must run inside the search transaction)."""
+    if ANN_INDEX == "hnsw":
+        ef = int(ef_search or HNSW_EF_SEARCH)
+        if EMBED_QUANTIZATION != "none":
+            ef = max(ef, EMBED_RESCORE_CANDIDATES)  # HNSW returns at most ef_search rows
+        return [f"SET LOCAL hnsw.ef_search = {ef}"]
+    if ANN_INDEX == "ivfflat":
+        return [f"SET LOCAL ivfflat.probes = {int(probes or IVFFLAT_PROBES)}"]
+    return []
+
+
+SYNC_VECTOR_PARAM = "CAST(:vector AS vector({dim}))"
+
+
+def search_sql(collection_id: str, exact: bool = False, vector_param: str = SYNC_VECTOR_PARAM):
+    """
+    Top-k by cosine distance within one collection. `exact=True` orders by the raw
+    column, which no ANN index covers, so Postgres does a sequential scan. With
+    quantization the index yields max(k, EMBED_RESCORE_CANDIDATES) candidates that are
+    re-ranked by full-precision cosine distance.
+    """
+    column = "e.embedding" if exact else _vector_expr("e.embedding")
+    query = vector_param.format(dim=EMBED_DIM)
+    if not exact and EMBED_QUANTIZATION != "none":
+        _, _, op, query_expr = _quantization()
+        coarse = query_expr.format(query=query, dim=EMBED_DIM)
+        return text(
+            f"SELECT c.custom_id, c.document, c.cmetadata, c.embedding <=> {query} AS distance FROM ("
+            f"SELECT e.custom_id, e.document, e.cmetadata, e.embedding FROM {EMBEDDING_TABLE} e "
+            f"WHERE e.collection_id = '{collection_id}' "
+            f"ORDER BY {column} {op} {coarse} LIMIT GREATEST(:k, {int(EMBED_RESCORE_CANDIDATES)})"
+            f") c ORDER BY distance LIMIT :k"
+        )
+    return text(
+        f"SELECT e.custom_id, e.document, e.cmetadata, {column} <=> {query} AS distance "
+        f"FROM {EMBEDDING_TABLE} e WHERE e.collection_id = '{collection_id}' "
+        f"ORDER BY {column} <=> {query} LIMIT :k"
+    )
+
+
+def fts_search_sql(collection_id: str, vector_param: str = SYNC_VECTOR_PARAM):
+    """
+    Top-k by full-text rank (any query term may match), with each hit's cosine
+    distance so lexical-only hits can still be judged by the retrieval gate.
+    """
+    query = vector_param.format(dim=EMBED_DIM)
+    tsvector = _tsvector_expr("e.document")
+    return text(
+        f"SELECT e.custom_id, e.document, e.cmetadata, e.embedding <=> {query} AS distance "
+        f"FROM {EMBEDDING_TABLE} e, "
+        f"to_tsquery('simple', replace(plainto_tsquery('{FTS_CONFIG}'::regconfig, :text)::text, ' & ', ' | ')) q "
+        f"WHERE e.collection_id = '{collection_id}' AND q::text <> '' AND {tsvector} @@ q "
+        f"ORDER BY ts_rank_cd({tsvector}, q) DESC LIMIT :k"
+    )
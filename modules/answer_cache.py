@@ -0,0 +1,108 @@
+"""
+Semantic answer cache in front of the hybrid RAG pipeline.
+An entry is reused when the model id and the retrieved source set match and the
+query embedding is within a cosine-similarity threshold of the cached one.
+"""
+
+import math
+import time
+import threading
+from collections import OrderedDict
+
+
+def _unit(vector):
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return tuple(x / norm for x in vector)
+
+
+class SemanticAnswerCache:
+    def __init__(self, threshold: float = 0.95, ttl_s: float = 3600, max_entries: int = 512,
+                 version_fn=None, version_check_s: float = 30):
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.version_fn = version_fn
+        self.version_check_s = version_check_s
+        self._entries = OrderedDict()   # id -> entry
+        self._buckets = {}              # (model_id, source_key) -> [id, ...]
+        self._next_id = 0
+        self._version = None
+        self._version_checked_at = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _check_version(self):
+        """Drop everything once the indexed collection changes (polled, not per request)."""
+        if self.version_fn is None or time.time() - self._version_checked_at < self.version_check_s:
+            return
+        self._version_checked_at = time.time()
+        version = self.version_fn()
+        if self._version is not None and version != self._version:
+            print(f"♻️ Index version {self._version} → {version}, clearing answer cache.")
+            self.invalidate()
+        self._version = version
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        bucket = self._buckets.get(entry["bucket"], [])
+        if entry_id in bucket:
+            bucket.remove(entry_id)
+        if not bucket:
+            self._buckets.pop(entry["bucket"], None)
+
+    def lookup(self, vector, model_id: str, source_key):
+        self._check_version()
+        query = _unit(vector)
+        now = time.time()
+        with self._lock:
+            best, best_score = None, self.threshold
+            for entry_id in list(self._buckets.get((model_id, source_key), ())):
+                entry = self._entries[entry_id]
+                if now - entry["created_at"] > self.ttl_s:
+                    self._remove(entry_id)
+                    continue
+                score = sum(a * b for a, b in zip(query, entry["vector"]))
+                if score >= best_score:
+                    best, best_score = entry_id, score
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best)
+            self.hits += 1
+            result = self._entries[best]["result"]
+            return {"answer": result["answer"], "sources": list(result["sources"])}
+
+    def store(self, vector, model_id: str, source_key, result: dict):
+        bucket = (model_id, source_key)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "vector": _unit(vector),
+                "bucket": bucket,
+                "created_at": time.time(),
+                "result": {"answer": result["answer"], "sources": list(result.get("sources", []))},
+            }
+            self._buckets.setdefault(bucket, []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self.invalidations += 1
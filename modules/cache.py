@@ -0,0 +1,290 @@
+"""
+Small building blocks for the app's caches: a thread-safe in-process LRU with
+optional TTL, a size-bounded SQLite key/value store for an on-disk tier, and
+single-flight coalescing of identical in-flight work.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+def cache_key(*parts) -> str:
+    """Stable hex key from arbitrary parts (model id, normalized text, ...)."""
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(str(p).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(str(text).split()).lower()
+
+
+# ------------------------------
+# 🧠 In-process LRU
+# ------------------------------
+class LRUCache:
+    def __init__(self, max_entries: int = 1024, ttl_s: float = None):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, stored_at = item
+                if self.ttl_s is None or time.time() - stored_at <= self.ttl_s:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def stats(self) -> dict:
+        return {"size": len(self), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+# ------------------------------
+# 💾 On-disk tier (SQLite)
+# ------------------------------
+class DiskCache:
+    """Byte-valued key/value store; least-recently-used rows are pruned past `max_entries`."""
+
+    def __init__(self, path: str, max_entries: int = 100_000, ttl_s: float = None, table: str = "kv"):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.table = table
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL,"
+            " stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+
+    def peek(self, key):
+        """Return (value, stored_at) regardless of age, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, stored_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        return (bytes(row[0]), row[1]) if row else None
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, stored_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row and (self.ttl_s is None or time.time() - row[1] <= self.ttl_s):
+                self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (time.time(), key))
+                self.hits += 1
+                return bytes(row[0])
+            self.misses += 1
+            return None
+
+    def set(self, key, value: bytes):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), now, now),
+            )
+            self._writes += 1
+            if self._writes % 256 == 0:
+                self._prune()
+
+    def touch(self, key):
+        """Mark an entry fresh again (e.g. after a 304 revalidation)."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(f"UPDATE {self.table} SET stored_at = ?, accessed_at = ? WHERE key = ?", (now, now, key))
+
+    def _prune(self):
+        if self.ttl_s is not None:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE stored_at < ?", (time.time() - self.ttl_s,))
+        self._conn.execute(
+            f"DELETE FROM {self.table} WHERE key IN ("
+            f" SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    @property
+    def stats(self) -> dict:
+        return {"size": len(self), "hits": self.hits, "misses": self.misses}
+
+
+# ------------------------------
+# 🛬 Single-flight
+# ------------------------------
+class _Abandoned(Exception):
+    """The leader's consumer stopped reading a coalesced stream before it finished."""
+
+
+class _Broadcast:
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.error = None
+        self.cond = threading.Condition()
+
+    def publish(self, event):
+        with self.cond:
+            self.events.append(event)
+            self.cond.notify_all()
+
+    def finish(self, error=None):
+        with self.cond:
+            self.done, self.error = True, error
+            self.cond.notify_all()
+
+    def replay(self, copy):
+        """Every event from the start, then live; each follower gets its own `copy(event)`."""
+        i = 0
+        while True:
+            with self.cond:
+                while i >= len(self.events) and not self.done:
+                    self.cond.wait()
+                if i >= len(self.events):
+                    if self.error is not None:
+                        raise self.error
+                    return
+                event = self.events[i]
+            i += 1
+            yield copy(event)
+
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one execution: the first caller (the
+    leader) runs the work and every caller arriving before it finishes gets the same
+    result or exception. Nothing is kept afterwards — pair it with a cache for reuse.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _join(self, key, factory):
+        """(call, is_leader) for `key`, registering a new call from `factory()` if none is in flight."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                return call, False
+            call = self._calls[key] = factory()
+            self.leaders += 1
+            return call, True
+
+    def _leave(self, key, call):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+    def do(self, key, fn, *args, **kwargs):
+        """Returns (value, shared); `shared` is True when another caller's run produced it."""
+        if not self.enabled:
+            return fn(*args, **kwargs), False
+        future, leader = self._join(key, Future)
+        if not leader:
+            return future.result(), True
+        try:
+            value = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+            return value, False
+        finally:
+            self._leave(key, future)
+
+    def stream(self, key, gen_fn, copy=lambda event: event, restart_event=None):
+        """
+        Generator form of `do`: the leader iterates `gen_fn()` and every follower
+        replays its events from the start, then live. Events are snapshotted with
+        `copy(event)` when published and copied again for each follower, so neither the
+        leader's later mutations nor another follower's can leak in. If the leader's
+        consumer stops early, followers emit `restart_event` (when they had already
+        received events) and re-run `gen_fn()` themselves.
+        """
+        if not self.enabled:
+            yield from gen_fn()
+            return
+        broadcast, leader = self._join(key, _Broadcast)
+        if not leader:
+            replayed = 0
+            try:
+                for event in broadcast.replay(copy):
+                    replayed += 1
+                    yield event
+                return
+            except _Abandoned:
+                pass
+            if replayed and restart_event is not None:
+                yield restart_event
+            yield from gen_fn()
+            return
+        error = _Abandoned()
+        try:
+            for event in gen_fn():
+                broadcast.publish(copy(event))
+                yield event
+            error = None
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._leave(key, broadcast)
+            broadcast.finish(error)
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {"in_flight": len(self._calls), "leaders": self.leaders, "coalesced": self.coalesced}
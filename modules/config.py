@@ -1,18 +1,196 @@
 import os
 from dotenv import load_dotenv
-import boto3
-from langchain_aws import BedrockEmbeddings
+from .lazy import once
 
 load_dotenv()
 
 PG_CONNECTION_STRING = os.getenv("PG_CONNECTION_STRING")  # required
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
 
-# Bedrock runtime client
-bedrock_client = boto3.client("bedrock-runtime", region_name=AWS_REGION)
+# Shared Postgres pool (chat history, vector search, ingestion); size it so that
+# app replicas × (DB_POOL_SIZE + DB_MAX_OVERFLOW) stays under max_connections.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT_S = float(os.getenv("DB_POOL_TIMEOUT_S", "10"))
+DB_POOL_RECYCLE_S = int(os.getenv("DB_POOL_RECYCLE_S", "1800"))
 
-# Embeddings (Titan v2)
-bedrock_embeddings = BedrockEmbeddings(
-    client=bedrock_client,
-    model_id="amazon.titan-embed-text-v2:0",
-)
+# Titan v2 output size (256 | 512 | 1024). Changing it needs `build_index.py --migrate`,
+# which re-embeds the stored chunks.
+EMBED_DIM = int(os.getenv("EMBED_DIM", "1024"))
+TITAN_V2_DIMS = (256, 512, 1024)
+# Compact search copy of the vectors (none | int8 | binary): the ANN index / local export
+# scans quantized codes and the top EMBED_RESCORE_CANDIDATES are rescored at full precision.
+# pgvector has no int8 type, so "int8" indexes halfvec there (pgvector >= 0.7 for both).
+EMBED_QUANTIZATION = os.getenv("EMBED_QUANTIZATION", "none").lower()
+EMBED_RESCORE_CANDIDATES = int(os.getenv("EMBED_RESCORE_CANDIDATES", "40"))
+
+# Approximate nearest-neighbour index on the collection (hnsw | ivfflat | none).
+# Build parameters apply at index time; ef_search/probes trade recall for latency per query.
+ANN_INDEX = os.getenv("ANN_INDEX", "hnsw").lower()
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+IVFFLAT_LISTS = int(os.getenv("IVFFLAT_LISTS", "0"))  # 0 = rows/1000 (sqrt(rows) above 1M)
+IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", "10"))
+
+# Hybrid retrieval: full-text + vector candidates fused with reciprocal rank fusion,
+# optionally reranked ("none" | "overlap" | "cross-encoder", the latter needs sentence-transformers).
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "12"))  # per retriever, before fusion
+RRF_K = int(os.getenv("RRF_K", "60"))
+FTS_CONFIG = os.getenv("FTS_CONFIG", "english")                  # Postgres text search configuration
+RERANKER = os.getenv("RERANKER", "none").lower()
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+# Vector backend: "pgvector" queries Postgres; "faiss" / "numpy" serve an in-process
+# snapshot exported with `python build_index.py --export-local` (falls back to pgvector if missing).
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pgvector").lower()
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", ".cache/local_index")
+LOCAL_INDEX_RELOAD_S = float(os.getenv("LOCAL_INDEX_RELOAD_S", "30"))  # how often to look for a newer export
+
+# Ingestion (build_index.py)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 2))
+INGEST_EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "64"))
+# Bounded hand-offs between ingestion stages (backpressure keeps memory flat)
+INGEST_QUEUE_PAGES = int(os.getenv("INGEST_QUEUE_PAGES", "64"))      # parsed pages waiting to be batched
+INGEST_QUEUE_BATCHES = int(os.getenv("INGEST_QUEUE_BATCHES", "2"))   # batches waiting per embed/write stage
+
+# Embedding concurrency (Titan invocations in flight)
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "16"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+
+# Query-embedding cache (in-process LRU + optional SQLite file)
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "")  # e.g. .cache/embeddings.sqlite; empty = memory only
+
+# Semantic answer cache (qa_chain)
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_S = float(os.getenv("ANSWER_CACHE_TTL_S", "3600"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+
+# Single-flight: concurrent identical questions, query embeddings, searches, page
+# fetches and summaries share one in-flight computation (web_search imports it too).
+COALESCE_INFLIGHT = os.getenv("COALESCE_INFLIGHT", "true").lower() == "true"
+
+# Retrieval / web fallback (qa_chain)
+SPECULATIVE_FALLBACK = os.getenv("SPECULATIVE_FALLBACK", "true").lower() == "true"
+# Retrieval gate: local context is sufficient when ≥ RETRIEVAL_MIN_DOCS chunks are
+# within RETRIEVAL_MAX_DISTANCE (cosine distance) of the question.
+RETRIEVAL_MAX_DISTANCE = float(os.getenv("RETRIEVAL_MAX_DISTANCE", "0.6"))
+RETRIEVAL_MIN_DOCS = int(os.getenv("RETRIEVAL_MIN_DOCS", "1"))
+
+# Retrieved chunks per question, and the context token budget per model family; chunks
+# are packed best-first (overlap removed, the last one trimmed to relevant sentences).
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "5"))
+CONTEXT_TOKEN_BUDGETS = {
+    "llama3": int(os.getenv("CONTEXT_TOKENS_LLAMA3", "2000")),
+    "nova": int(os.getenv("CONTEXT_TOKENS_NOVA", "4000")),
+    "default": int(os.getenv("CONTEXT_TOKENS_DEFAULT", "2000")),
+}
+CONTEXT_MIN_PARTIAL_TOKENS = int(os.getenv("CONTEXT_MIN_PARTIAL_TOKENS", "64"))
+
+# Conversation memory: summarize in the background every N turns, keep the last few verbatim
+MEMORY_SUMMARIZE_EVERY = int(os.getenv("MEMORY_SUMMARIZE_EVERY", "4"))
+MEMORY_KEEP_RECENT_TURNS = int(os.getenv("MEMORY_KEEP_RECENT_TURNS", "2"))
+
+# Headless query API (query_api.py): questions answered at once across batch workers and
+# HTTP requests; HTTP callers wait up to QUERY_QUEUE_TIMEOUT_S for a slot, then get 503.
+# Keep QUERY_CONCURRENCY within DB_POOL_SIZE + DB_MAX_OVERFLOW.
+QUERY_CONCURRENCY = int(os.getenv("QUERY_CONCURRENCY", "4"))
+QUERY_QUEUE_TIMEOUT_S = float(os.getenv("QUERY_QUEUE_TIMEOUT_S", "30"))
+QUERY_DEFAULT_MODEL = os.getenv("QUERY_DEFAULT_MODEL", "auto")
+
+# Model routing (model "auto", modules/router.py): questions go to Llama 3 unless they are
+# longer than ROUTER_MAX_SIMPLE_WORDS, ask for code, read like design / comparison /
+# troubleshooting questions, or no chunk is within ROUTER_CONFIDENT_DISTANCE (default: the
+# retrieval gate's threshold); those go to Nova Pro. With ROUTER_ESCALATE a poor Llama 3 answer (refusal, fewer than
+# ROUTER_MIN_ANSWER_WORDS words, no code when code was asked for) is regenerated on Nova Pro.
+ROUTER_MAX_SIMPLE_WORDS = int(os.getenv("ROUTER_MAX_SIMPLE_WORDS", "30"))
+ROUTER_CONFIDENT_DISTANCE = float(os.getenv("ROUTER_CONFIDENT_DISTANCE", str(RETRIEVAL_MAX_DISTANCE)))
+ROUTER_ESCALATE = os.getenv("ROUTER_ESCALATE", "true").lower() == "true"
+ROUTER_MIN_ANSWER_WORDS = int(os.getenv("ROUTER_MIN_ANSWER_WORDS", "15"))
+
+# Streamlit debug panel (per-request span table + stage latency summary); tracing
+# export itself is configured in modules/tracing.py (TRACE_EXPORT, TRACE_LOG_PATH).
+DEBUG_PANEL = os.getenv("DEBUG_PANEL", "false").lower() == "true"
+
+# ------------------------------
+# 🔌 Clients (created on first use)
+# ------------------------------
+# Importing config only reads settings; boto3 / langchain_aws are imported and the
+# clients built by the accessors below, once per process.
+
+@once
+def get_bedrock_client():
+    """Bedrock runtime client for the chat models."""
+    import boto3
+
+    return boto3.client("bedrock-runtime", region_name=AWS_REGION)
+
+
+@once
+def get_embeddings_client():
+    """
+    Embeddings client: enough pooled connections for the fan-out, and no botocore
+    retries so throttling reaches ConcurrentEmbeddings' adaptive backoff.
+    """
+    import boto3
+    from botocore.config import Config
+
+    return boto3.client(
+        "bedrock-runtime",
+        region_name=AWS_REGION,
+        config=Config(
+            max_pool_connections=EMBED_MAX_CONCURRENCY + 2,
+            retries={"total_max_attempts": 1, "mode": "standard"},
+        ),
+    )
+
+
+@once
+def get_bedrock_embeddings():
+    """Embeddings (Titan v2) for ingestion."""
+    from langchain_aws import BedrockEmbeddings
+    from .embeddings import ConcurrentEmbeddings
+
+    if EMBED_DIM not in TITAN_V2_DIMS:
+        raise ValueError(f"EMBED_DIM must be one of {TITAN_V2_DIMS} for Titan v2, got {EMBED_DIM}.")
+    return ConcurrentEmbeddings(
+        BedrockEmbeddings(
+            client=get_embeddings_client(),
+            model_id="amazon.titan-embed-text-v2:0",
+            model_kwargs={"dimensions": EMBED_DIM, "normalize": True},
+        ),
+        max_concurrency=EMBED_MAX_CONCURRENCY,
+        max_retries=EMBED_MAX_RETRIES,
+    )
+
+
+@once
+def get_query_embeddings():
+    """Query-time embeddings: repeated questions skip the Bedrock round trip."""
+    from .embeddings import CachedEmbeddings
+
+    return CachedEmbeddings(
+        get_bedrock_embeddings(),
+        max_entries=EMBED_CACHE_SIZE,
+        disk_path=EMBED_CACHE_PATH or None,
+        namespace=f"amazon.titan-embed-text-v2:0/{EMBED_DIM}",
+        coalesce=COALESCE_INFLIGHT,
+    )
+
+
+_LAZY_ATTRIBUTES = {
+    "bedrock_client": get_bedrock_client,
+    "embeddings_client": get_embeddings_client,
+    "bedrock_embeddings": get_bedrock_embeddings,
+    "query_embeddings": get_query_embeddings,
+}
+
+
+def __getattr__(name):
+    """`config.bedrock_embeddings` etc. keep working, resolved on first access."""
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,155 @@
+"""
+Token-budgeted context assembly for the RAG prompt.
+Retrieved chunks are packed best-first up to a per-model token budget. Text that
+repeats across chunks (the splitter's overlap) is included once, and a chunk that
+doesn't fit whole contributes only its sentences most relevant to the question.
+"""
+
+import re
+import math
+from dataclasses import dataclass, field
+from .config import CONTEXT_TOKEN_BUDGETS, CONTEXT_MIN_PARTIAL_TOKENS
+from .lexical import tokenize
+from .models import model_family, MODEL_CONTEXT_WINDOWS
+
+_SENTENCE = re.compile(r"(?<=[.!?:;])\s+|\n\s*\n|\n(?=\s*(?:[-•*]|\d+[.)])\s)")
+_MIN_OVERLAP_CHARS = 40        # shorter sentences are only deduplicated on an exact match
+PROMPT_OVERHEAD_TOKENS = 500   # rag_prompt instructions + formatting
+CHUNK_SEPARATOR = "\n\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough count for Llama 3 / Nova tokenizers (no tokenizer ships with Bedrock):
+    ~4 characters per token for prose, more tokens per word for code and identifiers.
+    """
+    if not text:
+        return 0
+    return int(max(len(text) / 4, len(text.split()) * 1.3)) + 1
+
+
+def context_budget(model_id: str, max_tokens: int, question: str = "") -> int:
+    """Configured budget for the model family, capped by what its window leaves after the answer."""
+    family = model_family(model_id)
+    budget = CONTEXT_TOKEN_BUDGETS.get(family, CONTEXT_TOKEN_BUDGETS["default"])
+    window = MODEL_CONTEXT_WINDOWS.get(family)
+    if window:
+        headroom = window - int(max_tokens or 0) - PROMPT_OVERHEAD_TOKENS - estimate_tokens(question)
+        budget = min(budget, headroom)
+    return max(budget, CONTEXT_MIN_PARTIAL_TOKENS)
+
+
+@dataclass
+class PackedContext:
+    text: str
+    docs: list = field(default_factory=list)     # Documents that contributed, best first
+    tokens: int = 0
+    budget: int = 0
+    full: int = 0
+    partial: int = 0
+    dropped: int = 0
+    duplicate_sentences: int = 0
+
+    def report(self) -> str:
+        return (
+            f"context ~{self.tokens}/{self.budget} tokens: {self.full} chunk(s) whole, "
+            f"{self.partial} trimmed, {self.dropped} dropped, {self.duplicate_sentences} duplicate sentence(s) skipped"
+        )
+
+
+def _normalize(sentence: str) -> str:
+    return " ".join(sentence.lower().split())
+
+
+def _split(text: str) -> list:
+    """(separator before it, sentence) pairs; the separators keep list and code line breaks."""
+    pieces, sep, start = [], "", 0
+    bounds = [(m.start(), m.end()) for m in _SENTENCE.finditer(text)] + [(len(text), len(text))]
+    for end, next_start in bounds:
+        piece = text[start:end]
+        body = piece.strip()
+        if body:
+            pieces.append((sep + piece[:len(piece) - len(piece.lstrip())], body))
+            sep = piece[len(piece.rstrip()):]
+        else:
+            sep += piece
+        sep += text[end:next_start]
+        start = next_start
+    return pieces
+
+
+def _join(pieces) -> str:
+    return "".join((sep if i else "") + sentence for i, (sep, sentence) in enumerate(pieces))
+
+
+def _is_overlap(key: str, heads: dict, tails: dict) -> bool:
+    """`key` is the start or end of a packed sentence, as left by the splitter's chunk overlap."""
+    if len(key) < _MIN_OVERLAP_CHARS:
+        return False
+    return (any(s.startswith(key) for s in heads.get(key[:_MIN_OVERLAP_CHARS], ()))
+            or any(s.endswith(key) for s in tails.get(key[-_MIN_OVERLAP_CHARS:], ())))
+
+
+def _relevance(sentence: str, question_terms: set) -> float:
+    terms = tokenize(sentence)
+    if not terms:
+        return 0.0
+    return len(question_terms.intersection(terms)) / math.sqrt(len(terms))
+
+
+def pack_context(scored_docs, question: str, budget: int) -> PackedContext:
+    """Pack (Document, distance) pairs, already in relevance order, into at most `budget` tokens."""
+    packed = PackedContext(text="", budget=budget)
+    question_terms = set(tokenize(question))
+    seen = set()           # normalized sentences already packed
+    heads, tails = {}, {}  # long packed sentences by their first / last _MIN_OVERLAP_CHARS characters
+    parts, used = [], 0
+    for doc, _ in scored_docs:
+        pieces, keys = [], {}  # keys: normalized sentence -> index in pieces
+        for sep, sentence in _split(doc.page_content):
+            key = _normalize(sentence)
+            if key in seen or key in keys or _is_overlap(key, heads, tails):
+                packed.duplicate_sentences += 1
+                continue
+            keys[key] = len(pieces)
+            pieces.append((sep, sentence))
+        if not pieces:
+            packed.dropped += 1
+            continue
+
+        separator = estimate_tokens(CHUNK_SEPARATOR) if parts else 0
+        cost = estimate_tokens(_join(pieces)) + separator
+        if used + cost <= budget:
+            chosen, packed.full = range(len(pieces)), packed.full + 1
+        else:
+            remaining = budget - used - separator
+            if remaining < CONTEXT_MIN_PARTIAL_TOKENS:
+                packed.dropped += 1
+                continue
+            relevance = [_relevance(sentence, question_terms) for _, sentence in pieces]
+            keep = set()
+            for i in sorted(range(len(pieces)), key=relevance.__getitem__, reverse=True):
+                if relevance[i] <= 0:
+                    break
+                t = estimate_tokens(pieces[i][1])
+                if t <= remaining:
+                    keep.add(i)
+                    remaining -= t
+            if not keep:
+                packed.dropped += 1
+                continue
+            chosen, packed.partial = sorted(keep), packed.partial + 1
+            cost = estimate_tokens(_join([pieces[i] for i in chosen])) + separator
+
+        parts.append(_join([pieces[i] for i in chosen]))
+        packed.docs.append(doc)
+        used += cost
+        kept = set(chosen)
+        for key in (k for k, i in keys.items() if i in kept):
+            seen.add(key)
+            if len(key) >= _MIN_OVERLAP_CHARS:
+                heads.setdefault(key[:_MIN_OVERLAP_CHARS], []).append(key)
+                tails.setdefault(key[-_MIN_OVERLAP_CHARS:], []).append(key)
+    packed.text = CHUNK_SEPARATOR.join(parts)
+    packed.tokens = estimate_tokens(packed.text)
+    return packed
@@ -0,0 +1,185 @@
+"""
+Shared Postgres connection pools.
+One tuned SQLAlchemy engine serves chat history, vector search, ingestion
+bookkeeping and index-version polling; an asyncpg engine backs the async
+retrieval path. Both pools record checkouts, waits and overflow, and both engines
+are created on first use rather than at import.
+"""
+
+import time
+import threading
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from .lazy import once
+from .config import (
+    PG_CONNECTION_STRING,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT_S,
+    DB_POOL_RECYCLE_S,
+)
+
+
+# ------------------------------
+# 📊 Pool metrics
+# ------------------------------
+class PoolMetrics:
+    """Counters fed by pool events; a "wait" is a checkout that found the pool exhausted."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.connects = 0
+            self.checkouts = 0
+            self.checkins = 0
+            self.invalidations = 0
+            self.overflow_checkouts = 0
+            self.peak_overflow = 0
+            self.waits = 0
+            self.wait_ms_total = 0.0
+            self.max_wait_ms = 0.0
+            self.timeouts = 0
+
+    def on_connect(self):
+        with self._lock:
+            self.connects += 1
+
+    def on_checkout(self, pool):
+        overflow = max(0, pool.checkedout() - pool.size())
+        with self._lock:
+            self.checkouts += 1
+            if overflow:
+                self.overflow_checkouts += 1
+                self.peak_overflow = max(self.peak_overflow, overflow)
+
+    def on_checkin(self):
+        with self._lock:
+            self.checkins += 1
+
+    def on_invalidate(self):
+        with self._lock:
+            self.invalidations += 1
+
+    def on_wait(self, seconds: float, timed_out: bool):
+        ms = seconds * 1000
+        with self._lock:
+            self.waits += 1
+            self.wait_ms_total += ms
+            self.max_wait_ms = max(self.max_wait_ms, ms)
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self, pool=None) -> dict:
+        with self._lock:
+            stats = {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "overflow_checkouts": self.overflow_checkouts,
+                "peak_overflow": self.peak_overflow,
+                "waits": self.waits,
+                "avg_wait_ms": round(self.wait_ms_total / self.waits, 2) if self.waits else 0.0,
+                "max_wait_ms": round(self.max_wait_ms, 2),
+                "timeouts": self.timeouts,
+            }
+        if pool is not None:
+            stats.update(pool_size=pool.size(), checked_out=pool.checkedout(), overflow=max(0, pool.overflow()))
+        return stats
+
+
+sync_metrics = PoolMetrics()
+async_metrics = PoolMetrics()
+
+
+class _TimedCheckoutMixin:
+    """Times checkouts that arrive while every pooled and overflow connection is in use."""
+
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        saturated = self.checkedout() >= self.size() + max(self._max_overflow, 0)
+        if not saturated:
+            return super()._do_get()
+        t0 = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.on_wait(time.perf_counter() - t0, timed_out=True)
+            raise
+        self.metrics.on_wait(time.perf_counter() - t0, timed_out=False)
+        return conn
+
+
+class MeteredQueuePool(_TimedCheckoutMixin, QueuePool):
+    metrics = sync_metrics
+
+
+class MeteredAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    metrics = async_metrics
+
+
+def _instrument(engine, metrics: PoolMetrics):
+    event.listen(engine, "connect", lambda *_: metrics.on_connect())
+    event.listen(engine, "checkout", lambda *_: metrics.on_checkout(engine.pool))
+    event.listen(engine, "checkin", lambda *_: metrics.on_checkin())
+    event.listen(engine, "invalidate", lambda *_: metrics.on_invalidate())
+
+
+def _pool_args(pool_class) -> dict:
+    return dict(
+        poolclass=pool_class,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT_S,
+        pool_recycle=DB_POOL_RECYCLE_S,
+        pool_pre_ping=True,
+    )
+
+
+# ------------------------------
+# 🔌 Engines (created on first use)
+# ------------------------------
+@once
+def get_engine():
+    """The shared sync engine; created (not connected) on first use, so importing db is free."""
+    if not PG_CONNECTION_STRING:
+        raise ValueError("PG_CONNECTION_STRING is not set.")
+    engine = create_engine(PG_CONNECTION_STRING, **_pool_args(MeteredQueuePool))
+    _instrument(engine, sync_metrics)
+    return engine
+
+
+def async_dsn(dsn: str) -> str:
+    """Same database, asyncpg driver (postgresql+psycopg2://… → postgresql+asyncpg://…)."""
+    scheme, sep, rest = dsn.partition("://")
+    return f"{scheme.split('+')[0]}+asyncpg{sep}{rest}"
+
+
+@once
+def get_async_engine():
+    """The async path needs asyncpg and is unused by the Streamlit app."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    if not PG_CONNECTION_STRING:
+        raise ValueError("PG_CONNECTION_STRING is not set.")
+    async_engine = create_async_engine(async_dsn(PG_CONNECTION_STRING), **_pool_args(MeteredAsyncQueuePool))
+    _instrument(async_engine.sync_engine, async_metrics)
+    return async_engine
+
+
+def __getattr__(name):
+    """`db.engine` keeps working, resolved on first access."""
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def pool_stats() -> dict:
+    stats = {"sync": sync_metrics.snapshot(get_engine().pool if get_engine.initialized() else None)}
+    if get_async_engine.initialized():
+        stats["async"] = async_metrics.snapshot(get_async_engine().sync_engine.pool)
+    return stats
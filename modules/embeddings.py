@@ -0,0 +1,203 @@
+"""
+Concurrent, throttling-aware embedding client.
+Titan v2 embeds one text per invocation, so throughput comes from keeping many
+invocations in flight; the in-flight limit backs off whenever Bedrock throttles.
+"""
+
+import time
+import random
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.embeddings import Embeddings
+from .cache import LRUCache, DiskCache, SingleFlight, cache_key, normalize_text
+from . import tracing
+
+THROTTLE_CODES = (
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+)
+
+
+def is_throttle_error(exc) -> bool:
+    """True if `exc` (or anything it wraps) is a Bedrock throttling/capacity error."""
+    while exc is not None:
+        code = (getattr(exc, "response", None) or {}).get("Error", {}).get("Code")
+        if code in THROTTLE_CODES or any(c in str(exc) for c in THROTTLE_CODES):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+# ------------------------------
+# 🚦 Adaptive concurrency limit
+# ------------------------------
+class AdaptiveLimiter:
+    """AIMD in-flight limit: halve on throttling, grow by one after a run of successes."""
+
+    def __init__(self, max_limit: int, min_limit: int = 1, grow_after: int = 20):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.grow_after = grow_after
+        self.limit = self.max_limit
+        self._in_flight = 0
+        self._streak = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify()
+
+    def on_success(self):
+        with self._cond:
+            self._streak += 1
+            if self._streak >= self.grow_after and self.limit < self.max_limit:
+                self.limit += 1
+                self._streak = 0
+                self._cond.notify()
+
+    def on_throttle(self):
+        with self._cond:
+            self._streak = 0
+            self.limit = max(self.min_limit, self.limit // 2)
+
+
+# ------------------------------
+# 🧮 Concurrent embeddings
+# ------------------------------
+class ConcurrentEmbeddings(Embeddings):
+    """
+    Wraps an `Embeddings` whose `embed_query` makes one remote call per text and fans
+    `embed_documents` out over a bounded thread pool. Output order matches input order.
+    Throttled calls are retried with jittered exponential backoff.
+    """
+
+    def __init__(self, base: Embeddings, max_concurrency: int = 8, max_retries: int = 6,
+                 backoff_base: float = 0.5, backoff_max: float = 20.0):
+        self.base = base
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limiter = AdaptiveLimiter(max_concurrency)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="embed")
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._throttles = 0
+
+    @property
+    def model_id(self):
+        return getattr(self.base, "model_id", type(self.base).__name__)
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self._calls,
+                "throttles": self._throttles,
+                "concurrency": self.limiter.limit,
+            }
+
+    def _embed_one(self, text: str):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                vector = self.base.embed_query(text)
+            except Exception as e:
+                if not is_throttle_error(e) or attempt == self.max_retries:
+                    raise
+                self.limiter.on_throttle()
+                with self._lock:
+                    self._throttles += 1
+            else:
+                self.limiter.on_success()
+                with self._lock:
+                    self._calls += 1
+                return vector
+            finally:
+                self.limiter.release()
+            delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+            time.sleep(random.uniform(delay / 2, delay))
+
+    def embed_documents(self, texts):
+        if len(texts) <= 1:
+            return [self._embed_one(t) for t in texts]
+        return list(self._pool.map(self._embed_one, texts))
+
+    def embed_query(self, text):
+        return self._embed_one(text)
+
+
+# ------------------------------
+# 🗃️ Query-embedding cache
+# ------------------------------
+class CachedEmbeddings(Embeddings):
+    """
+    Content-addressed cache in front of `embed_query`, keyed by model id + normalized
+    text: an in-process LRU, optionally backed by a SQLite file shared across workers.
+    Concurrent misses for the same text share one Bedrock call (`coalesce`).
+    `namespace` (default: the model id) must change whenever the vectors would, e.g.
+    with the output dimension.
+    `embed_documents` (ingestion) passes straight through.
+    """
+
+    def __init__(self, base: Embeddings, max_entries: int = 4096, disk_path: str = None,
+                 disk_max_entries: int = 200_000, namespace: str = None, coalesce: bool = True):
+        self.base = base
+        self.namespace = namespace
+        self.memory = LRUCache(max_entries)
+        self.disk = DiskCache(disk_path, max_entries=disk_max_entries, table="query_embeddings") if disk_path else None
+        self.inflight = SingleFlight(coalesce)
+        self._lock = threading.Lock()
+        self.misses = 0
+
+    @property
+    def model_id(self):
+        return getattr(self.base, "model_id", type(self.base).__name__)
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "memory_hits": self.memory.hits,
+            "disk_hits": self.disk.hits if self.disk else 0,
+            "misses": self.misses,
+            "coalesced": self.inflight.coalesced,
+            "size": len(self.memory),
+        }
+
+    def embed_query(self, text):
+        key = cache_key(self.namespace or self.model_id, normalize_text(text))
+        vector = self.memory.get(key)
+        if vector is not None:
+            tracing.annotate(embed_cache="memory")
+            return list(vector)
+        if self.disk is not None:
+            blob = self.disk.get(key)
+            if blob is not None:
+                vector = array("f", blob).tolist()
+                self.memory.set(key, tuple(vector))
+                tracing.annotate(embed_cache="disk")
+                return vector
+        vector, shared = self.inflight.do(key, self._embed_miss, key, text)
+        tracing.annotate(embed_cache="coalesced" if shared else "miss")
+        return list(vector)
+
+    def _embed_miss(self, key, text):
+        with self._lock:
+            self.misses += 1
+        vector = tuple(self.base.embed_query(text))
+        self.memory.set(key, vector)
+        if self.disk is not None:
+            self.disk.set(key, array("f", vector).tobytes())
+        return vector
+
+    def embed_documents(self, texts):
+        return self.base.embed_documents(texts)
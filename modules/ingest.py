@@ -0,0 +1,164 @@
+"""
+Streaming ingestion pipeline: PDF pages → chunks → embedding batches → inserts.
+
+Parser processes read one page at a time and hand its chunks over a bounded queue;
+batches move through bounded queues to an embedding thread and a writer thread.
+When a later stage falls behind, the earlier ones block on `put`, so memory stays
+flat however large the corpus (or a single PDF) is.
+"""
+
+import queue
+import threading
+import multiprocessing as mp
+from dataclasses import dataclass, field
+from langchain_core.documents import Document
+
+
+def iter_pdf_pages(path: str):
+    """Pages of one PDF as Documents, read lazily (PyPDFLoader builds the full list first)."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    for number, page in enumerate(reader.pages):
+        yield Document(page_content=page.extract_text(), metadata={"source": path, "page": number})
+
+
+def iter_pdf_chunks(path: str, chunk_size: int, chunk_overlap: int, extra_metadata: dict = None):
+    """Chunks of one PDF, one page's worth at a time (pages are split independently)."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    for page in iter_pdf_pages(path):
+        if extra_metadata:
+            page.metadata.update(extra_metadata)
+        yield splitter.split_documents([page])
+
+
+def parse_worker(tasks, out, chunk_size: int, chunk_overlap: int):
+    """
+    Parser process: for each (source, file_hash) task, emit ("chunks", source, [(text, metadata)])
+    per page, then ("file", source, file_hash); ("error", source, message) if parsing fails.
+    Exits with ("exit", None, None) on the None sentinel.
+    """
+    while True:
+        task = tasks.get()
+        if task is None:
+            out.put(("exit", None, None))
+            return
+        source, file_hash = task
+        try:
+            for chunks in iter_pdf_chunks(source, chunk_size, chunk_overlap, {"file_hash": file_hash}):
+                if chunks:
+                    out.put(("chunks", source, [(c.page_content, c.metadata) for c in chunks]))
+            out.put(("file", source, file_hash))
+        except Exception as e:
+            out.put(("error", source, repr(e)))
+
+
+@dataclass
+class Batch:
+    texts: list = field(default_factory=list)
+    metadatas: list = field(default_factory=list)
+    ids: list = field(default_factory=list)
+    # Files whose last chunk is in this batch or an earlier one: (source, file_hash, stale_ids)
+    completed: list = field(default_factory=list)
+
+
+class PipelineFailed(RuntimeError):
+    pass
+
+
+class StreamingPipeline:
+    """
+    Runs `embed(texts) -> vectors` and `write(batch, vectors)` on their own threads,
+    fed through bounded queues. `submit()` blocks while both queues are full.
+    """
+
+    def __init__(self, embed, write, max_batches: int = 2):
+        self._embed = embed
+        self._write = write
+        self._embed_q = queue.Queue(maxsize=max_batches)
+        self._write_q = queue.Queue(maxsize=max_batches)
+        self._failed = threading.Event()
+        self.error = None
+        self._threads = [
+            threading.Thread(target=self._embed_loop, name="ingest-embed", daemon=True),
+            threading.Thread(target=self._write_loop, name="ingest-write", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+
+    def _put(self, q, item):
+        while True:
+            if self._failed.is_set():
+                raise PipelineFailed(f"ingestion stage failed: {self.error!r}") from self.error
+            try:
+                q.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _fail(self, exc):
+        self.error = exc
+        self._failed.set()
+
+    def _embed_loop(self):
+        try:
+            while True:
+                batch = self._embed_q.get()
+                if batch is None:
+                    self._put(self._write_q, None)
+                    return
+                vectors = self._embed(batch.texts) if batch.texts else []
+                self._put(self._write_q, (batch, vectors))
+        except Exception as e:
+            self._fail(e)
+
+    def _write_loop(self):
+        try:
+            while True:
+                item = self._write_q.get()
+                if item is None:
+                    return
+                self._write(*item)
+        except Exception as e:
+            self._fail(e)
+
+    @property
+    def failed(self) -> bool:
+        return self._failed.is_set()
+
+    def submit(self, batch: Batch):
+        self._put(self._embed_q, batch)
+
+    def close(self):
+        """Flush everything submitted so far; raises if a stage failed."""
+        if not self._failed.is_set():
+            self._put(self._embed_q, None)
+        for t in self._threads:
+            while t.is_alive() and not self._failed.is_set():
+                t.join(timeout=0.5)
+        if self._failed.is_set():
+            raise PipelineFailed(f"ingestion stage failed: {self.error!r}") from self.error
+
+
+def start_parsers(sources, workers: int, chunk_size: int, chunk_overlap: int, max_pages: int):
+    """
+    Start `workers` parser processes over `sources` [(path, hash)]; returns
+    (out_queue, processes, task_queue). Spawned, not forked: the caller already runs
+    threads (embedding pool, DB pool, boto3), and a forked child can inherit their locks
+    in a held state and deadlock. Keep `task_queue` referenced until the workers exit;
+    spawned children re-open it by name.
+    """
+    ctx = mp.get_context("spawn")
+    tasks = ctx.Queue()
+    out = ctx.Queue(maxsize=max_pages)
+    for source in sources:
+        tasks.put(source)
+    procs = []
+    for _ in range(workers):
+        tasks.put(None)
+        p = ctx.Process(target=parse_worker, args=(tasks, out, chunk_size, chunk_overlap), daemon=True)
+        p.start()
+        procs.append(p)
+    return out, procs, tasks
@@ -0,0 +1,34 @@
+"""
+Create-on-first-use singletons for clients, engines and models, so importing a
+module never opens connections or builds SDK clients. Initialization is
+thread-safe; a factory that raises is retried on the next call.
+"""
+
+import functools
+import threading
+
+
+def once(factory):
+    """
+    Decorator: `factory()` runs on the first call only and every later call returns
+    the same object. `.initialized()` tells whether it has run; `.override(value)`
+    replaces the object (benchmarks and tools injecting stand-ins).
+    """
+    lock = threading.Lock()
+    box = []
+
+    @functools.wraps(factory)
+    def get():
+        if not box:
+            with lock:
+                if not box:
+                    box.append(factory())
+        return box[0]
+
+    def override(value):
+        with lock:
+            box[:] = [value]
+
+    get.initialized = lambda: bool(box)
+    get.override = override
+    return get
@@ -0,0 +1,62 @@
+"""
+Lexical matching for AWS text: a tokenizer that keeps identifiers such as
+`s3:PutObject`, `ThrottlingException` or `m5.xlarge` intact (alongside their
+parts), and a small in-memory BM25 index used by the local vector backend.
+"""
+
+import re
+import math
+from collections import Counter
+
+_WORD = re.compile(r"[a-z0-9]+")
+_IDENTIFIER = re.compile(r"[A-Za-z0-9]+(?:[:._/\-][A-Za-z0-9*]+)+|[A-Za-z]*[a-z][A-Z][A-Za-z0-9]*")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it of on or the this to what when "
+    "where which who why with you your my me we our use using".split()
+)
+
+
+def tokenize(text: str) -> list:
+    """Lower-cased word tokens plus whole identifiers (`s3:putobject`, `throttlingexception`)."""
+    tokens = [w for w in _WORD.findall(text.lower()) if w not in STOPWORDS]
+    words = set(tokens)
+    tokens.extend(i for i in (m.lower() for m in _IDENTIFIER.findall(text)) if i not in words)
+    return tokens
+
+
+def identifiers(text: str) -> set:
+    """Just the compound / CamelCase identifiers — the terms embeddings match worst."""
+    return {m.lower() for m in _IDENTIFIER.findall(text)}
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of texts; `search` returns [(row, score)] best first."""
+
+    def __init__(self, texts, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = {}        # term -> [(row, tf), ...]
+        self._lengths = []
+        for row, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            self._lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self._postings.setdefault(term, []).append((row, tf))
+        self.count = len(self._lengths)
+        self._avg_len = (sum(self._lengths) / self.count) if self.count else 0.0
+
+    def _idf(self, term) -> float:
+        df = len(self._postings.get(term, ()))
+        return math.log(1 + (self.count - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int):
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf(term)
+            for row, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[row] / (self._avg_len or 1.0))
+                scores[row] = scores.get(row, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
@@ -0,0 +1,284 @@
+"""
+In-process vector backend: a snapshot of the collection exported to disk.
+
+Layout of an export directory:
+    vectors.npy     float32 [n, dim], L2-normalized, opened with mmap_mode="r"
+    faiss.index     optional IndexFlatIP over the same vectors (memory-mapped read)
+    codes.npy       optional quantized copy: int8 [n, dim] or packed sign bits uint8 [n, dim/8]
+    scales.npy      float32 [dim] per-dimension int8 scales
+    docs.jsonl      one {"id", "text", "metadata"} object per row (the sidecar)
+    offsets.npy     int64 [n + 1] byte offsets into docs.jsonl
+    manifest.json   collection, dim, count, index version, backend, quantization, created_at
+
+Only the rows a query returns are decoded from the sidecar, so resident memory
+stays close to what the OS keeps cached for the mapped files. The BM25 postings
+for hybrid retrieval are the exception: they are built in memory on first use.
+
+Quantized exports are scanned through the codes (4× / 32× less data than float32)
+and only the best `rescore_candidates` rows are read from vectors.npy and rescored
+at full precision. The codes are scanned with numpy, whatever the backend.
+"""
+
+import os
+import json
+import mmap
+import time
+import threading
+import numpy as np
+from langchain_core.documents import Document
+from .lexical import BM25Index
+
+try:
+    import faiss
+except ImportError:  # numpy brute force still works
+    faiss = None
+
+MANIFEST = "manifest.json"
+VECTORS = "vectors.npy"
+FAISS_INDEX = "faiss.index"
+DOCS = "docs.jsonl"
+OFFSETS = "offsets.npy"
+CODES = "codes.npy"
+SCALES = "scales.npy"
+QUANTIZATIONS = ("none", "int8", "binary")
+SCAN_BLOCK = 2048  # rows per block when scanning quantized codes (keeps the float32 upcast in cache)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _write_codes(path: str, vectors, quantization: str):
+    """Quantize the (unit) `vectors` block by block into codes.npy (+ scales.npy for int8)."""
+    count, dim = vectors.shape
+    if quantization == "int8":
+        peak = np.zeros(dim, dtype=np.float32)
+        for start in range(0, count, SCAN_BLOCK):
+            np.maximum(peak, np.abs(vectors[start:start + SCAN_BLOCK]).max(axis=0), out=peak)
+        scales = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+        np.save(os.path.join(path, SCALES), scales)
+        codes = np.lib.format.open_memmap(os.path.join(path, CODES), mode="w+", dtype=np.int8, shape=(count, dim))
+        for start in range(0, count, SCAN_BLOCK):
+            block = np.rint(vectors[start:start + SCAN_BLOCK] / scales)
+            codes[start:start + SCAN_BLOCK] = np.clip(block, -127, 127).astype(np.int8)
+    else:
+        codes = np.lib.format.open_memmap(
+            os.path.join(path, CODES), mode="w+", dtype=np.uint8, shape=(count, (dim + 7) // 8)
+        )
+        for start in range(0, count, SCAN_BLOCK):
+            codes[start:start + SCAN_BLOCK] = np.packbits(vectors[start:start + SCAN_BLOCK] > 0, axis=1)
+    codes.flush()
+    del codes
+
+
+class LocalIndexWriter:
+    """Streams rows into a new export directory; `close()` writes the manifest last."""
+
+    def __init__(self, path: str, count: int, dim: int):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.count = count
+        self.dim = dim
+        self._vectors = np.lib.format.open_memmap(
+            os.path.join(path, VECTORS), mode="w+", dtype=np.float32, shape=(count, dim)
+        )
+        self._offsets = np.zeros(count + 1, dtype=np.int64)
+        self._docs = open(os.path.join(path, DOCS), "wb")
+        self._row = 0
+
+    def add(self, custom_id: str, text: str, metadata: dict, vector):
+        vec = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(vec)) or 1.0
+        self._vectors[self._row] = vec / norm
+        line = json.dumps({"id": custom_id, "text": text, "metadata": metadata or {}}, ensure_ascii=False)
+        self._docs.write(line.encode("utf-8") + b"\n")
+        self._row += 1
+        self._offsets[self._row] = self._docs.tell()
+
+    def close(self, backend: str = "faiss", quantization: str = "none", **manifest) -> dict:
+        if self._row != self.count:
+            raise ValueError(f"expected {self.count} rows, got {self._row}")
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Invalid quantization {quantization!r}; expected one of {QUANTIZATIONS}")
+        self._docs.close()
+        self._vectors.flush()
+        np.save(os.path.join(self.path, OFFSETS), self._offsets)
+        if quantization != "none":
+            _write_codes(self.path, self._vectors, quantization)
+            backend = "numpy"  # the codes are the search index; no float faiss copy
+        if backend == "faiss" and faiss is not None:
+            index = faiss.IndexFlatIP(self.dim)
+            if self.count:
+                index.add(np.ascontiguousarray(self._vectors))
+            faiss.write_index(index, os.path.join(self.path, FAISS_INDEX))
+        else:
+            backend = "numpy"
+        del self._vectors
+        info = dict(manifest, dim=self.dim, count=self.count, backend=backend, quantization=quantization,
+                    created_at=time.time())
+        with open(os.path.join(self.path, MANIFEST), "w") as f:
+            json.dump(info, f)
+        return info
+
+
+class LocalIndex:
+    """A loaded export. Thread-safe for concurrent searches."""
+
+    def __init__(self, path: str, backend: str = None, rescore_candidates: int = 40):
+        self.path = path
+        self.rescore_candidates = rescore_candidates
+        with open(os.path.join(path, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        self.dim = self.manifest["dim"]
+        self.count = self.manifest["count"]
+        self.vectors = np.load(os.path.join(path, VECTORS), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, OFFSETS), mmap_mode="r")
+        self.quantization = self.manifest.get("quantization", "none")
+        self.codes = self.scales = None
+        if self.quantization != "none":
+            self.codes = np.load(os.path.join(path, CODES), mmap_mode="r")
+            if self.quantization == "int8":
+                self.scales = np.load(os.path.join(path, SCALES))
+        self._docs_file = open(os.path.join(path, DOCS), "rb")
+        self._docs = mmap.mmap(self._docs_file.fileno(), 0, access=mmap.ACCESS_READ) if self.count else b""
+        self.index = None
+        backend = backend or self.manifest.get("backend", "numpy")
+        index_path = os.path.join(path, FAISS_INDEX)
+        if backend == "faiss" and faiss is not None and os.path.exists(index_path):
+            self.index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        self.backend = "faiss" if self.index is not None else "numpy"
+        if self.quantization != "none":
+            self.backend = f"numpy+{self.quantization}"
+        self._bm25 = None
+        self._bm25_lock = threading.Lock()
+
+    def _row(self, i: int) -> dict:
+        return json.loads(self._docs[int(self.offsets[i]):int(self.offsets[i + 1])])
+
+    @staticmethod
+    def _unit(vector):
+        query = np.asarray(vector, dtype=np.float32)
+        return query / (float(np.linalg.norm(query)) or 1.0)
+
+    def lexical_search(self, query: str, vector, k: int):
+        """Top-k by BM25 (index built on first use), with each hit's cosine distance."""
+        if self._bm25 is None:
+            with self._bm25_lock:
+                if self._bm25 is None:
+                    self._bm25 = BM25Index(self._row(i)["text"] for i in range(self.count))
+        unit = self._unit(vector)
+        return [(self._row(i), 1.0 - float(self.vectors[i] @ unit)) for i, _ in self._bm25.search(query, k)]
+
+    def search(self, vector, k: int):
+        """Top-k [(row, cosine distance)], same scale as pgvector's `<=>`."""
+        if not self.count:
+            return []
+        k = min(k, self.count)
+        query = self._unit(vector)
+        if self.codes is not None:
+            pairs = self._search_quantized(query, k)
+        elif self.index is not None:
+            scores, ids = self.index.search(query.reshape(1, -1), k)
+            pairs = [(int(i), float(s)) for i, s in zip(ids[0], scores[0]) if i >= 0]
+        else:
+            sims = self.vectors @ query
+            top = np.argpartition(-sims, k - 1)[:k]
+            top = top[np.argsort(-sims[top])]
+            pairs = [(int(i), float(sims[i])) for i in top]
+        return [(self._row(i), 1.0 - s) for i, s in pairs]
+
+    def _coarse_scores(self, query, start, stop):
+        """Approximate similarity (higher = closer) of rows [start, stop) from the codes."""
+        block = self.codes[start:stop]
+        if self.quantization == "int8":
+            return block.astype(np.float32) @ (query * self.scales)
+        bits = np.packbits(query > 0)
+        return -_POPCOUNT[np.bitwise_xor(block, bits)].sum(axis=1, dtype=np.int32).astype(np.float32)
+
+    def _search_quantized(self, query, k):
+        """Best max(k, rescore_candidates) rows by the codes, re-ranked by exact cosine."""
+        n = min(self.count, max(k, self.rescore_candidates))
+        best_ids = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, self.count, SCAN_BLOCK):
+            scores = self._coarse_scores(query, start, min(start + SCAN_BLOCK, self.count))
+            ids = np.arange(start, start + len(scores))
+            if len(scores) > n:
+                keep = np.argpartition(-scores, n - 1)[:n]
+                scores, ids = scores[keep], ids[keep]
+            best_ids = np.concatenate([best_ids, ids])
+            best_scores = np.concatenate([best_scores, scores])
+            if len(best_ids) > n:
+                keep = np.argpartition(-best_scores, n - 1)[:n]
+                best_ids, best_scores = best_ids[keep], best_scores[keep]
+        candidates = np.sort(best_ids)  # ascending offsets: sequential reads from the memmap
+        sims = self.vectors[candidates] @ query
+        order = np.argsort(-sims)[:k]
+        return [(int(candidates[i]), float(sims[i])) for i in order]
+
+    @property
+    def nbytes(self) -> dict:
+        """Bytes of the float vectors and of the quantized codes a search scans."""
+        sizes = {"vectors": int(self.vectors.nbytes)}
+        if self.codes is not None:
+            sizes["codes"] = int(self.codes.nbytes)
+        return sizes
+
+    def close(self):
+        if self.count:
+            self._docs.close()
+        self._docs_file.close()
+
+
+class LocalVectorStore:
+    """
+    Vector store over a `LocalIndex`, reloaded when a newer export replaces the
+    files (checked at most every `reload_check_s`).
+    """
+
+    def __init__(self, path: str, embeddings, collection_name: str, backend: str = None,
+                 reload_check_s: float = 30, rescore_candidates: int = 40):
+        self.path = path
+        self.embeddings = embeddings
+        self.collection_name = collection_name
+        self.backend = backend
+        self.reload_check_s = reload_check_s
+        self.rescore_candidates = rescore_candidates
+        self._lock = threading.Lock()
+        self._index = LocalIndex(path, backend, rescore_candidates)
+        self._manifest_mtime = os.path.getmtime(os.path.join(path, MANIFEST))
+        self._checked_at = time.time()
+
+    @property
+    def index(self) -> LocalIndex:
+        if time.time() - self._checked_at >= self.reload_check_s:
+            self._maybe_reload()
+        return self._index
+
+    def _maybe_reload(self):
+        with self._lock:
+            self._checked_at = time.time()
+            try:
+                mtime = os.path.getmtime(os.path.join(self.path, MANIFEST))
+            except OSError:
+                return
+            if mtime == self._manifest_mtime:
+                return
+            try:
+                fresh = LocalIndex(self.path, self.backend, self.rescore_candidates)
+            except Exception as e:
+                print(f"⚠️ Local index reload failed, keeping the loaded snapshot: {e}")
+                return
+            # The previous snapshot's maps stay valid for in-flight searches until collected
+            self._index, self._manifest_mtime = fresh, mtime
+            print(f"♻️ Reloaded local index ({fresh.count} vectors, {fresh.backend}).")
+
+    def similarity_search_with_score_by_vector(self, embedding, k: int = 4):
+        return [(_document(row), distance) for row, distance in self.index.search(embedding, k)]
+
+    def lexical_search_with_score_by_vector(self, query: str, embedding, k: int = 4):
+        return [(_document(row), distance) for row, distance in self.index.lexical_search(query, embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4):
+        return self.similarity_search_with_score_by_vector(self.embeddings.embed_query(query), k)
+
+
+def _document(row: dict) -> Document:
+    return Document(id=row.get("id"), page_content=row["text"], metadata=row["metadata"])
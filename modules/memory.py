@@ -0,0 +1,134 @@
+"""
+Per-session conversation memory with a background summarizer.
+Each Streamlit session gets its own `SQLChatMessageHistory` rows; the rolling
+summary is refreshed off the response path every few turns, so no summary
+LLM call ever delays an answer.
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from langchain_core.output_parsers import StrOutputParser
+from . import tracing
+
+HISTORY_TABLE = "chat_history"
+
+_worker = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory")
+# One writer thread: turns of a session reach Postgres in the order they were saved
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-write")
+
+
+def _format_lines(messages) -> str:
+    roles = {"human": "Human", "ai": "AI"}
+    return "\n".join(f"{roles.get(m.type, m.type)}: {m.content}" for m in messages if m.content)
+
+
+class SessionMemory:
+    """
+    Raw turns are persisted to Postgres; `context_messages()` returns the rolling
+    summary plus the turns it doesn't cover yet. Every `summarize_every` turns the
+    uncovered turns (minus the most recent `keep_recent`) are folded into the summary
+    by a background worker and dropped from memory. The summary itself is not stored:
+    after a restart the session's rows are reloaded and summarized again in the background.
+    """
+
+    def __init__(self, session_id: str, engine, summary_chain, summarize_every: int = 4, keep_recent: int = 2):
+        self.session_id = session_id
+        self.summary_chain = summary_chain
+        self.summarize_every = summarize_every
+        self.keep_recent = keep_recent
+        self.summary = ""
+        from langchain_community.chat_message_histories import SQLChatMessageHistory  # heavy; first session only
+
+        self._history = SQLChatMessageHistory(
+            table_name=HISTORY_TABLE,
+            session_id=session_id,
+            connection=engine,
+        )
+        self._messages = list(self._history.messages)  # turns not yet folded into self.summary
+        self._pending_turns = 0
+        self._summarizing = False
+        self._lock = threading.Lock()
+        if len(self._messages) > 2 * keep_recent:
+            self._schedule_summary()
+
+    def context_messages(self):
+        with self._lock:
+            recent = list(self._messages)
+            head = [SystemMessage(content=self.summary)] if self.summary else []
+            return head + recent
+
+    def save_turn(self, question: str, answer: str):
+        """Record a turn without blocking: persistence and summarizing run on the worker."""
+        turn = [HumanMessage(content=question), AIMessage(content=answer)]
+        with self._lock:
+            self._messages.extend(turn)
+            self._pending_turns += 1
+            due = self._pending_turns >= self.summarize_every
+        _writer.submit(self._persist, turn)
+        if due:
+            self._schedule_summary()
+
+    def _persist(self, messages):
+        try:
+            self._history.add_messages(messages)
+        except Exception as e:
+            print(f"⚠️ Chat history write failed ({self.session_id}): {e}")
+
+    def _schedule_summary(self):
+        with self._lock:
+            if self._summarizing:
+                return
+            self._summarizing = True
+            self._pending_turns = 0
+        _worker.submit(self._summarize)
+
+    def _summarize(self):
+        try:
+            with self._lock:
+                upto = max(0, len(self._messages) - 2 * self.keep_recent)
+                new_lines = self._messages[:upto]
+                current = self.summary
+            if not new_lines:
+                return
+            with tracing.trace("summarize", session=self.session_id[:8], messages=len(new_lines)):
+                summary = self.summary_chain.invoke({"summary": current, "new_lines": _format_lines(new_lines)}).strip()
+            with self._lock:
+                self.summary = summary
+                del self._messages[:upto]  # only appends happen meanwhile, so these are the summarized ones
+            print(f"🧠 Summarized {len(new_lines)} message(s) for session {self.session_id[:8]}.")
+        except Exception as e:
+            print(f"⚠️ Background summarization failed: {e}")
+        finally:
+            with self._lock:
+                self._summarizing = False
+
+
+class SessionMemoryStore:
+    """Bounded LRU of live `SessionMemory` objects, created on first use."""
+
+    def __init__(self, engine, summary_llm, max_sessions: int = 1000, **memory_kwargs):
+        from langchain.memory.prompt import SUMMARY_PROMPT  # langchain.memory imports most of langchain
+
+        self.engine = engine
+        self.summary_chain = SUMMARY_PROMPT | summary_llm | StrOutputParser()
+        self.max_sessions = max_sessions
+        self.memory_kwargs = memory_kwargs
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> SessionMemory:
+        with self._lock:
+            memory = self._sessions.get(session_id)
+            if memory is not None:
+                self._sessions.move_to_end(session_id)
+                return memory
+        # Load history outside the lock so one slow read doesn't stall other sessions
+        loaded = SessionMemory(session_id, self.engine, self.summary_chain, **self.memory_kwargs)
+        with self._lock:
+            memory = self._sessions.setdefault(session_id, loaded)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return memory
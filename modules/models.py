@@ -1,25 +1,61 @@
 # All Bedrock chat models live here
-from langchain_aws import ChatBedrockConverse
-from .config import bedrock_client
+from .config import get_bedrock_client
+
+# Context windows (tokens) per model family, used to cap the retrieved-context budget
+MODEL_CONTEXT_WINDOWS = {
+    "llama3": 8192,
+    "nova": 300_000,
+}
+
+
+# Generation settings offered by the UI, (min, max, step). Headless callers are held to the
+# same grid: the pipeline registry keeps one set of clients per combination.
+MAX_TOKENS_RANGE = (256, 2048, 128)
+TEMPERATURE_RANGE = (0.0, 1.0, 0.1)
+
+
+def generation_settings(max_tokens, temperature) -> tuple:
+    """(max_tokens, temperature) checked against the ranges above; temperature is rounded to 0.1."""
+    try:
+        max_tokens, temperature = int(max_tokens), round(float(temperature), 1)
+    except (TypeError, ValueError):
+        raise ValueError("max_tokens must be an integer and temperature a number")
+    low, high, step = MAX_TOKENS_RANGE
+    if not low <= max_tokens <= high or (max_tokens - low) % step:
+        raise ValueError(f"max_tokens must be {low}-{high} in steps of {step}, got {max_tokens}")
+    if not TEMPERATURE_RANGE[0] <= temperature <= TEMPERATURE_RANGE[1]:
+        raise ValueError(f"temperature must be within {TEMPERATURE_RANGE[0]}-{TEMPERATURE_RANGE[1]}, got {temperature}")
+    return max_tokens, temperature
+
+
+def model_family(model_id: str) -> str:
+    model_id = (model_id or "").lower()
+    if "llama3" in model_id:
+        return "llama3"
+    if "nova" in model_id:
+        return "nova"
+    return "default"
+
+def _converse(model, max_tokens, temperature):
+    # langchain_aws is imported on first model creation, not when this module loads
+    from langchain_aws import ChatBedrockConverse
 
-# Fast/cheap – good for chat & summarization
-def create_llama3_model(max_tokens=1024, temperature=0.5):
     return ChatBedrockConverse(
-        client=bedrock_client,
-        model="meta.llama3-8b-instruct-v1:0",
+        client=get_bedrock_client(),
+        model=model,
         max_tokens=max_tokens,
         temperature=temperature,
         top_p=0.9,
     )
 
+# Fast/cheap – good for chat & summarization
+def create_llama3_model(max_tokens=1024, temperature=0.5):
+    return _converse("meta.llama3-8b-instruct-v1:0", max_tokens, temperature)
+
 # Deep/reasoning – Nova Pro via Inference Profile ARN
 def create_nova_model(max_tokens=1024, temperature=0.5):
-    return ChatBedrockConverse(
-        client=bedrock_client,
-        model="arn:aws:bedrock:us-east-1:359416636668:inference-profile/us.amazon.nova-pro-v1:0",
-        max_tokens=max_tokens,
-        temperature=temperature,
-        top_p=0.9,
+    return _converse(
+        "arn:aws:bedrock:us-east-1:359416636668:inference-profile/us.amazon.nova-pro-v1:0", max_tokens, temperature
     )
 
 # Lightweight summarizer for memory – use Llama 3
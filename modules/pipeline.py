@@ -0,0 +1,91 @@
+"""
+Long-lived RAG pipelines.
+Model client, vector store and QA chain are built once per (model, max_tokens,
+temperature) and reused across Streamlit reruns, sessions and batch callers.
+Model "auto" wraps the Llama 3 and Nova Pro clients in a `ModelRouter`.
+"""
+
+import time
+import threading
+from dataclasses import dataclass
+from typing import Any
+from modules.models import create_llama3_model, create_nova_model, generation_settings
+from modules.vectorstore import load_vector_store
+from modules.qa_chain import get_qa_chain
+from modules.router import ModelRouter, AUTO_MODEL, ROUTES
+
+MODEL_FACTORIES = {
+    "llama3": create_llama3_model,
+    "nova": create_nova_model,
+}
+
+
+@dataclass
+class RagPipeline:
+    key: tuple
+    llm: Any
+    vector_store: Any
+    qa_chain: Any
+    build_ms: float
+
+
+class PipelineRegistry:
+    def __init__(self):
+        self._pipelines = {}
+        self._vector_store = None
+        self._lock = threading.Lock()
+        self.vector_store_ms = 0.0
+        self.builds = 0
+        self.lookups = 0
+        self.lookup_ms_total = 0.0
+
+    def vector_store(self):
+        if self._vector_store is None:
+            with self._lock:
+                if self._vector_store is None:
+                    t0 = time.perf_counter()
+                    self._vector_store = load_vector_store()
+                    self.vector_store_ms = (time.perf_counter() - t0) * 1000
+        return self._vector_store
+
+    def get(self, model: str, max_tokens: int, temperature: float) -> RagPipeline:
+        t0 = time.perf_counter()
+        key = (model, *generation_settings(max_tokens, temperature))
+        pipeline = self._pipelines.get(key)
+        if pipeline is None:
+            if model not in MODEL_FACTORIES and model != AUTO_MODEL:
+                raise ValueError(f"Unknown model '{model}'. Expected one of {sorted(MODEL_FACTORIES) + [AUTO_MODEL]}.")
+            vector_store = self.vector_store()
+            # The router shares the per-model clients (built outside the lock, which isn't reentrant)
+            routed = {r: self.get(r, key[1], key[2]).llm for r in ROUTES} if model == AUTO_MODEL else None
+            with self._lock:
+                pipeline = self._pipelines.get(key)
+                if pipeline is None:
+                    b0 = time.perf_counter()
+                    if routed is not None:
+                        llm = ModelRouter(routed)
+                    else:
+                        llm = MODEL_FACTORIES[model](max_tokens=key[1], temperature=key[2])
+                    chain = get_qa_chain(llm, vector_store)
+                    pipeline = RagPipeline(key, llm, vector_store, chain, (time.perf_counter() - b0) * 1000)
+                    self._pipelines[key] = pipeline
+                    self.builds += 1
+                    print(f"🔧 Built pipeline {key} in {pipeline.build_ms:.1f} ms")
+        self.lookups += 1
+        self.lookup_ms_total += (time.perf_counter() - t0) * 1000
+        return pipeline
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "pipelines": len(self._pipelines),
+            "builds": self.builds,
+            "build_ms": {str(k): round(p.build_ms, 1) for k, p in self._pipelines.items()},
+            "vector_store_ms": round(self.vector_store_ms, 1),
+            "lookups": self.lookups,
+            "avg_lookup_ms": round(self.lookup_ms_total / self.lookups, 3) if self.lookups else 0.0,
+            "routers": {str(k): p.llm.stats for k, p in self._pipelines.items() if isinstance(p.llm, ModelRouter)},
+        }
+
+
+registry = PipelineRegistry()
@@ -3,110 +3,446 @@ Hybrid RAG + SerpAPI + GROQ fallback.
 Uses PGVector (PDFs) first, then live AWS Docs if context is weak.
 """
 
-import os, requests
-from langchain.chains import ConversationalRetrievalChain
-from langchain_community.chat_message_histories import SQLChatMessageHistory
-from langchain.memory import ConversationSummaryMemory
-from sqlalchemy import create_engine
+import os, copy, time, requests, threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+from langchain_core.output_parsers import StrOutputParser
 from modules.prompts import rag_prompt
-from modules.config import PG_CONNECTION_STRING
-from modules.models import create_llama3_model
-from modules.web_search import search_aws_docs, fetch_page_content, summarize_with_groq
+from modules.config import (
+    ANSWER_CACHE_ENABLED,
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL_S,
+    ANSWER_CACHE_SIZE,
+    COALESCE_INFLIGHT,
+    SPECULATIVE_FALLBACK,
+    RETRIEVAL_MAX_DISTANCE,
+    RETRIEVAL_MIN_DOCS,
+    MEMORY_SUMMARIZE_EVERY,
+    MEMORY_KEEP_RECENT_TURNS,
+    RETRIEVAL_K,
+)
+from modules.db import get_engine
+from modules.lazy import once
+from modules.models import create_summary_model
+from modules.router import ModelRouter, HARD
+from modules.vectorstore import get_index_version
+from modules.answer_cache import SemanticAnswerCache
+from modules.cache import SingleFlight, cache_key, normalize_text
+from modules.retrieval import make_retriever, RetrievalGate
+from modules.memory import SessionMemoryStore
+from modules.context import pack_context, context_budget, estimate_tokens
+from modules import tracing
+from modules.web_search import search_aws_docs, fetch_pages, summarize_with_groq
 
 # ------------------------------
-# 🧠 Persistent Memory
+# 🧠 Persistent Memory (per session)
 # ------------------------------
-engine = create_engine(PG_CONNECTION_STRING)
-chat_history = SQLChatMessageHistory(
-    table_name="chat_history",
-    session_id="default_session",
-    connection_string=PG_CONNECTION_STRING,
-)
-summary_llm = create_llama3_model(max_tokens=256, temperature=0.3)
-memory = ConversationSummaryMemory(
-    llm=summary_llm,
-    memory_key="chat_history",
-    return_messages=True,
-    output_key="answer",
-    chat_memory=chat_history,
+DEFAULT_SESSION_ID = "default_session"
+
+@once
+def get_session_memories() -> SessionMemoryStore:
+    """Built on the first question: importing qa_chain creates no engine or summary model."""
+    return SessionMemoryStore(
+        get_engine(),
+        create_summary_model(),
+        summarize_every=MEMORY_SUMMARIZE_EVERY,
+        keep_recent=MEMORY_KEEP_RECENT_TURNS,
+    )
+
+# ------------------------------
+# ⚡ Semantic answer cache
+# ------------------------------
+answer_cache = SemanticAnswerCache(
+    threshold=ANSWER_CACHE_THRESHOLD,
+    ttl_s=ANSWER_CACHE_TTL_S,
+    max_entries=ANSWER_CACHE_SIZE,
+    version_fn=get_index_version,
 )
 
+# Identical questions asked while one is already being answered (incident spikes)
+# replay its events instead of running retrieval, web fallback and generation again.
+inflight_answers = SingleFlight(COALESCE_INFLIGHT)
+
+
+def _copy_event(event):
+    """Independent copy of an event: payload dicts carry lists (`sources`) that callers mutate."""
+    kind, payload = event
+    return (kind, copy.deepcopy(payload)) if isinstance(payload, dict) else event
+
+
 # ------------------------------
 # 🌐 Fallback trigger logic
 # ------------------------------
+FUTURE_KEYWORDS = ["2025", "preview", "latest", "new", "release", "announcement"]
+
+retrieval_gate = RetrievalGate(max_distance=RETRIEVAL_MAX_DISTANCE, min_docs=RETRIEVAL_MIN_DOCS)
+
+
+def _mentions_future(query: str) -> bool:
+    return any(f in query.lower() for f in FUTURE_KEYWORDS)
+
+
+# typical refusal phrases
+REFUSAL_PHRASES = [
+    "not related to aws",
+    "not related to aws prescriptive guidance",
+    "not related to the provided documents",
+    "no response generated",
+    "i don't know",
+    "cannot answer",
+    "no relevant information",
+]
+
+
+def is_refusal(answer: str) -> bool:
+    text = (answer or "").lower()
+    return not text or any(t in text for t in REFUSAL_PHRASES)
+
+
 def should_fallback(answer: str, query: str) -> bool:
+    """Post-generation safety net: empty answers, refusals and new/preview topics."""
     if not answer:
         return True
-    text = answer.lower()
-    # typical refusal phrases
-    triggers = [
-        "not related to aws",
-        "not related to aws prescriptive guidance",
-        "not related to the provided documents",
-        "no response generated",
-        "i don't know",
-        "cannot answer",
-        "no relevant information",
-    ]
     # new/future topics trigger automatically
-    future = ["2025", "preview", "latest", "new", "release", "announcement"]
-    if any(f in query.lower() for f in future):
+    if _mentions_future(query):
         print("🧠 Future/preview keyword detected — forcing SerpAPI fallback.")
         return True
-    return any(t in text for t in triggers) or len(text.split()) < 40
+    return is_refusal(answer)
+
+
+def fallback_likely(query: str) -> bool:
+    """Known before retrieval: new/preview topics always end up consulting live docs."""
+    return _mentions_future(query)
+
+
+# ------------------------------
+# 🌐 Web retrieval (SerpAPI → scrape → GROQ)
+# ------------------------------
+_web_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="web")
+
+
+def _web_context(query_str, reason=""):
+    """Returns (summary, links); summary is "" when nothing usable was found."""
+    with tracing.span("web", reason=reason) as sp:
+        links = search_aws_docs(query_str)
+        if not links:
+            return "", []
+        text = "".join(page for _, page in fetch_pages(links[:3]))
+        summary = summarize_with_groq(text) if text else ""
+        sp.set(links=len(links), summary_chars=len(summary))
+        return summary, links
+
+
+# ------------------------------
+# 🧩 RAG chain (built once per llm/vector store)
+# ------------------------------
+@dataclass
+class RagChain:
+    llm: Any
+    retriever: Any  # .search(question, vector=None, timings=None) -> [(Document, distance)]
+    condense: Any  # chat history + follow-up → standalone question
+    router: Any = None  # ModelRouter when `llm` is the "auto" model
+
+
+# Chains are built once per (llm, vector_store) pair; the pair is kept alive with
+# the chain so the id()-based key can't be reused by another object.
+_chains = {}
+_chains_lock = threading.Lock()
+
+
+def get_qa_chain(llm, vector_store):
+    key = (id(llm), id(vector_store))
+    entry = _chains.get(key)
+    if entry is None:
+        from langchain.chains.conversational_retrieval.prompts import CONDENSE_QUESTION_PROMPT
+
+        with _chains_lock:
+            entry = _chains.get(key)
+            if entry is None:
+                router = llm if isinstance(llm, ModelRouter) else None
+                chain = RagChain(
+                    llm=llm,
+                    retriever=make_retriever(vector_store, k=RETRIEVAL_K),
+                    condense=CONDENSE_QUESTION_PROMPT | (router.condense_llm if router else llm) | StrOutputParser(),
+                    router=router,
+                )
+                entry = _chains[key] = (llm, vector_store, chain)
+    return entry[2]
+
+
+def _format_history(messages) -> str:
+    roles = {"human": "Human: ", "ai": "Assistant: "}
+    return "".join(
+        f"\n{roles.get(m.type, f'{m.type}: ')}{m.content}" for m in messages if m.content
+    )
+
+
+def _chunk_text(chunk) -> str:
+    """Text of a streamed chunk (Converse chunks carry a list of content blocks)."""
+    content = getattr(chunk, "content", chunk)
+    if isinstance(content, str):
+        return content
+    return "".join(b.get("text", "") if isinstance(b, dict) else str(b) for b in content)
+
+
+def _stream_llm(llm, prompt, parts, span_name="generate", usage_out=None):
+    """
+    Stream `prompt` through `llm`, yielding token events and collecting text into `parts`;
+    Bedrock's reported token usage is added to `usage_out` when given.
+    """
+    usage = None
+    prompt_tokens = estimate_tokens(prompt)
+    with tracing.span(span_name, model=getattr(llm, "model_id", ""), prompt_tokens_est=prompt_tokens) as sp:
+        started = time.perf_counter()
+        for chunk in llm.stream(prompt):
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            delta = _chunk_text(chunk)
+            if delta:
+                if not parts:
+                    sp.set(ttft_ms=round((time.perf_counter() - started) * 1000, 1))
+                parts.append(delta)
+                yield ("token", delta)
+        if usage:
+            sp.set(input_tokens=usage["input_tokens"], output_tokens=usage["output_tokens"])
+            if usage_out is not None:
+                for k in ("input_tokens", "output_tokens"):
+                    usage_out[k] = usage_out.get(k, 0) + usage[k]
+    reported = f", Bedrock input={usage['input_tokens']} output={usage['output_tokens']}" if usage else ""
+    print(f"🧮 Prompt ~{prompt_tokens} tokens{reported}")
 
 
 # ------------------------------
 # 🔗 Hybrid pipeline
 # ------------------------------
-def get_response_with_prompt(llm, vector_store, query):
+def get_response_with_prompt(llm, vector_store, query, session_id=DEFAULT_SESSION_ID):
+    """
+    Blocking wrapper around `stream_response_with_prompt`; returns {"answer", "sources"}.
+    Pass `session_id=None` to answer without conversation memory.
+    """
+    result = {"answer": "", "sources": []}
+    for kind, payload in stream_response_with_prompt(llm, vector_store, query, session_id=session_id):
+        if kind == "done":
+            result = payload
+    return result
+
+
+def stream_response_with_prompt(llm, vector_store, query, session_id=DEFAULT_SESSION_ID):
+    """
+    Run the hybrid pipeline, yielding events as they happen:
+    ("token", text) for each generated chunk, ("reset", None) when a streamed answer is
+    discarded in favour of the web fallback (("reset", "escalate") when a routed answer is
+    regenerated on Nova Pro), and finally ("done", {"answer", "sources", "trace_id"}; plus
+    "route" and "route_reason" for the "auto" model). Each call is traced as one
+    "rag_request" (see `tracing`).
+    """
+    model_id = getattr(llm, "model_id", type(llm).__name__)
+    with tracing.trace("rag_request", model=model_id, session=str(session_id)[:12]) as root:
+        for kind, payload in _pipeline(llm, vector_store, query, session_id, model_id, root):
+            if kind == "done":
+                payload["trace_id"] = root.trace.trace_id
+            yield kind, payload
+
+
+def _pipeline(llm, vector_store, query, session_id, model_id, root):
     query_str = query if isinstance(query, str) else str(query)
+    chain = get_qa_chain(llm, vector_store)
+
+    # Follow-ups are condensed into a standalone question first, so retrieval, the
+    # gate, the answer cache and the web search all see the same question.
+    question = query_str
+    memory = None
+    try:
+        # session_id=None: stateless (batch/eval callers), no history read or written
+        memory = get_session_memories().get(session_id) if session_id is not None else None
+        history = memory.context_messages() if memory is not None else []
+        if history:
+            with tracing.span("condense", history_messages=len(history)):
+                question = chain.condense.invoke(
+                    {"chat_history": _format_history(history), "question": query_str}
+                ).strip() or query_str
+    except Exception as e:
+        print(f"⚠️ Question condensing failed: {e}")
+
+    # Same chain + same standalone question → one computation, fanned out to every waiter
+    ran = []
+
+    def resolve():
+        ran.append(True)
+        return _resolve(chain, vector_store, question, query_str, model_id, root)
+
+    key = cache_key(id(chain), normalize_text(question), normalize_text(query_str))
+    result = {}
+    for event in inflight_answers.stream(key, resolve, copy=_copy_event, restart_event=("reset", None)):
+        if event[0] == "done":
+            result = event[1]
+        else:
+            yield event
+    if not ran:
+        print("🛬 Joined an identical in-flight question.")
+        root.set(coalesced=True)
+
+    if memory is not None and result.get("answer"):
+        memory.save_turn(query_str, result["answer"])
+    yield ("done", result)
 
-    qa_chain = ConversationalRetrievalChain.from_llm(
-        llm=llm,
-        retriever=vector_store.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 3},
-        ),
-        memory=memory,
-        combine_docs_chain_kwargs={"prompt": rag_prompt},
-        return_source_documents=True,
-    )
 
+def _resolve(chain, vector_store, question, query_str, model_id, root):
+    """Everything after condensing: retrieval, answer cache, gate, generation, web fallback."""
+    # Speculative: start the web lookup now, concurrently with vector search
+    web_future = None
+    if SPECULATIVE_FALLBACK and fallback_likely(question):
+        print("🚀 Fallback likely — fetching live AWS Docs alongside local retrieval ...")
+        web_future = tracing.submit(_web_pool, _web_context, question, "speculative")
+
+    vector, scored, timings = None, [], {}
     try:
-        result = qa_chain.invoke({"question": query_str})
-        answer = result.get("answer", "").strip()
-        srcs = {d.metadata.get("source", "Unknown") for d in result.get("source_documents", [])}
+        t0 = time.perf_counter()
+        with tracing.span("embed"):
+            vector = vector_store.embeddings.embed_query(question)
+        timings["embed_ms"] = (time.perf_counter() - t0) * 1000
+        with tracing.span("search") as sp:
+            scored = chain.retriever.search(question, vector=vector, timings=timings)
+            sp.set(results=len(scored), **{k: round(v, 2) for k, v in timings.items() if k != "embed_ms"})
+        print("🔎 Retrieval: " + ", ".join(f"{stage}={ms:.1f}" for stage, ms in timings.items()))
+    except Exception as e:
+        print(f"⚠️ Retrieval failed: {e}")
+    source_key = tuple(sorted({d.metadata.get("source", "Unknown") for d, _ in scored}))
+
+    if ANSWER_CACHE_ENABLED and vector is not None:
+        with tracing.span("answer_cache") as sp:
+            cached = answer_cache.lookup(vector, model_id, source_key)
+            sp.set(hit=bool(cached))
+        if cached:
+            print("⚡ Answer cache hit.")
+            root.set(answer_cache="hit")
+            yield ("done", cached)
+            return
+
+    # Gate: don't pay for a generation the local context can't support
+    decision = retrieval_gate.decide(scored)
+    root.set(gate_sufficient=decision.sufficient, gate_best=decision.best)
+    if web_future is None and (not decision.sufficient or fallback_likely(question)):
+        print(f"🚧 Local context: {decision.reason} — consulting live AWS Docs before generating.")
+        web_future = tracing.submit(_web_pool, _web_context, question, "gate")
+
+    if chain.router is None:
+        result = yield from _generate(chain, chain.llm, question, query_str, scored, web_future)
+    else:
+        result = yield from _routed(chain, decision, question, query_str, scored, web_future, root)
+
+    cacheable = result.pop("cacheable", False)
+    if ANSWER_CACHE_ENABLED and vector is not None and cacheable:
+        answer_cache.store(vector, model_id, source_key, result)
+    yield ("done", result)
+
+
+def _generate(chain, llm, question, query_str, scored, web_future, usage_out=None):
+    """Pass `_answer`'s token / reset events through and return its final result."""
+    result = {}
+    for event in _answer(chain, llm, question, query_str, scored, web_future, usage_out):
+        if event[0] == "done":
+            result = event[1]
+        else:
+            yield event
+    return result
+
+
+def _routed(chain, gate, question, query_str, scored, web_future, root):
+    """Answer on the model the router picks; regenerate a poor simple-route answer on Nova Pro."""
+    router = chain.router
+    with tracing.span("route") as sp:
+        route = router.route(question, gate)
+        sp.set(route=route.route, reason=route.reason)
+    root.set(route=route.route)
+    print(f"🧭 Routed to {route.route}: {route.reason}")
+
+    usage, started = {}, time.perf_counter()
+    result = yield from _generate(chain, router.models[route.route], question, query_str, scored, web_future, usage)
+    reason = router.escalation_reason(route, result.get("answer", ""), refused=is_refusal(result.get("answer")))
+    router.record(route.route, (time.perf_counter() - started) * 1000, usage, escalated=reason is not None)
+    if reason is None:
+        return {**result, "route": route.route, "route_reason": route.reason}
+
+    print(f"⤴️ Escalating to {HARD}: {reason}")
+    root.set(escalated=reason)
+    yield ("reset", "escalate")
+    usage, started = {}, time.perf_counter()
+    result = yield from _generate(chain, router.models[HARD], question, query_str, scored, web_future, usage)
+    router.record(HARD, (time.perf_counter() - started) * 1000, usage)
+    return {**result, "route": HARD, "route_reason": f"escalated: {reason}"}
+
+
+def _answer(chain, llm, question, query_str, scored, web_future=None, usage_out=None):
+    parts = []
+    budget = context_budget(getattr(llm, "model_id", ""), getattr(llm, "max_tokens", 0), question)
+    packed = pack_context(scored, question, budget)
+    srcs = {d.metadata.get("source", "Unknown") for d in packed.docs}
+    context = packed.text
+    print(f"📦 {packed.report()}")
+    tracing.annotate(context_tokens=packed.tokens, context_budget=budget)
+    try:
+        # ---------------- Web context (speculative or gated) ----------------
+        if web_future is not None:
+            with tracing.span("web_wait"):
+                summary, links = web_future.result()
+            if summary:
+                print("🌐 Merging live AWS Docs with local context.")
+                # The web summary takes its share of the budget first
+                packed = pack_context(scored, question, max(0, budget - estimate_tokens(summary)))
+                context = packed.text
+                srcs = {d.metadata.get("source", "Unknown") for d in packed.docs}
+                merged = (
+                    f"{context}\n\n--- Live AWS documentation (SerpAPI + GROQ) ---\n{summary}"
+                    if context else summary
+                )
+                yield from _stream_llm(llm, rag_prompt.format(context=merged, question=question), parts,
+                                       usage_out=usage_out)
+                yield ("done", {
+                    "answer": "".join(parts).strip(),
+                    "sources": links + sorted(srcs - set(links)),
+                    "cacheable": True,
+                })
+                return
+            print("🌐 No live AWS info found, answering from local context.")
+
+        yield from _stream_llm(llm, rag_prompt.format(context=context, question=question), parts,
+                               usage_out=usage_out)
+        answer = "".join(parts).strip()
     except Exception as e:
         print(f"❌ RAG chain error: {e}")
-        answer, srcs = "", set()
+        answer = ""
 
     # ---------------- Fallback ----------------
     if should_fallback(answer, query_str):
-        print("🌐 Falling back to SerpAPI + GROQ ...")
-        links = search_aws_docs(query_str)
-        if links:
-            text = ""
-            for u in links[:3]:
-                text += fetch_page_content(u)
-            summary = summarize_with_groq(text) if text else ""
-            if summary:
-                enhanced = f"""Based on latest AWS docs:
+        # Skip the web round trip if it already came back empty for this question
+        summary, links = "", []
+        if web_future is None:
+            print("🌐 Falling back to SerpAPI + GROQ ...")
+            summary, links = _web_context(question, "post-generation")
+        if summary:
+            enhanced = f"""Based on latest AWS docs:
 {summary}
 
-Question: {query_str}
+Question: {question}
 Provide code snippets (Python/boto3/SQL/CLI) and AWS best practices."""
-                try:
-                    resp = llm.invoke(enhanced)
-                    new_ans = getattr(resp, "content", str(resp))
-                    return {"answer": new_ans.strip(), "sources": links}
-                except Exception as e:
-                    print(f"⚠️ Fallback LLM error: {e}")
-                    return {"answer": summary[:2000], "sources": links}
-        return {
+            if parts:
+                yield ("reset", None)
+            new_parts = []
+            try:
+                yield from _stream_llm(llm, enhanced, new_parts, span_name="generate_fallback", usage_out=usage_out)
+                yield ("done", {"answer": "".join(new_parts).strip(), "sources": links, "cacheable": True})
+            except Exception as e:
+                print(f"⚠️ Fallback LLM error: {e}")
+                if new_parts:
+                    yield ("reset", None)
+                yield ("done", {"answer": summary[:2000], "sources": links})
+            return
+        yield ("done", {
             "answer": answer + "\n\n(No live AWS info found.)",
             "sources": list(srcs),
-        }
+        })
+        return
 
     print("📚 Using local PDF embeddings.")
-    return {"answer": answer, "sources": list(srcs)}
+    yield ("done", {"answer": answer, "sources": list(srcs), "cacheable": bool(answer)})
@@ -0,0 +1,66 @@
+"""
+Optional rerankers for fused retrieval candidates.
+Candidates are (Document, distance, fused score) tuples, best first; a reranker
+returns them re-ordered (and may rewrite the score).
+"""
+
+from .config import RERANK_MODEL
+from .lexical import tokenize, identifiers
+
+
+class OverlapReranker:
+    """
+    Cheap, dependency-free: boosts chunks containing the question's terms, and most
+    of all its identifiers (API actions, exception names, instance types).
+    """
+
+    def __init__(self, term_weight: float = 0.5, identifier_weight: float = 1.0):
+        self.term_weight = term_weight
+        self.identifier_weight = identifier_weight
+
+    def rerank(self, query: str, candidates):
+        terms = set(tokenize(query))
+        ids = identifiers(query)
+        top_score = max(score for _, _, score in candidates) or 1.0
+        rescored = []
+        for doc, distance, score in candidates:
+            doc_terms = set(tokenize(doc.page_content))
+            boost = 0.0
+            if terms:
+                boost += self.term_weight * len(terms & doc_terms) / len(terms)
+            if ids:
+                boost += self.identifier_weight * len(ids & doc_terms) / len(ids)
+            rescored.append((doc, distance, score / top_score + boost))
+        return sorted(rescored, key=lambda c: c[2], reverse=True)
+
+
+class CrossEncoderReranker:
+    """Local cross-encoder (sentence-transformers); the model loads on first use."""
+
+    def __init__(self, model_name: str, max_chars: int = 2000):
+        from sentence_transformers import CrossEncoder  # optional dependency
+
+        self._model_cls = CrossEncoder
+        self.model_name = model_name
+        self.max_chars = max_chars
+        self._model = None
+
+    def rerank(self, query: str, candidates):
+        if self._model is None:
+            self._model = self._model_cls(self.model_name)
+        scores = self._model.predict([(query, doc.page_content[:self.max_chars]) for doc, _, _ in candidates])
+        rescored = [(doc, distance, float(s)) for (doc, distance, _), s in zip(candidates, scores)]
+        return sorted(rescored, key=lambda c: c[2], reverse=True)
+
+
+def get_reranker(name: str):
+    """`name` is "none", "overlap" or "cross-encoder" (falls back to overlap if unavailable)."""
+    if name == "overlap":
+        return OverlapReranker()
+    if name == "cross-encoder":
+        try:
+            return CrossEncoderReranker(RERANK_MODEL)
+        except ImportError:
+            print("⚠️ sentence-transformers not installed — using the overlap reranker.")
+            return OverlapReranker()
+    return None
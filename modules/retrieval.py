@@ -0,0 +1,350 @@
+"""
+Scored retrieval and the pre-generation gate.
+Retrieval returns (Document, cosine distance) pairs so the pipeline can decide
+whether local context is good enough *before* paying for a generation.
+"""
+
+import json
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+from sqlalchemy import text
+from langchain_core.documents import Document
+from .ann_index import collection_uuid, search_settings, search_sql, fts_search_sql
+from .config import HYBRID_SEARCH, HYBRID_CANDIDATES, RRF_K, RERANKER, RETRIEVAL_MAX_DISTANCE, RETRIEVAL_MIN_DOCS
+from .db import get_engine
+from .rerank import get_reranker
+from .tracing import percentile
+
+ASYNC_VECTOR_PARAM = "CAST(CAST(:vector AS text) AS vector({dim}))"
+
+
+def _elapsed_ms(t0):
+    return (time.perf_counter() - t0) * 1000
+
+
+def _vector_literal(vector) -> str:
+    return "[" + ",".join(map(str, vector)) + "]"
+
+
+# ------------------------------
+# 🔎 Vector retrieval with scores
+# ------------------------------
+class VectorRetriever:
+    """
+    Cosine top-k within the collection through the ANN index (see `ann_index`),
+    with ef_search/probes applied per query. `exact=True` forces a sequential scan.
+    """
+
+    collection_ttl_s = 60  # re-resolve the collection id (a --rebuild gives it a new one)
+
+    def __init__(self, vector_store, k: int = 3, engine=None, ef_search: int = None, probes: int = None):
+        self.vector_store = vector_store
+        self.k = k
+        self.engine = engine or get_engine()
+        self.ef_search = ef_search
+        self.probes = probes
+        self._collection_id = None
+        self._resolved_at = 0.0
+
+    def _collection(self, conn):
+        if self._collection_id is None or time.time() - self._resolved_at > self.collection_ttl_s:
+            self._collection_id = collection_uuid(conn, self.vector_store.collection_name)
+            self._resolved_at = time.time()
+        return self._collection_id
+
+    def search(self, query: str, vector=None, k: int = None, exact: bool = False, timings: dict = None):
+        """Top-k (Document, distance) pairs; lower distance = closer."""
+        if vector is None:
+            vector = self.vector_store.embeddings.embed_query(query)
+        t0 = time.perf_counter()
+        with self.engine.begin() as conn:
+            collection_id = self._collection(conn)
+            if collection_id is None:
+                return []
+            if not exact:
+                for stmt in search_settings(self.ef_search, self.probes):
+                    conn.execute(text(stmt))
+            rows = conn.execute(
+                search_sql(collection_id, exact=exact),
+                {"vector": _vector_literal(vector), "k": k or self.k},
+            ).all()
+        if timings is not None:
+            timings["vector_ms"] = _elapsed_ms(t0)
+        return _scored(rows)
+
+    def lexical_search(self, query: str, vector, k: int = None):
+        """Top-k by Postgres full-text rank, as (Document, cosine distance) pairs."""
+        with self.engine.connect() as conn:
+            collection_id = self._collection(conn)
+            if collection_id is None:
+                return []
+            rows = conn.execute(
+                fts_search_sql(collection_id),
+                {"vector": _vector_literal(vector), "text": query, "k": k or self.k},
+            ).all()
+        return _scored(rows)
+
+    async def asearch(self, query: str, vector=None, k: int = None, exact: bool = False):
+        """Async `search` over the asyncpg pool, for callers running many queries on one event loop."""
+        from .db import get_async_engine
+
+        if vector is None:
+            vector = await self.vector_store.embeddings.aembed_query(query)
+        async with get_async_engine().begin() as conn:
+            collection_id = await conn.run_sync(self._collection)
+            if collection_id is None:
+                return []
+            if not exact:
+                for stmt in search_settings(self.ef_search, self.probes):
+                    await conn.execute(text(stmt))
+            rows = (await conn.execute(
+                search_sql(collection_id, exact=exact, vector_param=ASYNC_VECTOR_PARAM),
+                {"vector": _vector_literal(vector), "k": k or self.k},
+            )).all()
+        return _scored(rows)
+
+    async def alexical_search(self, query: str, vector, k: int = None):
+        from .db import get_async_engine
+
+        async with get_async_engine().connect() as conn:
+            collection_id = await conn.run_sync(self._collection)
+            if collection_id is None:
+                return []
+            rows = (await conn.execute(
+                fts_search_sql(collection_id, vector_param=ASYNC_VECTOR_PARAM),
+                {"vector": _vector_literal(vector), "text": query, "k": k or self.k},
+            )).all()
+        return _scored(rows)
+
+
+class LocalRetriever:
+    """Same interface as `VectorRetriever`, served in-process by a `LocalVectorStore`."""
+
+    def __init__(self, vector_store, k: int = 3):
+        self.vector_store = vector_store
+        self.k = k
+
+    def search(self, query: str, vector=None, k: int = None, exact: bool = False, timings: dict = None):
+        if vector is None:
+            vector = self.vector_store.embeddings.embed_query(query)
+        t0 = time.perf_counter()
+        results = self.vector_store.similarity_search_with_score_by_vector(vector, k=k or self.k)
+        if timings is not None:
+            timings["vector_ms"] = _elapsed_ms(t0)
+        return results
+
+    async def asearch(self, query: str, vector=None, k: int = None, exact: bool = False):
+        if vector is None:
+            vector = await self.vector_store.embeddings.aembed_query(query)
+        return self.search(query, vector=vector, k=k)
+
+    def lexical_search(self, query: str, vector, k: int = None):
+        return self.vector_store.lexical_search_with_score_by_vector(query, vector, k=k or self.k)
+
+    async def alexical_search(self, query: str, vector, k: int = None):
+        return self.lexical_search(query, vector, k=k)
+
+
+# ------------------------------
+# 🔀 Hybrid (lexical + vector) retrieval
+# ------------------------------
+_lexical_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lexical")
+
+
+def _doc_key(doc):
+    return doc.id or doc.page_content
+
+
+def reciprocal_rank_fusion(result_lists, rrf_k: int = 60):
+    """Fuse ranked [(Document, distance)] lists; returns [(Document, distance, score)] best first."""
+    fused = {}
+    for results in result_lists:
+        for rank, (doc, distance) in enumerate(results):
+            key = _doc_key(doc)
+            entry = fused.setdefault(key, [doc, distance, 0.0])
+            if entry[1] is None:
+                entry[1] = distance
+            entry[2] += 1.0 / (rrf_k + rank + 1)
+    return sorted((tuple(e) for e in fused.values()), key=lambda e: e[2], reverse=True)
+
+
+def _timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    return fn(*args, **kwargs), _elapsed_ms(t0)
+
+
+class HybridRetriever:
+    """
+    Vector and full-text candidates (`candidates` each) fused with reciprocal rank
+    fusion, then optionally reranked. Same `.search` interface as the single
+    retrievers; pass a dict as `timings` to receive per-stage milliseconds.
+    A failed lexical search degrades to vector-only results.
+    """
+
+    def __init__(self, base, k: int = 3, candidates: int = 12, rrf_k: int = 60, reranker=None):
+        self.base = base
+        self.vector_store = base.vector_store
+        self.k = k
+        self.candidates = max(candidates, k)
+        self.rrf_k = rrf_k
+        self.reranker = reranker
+        self._lock = threading.Lock()
+        self.searches = 0
+        self.lexical_only = 0          # top-k results vector search alone would have missed
+        self._stage_ms = {}
+
+    def search(self, query: str, vector=None, k: int = None, exact: bool = False, timings: dict = None):
+        timings = {} if timings is None else timings
+        if vector is None:
+            vector, timings["embed_ms"] = _timed(self.vector_store.embeddings.embed_query, query)
+        lexical = _lexical_pool.submit(_timed, self.base.lexical_search, query, vector, self.candidates)
+        dense, timings["vector_ms"] = _timed(self.base.search, query, vector=vector, k=self.candidates, exact=exact)
+        try:
+            sparse, timings["lexical_ms"] = lexical.result()
+        except Exception as e:
+            print(f"⚠️ Lexical search failed, using vector results only: {e}")
+            sparse = []
+        return self._fuse(query, dense, sparse, k or self.k, timings)
+
+    async def asearch(self, query: str, vector=None, k: int = None, exact: bool = False, timings: dict = None):
+        timings = {} if timings is None else timings
+        if vector is None:
+            t0 = time.perf_counter()
+            vector = await self.vector_store.embeddings.aembed_query(query)
+            timings["embed_ms"] = _elapsed_ms(t0)
+        t0 = time.perf_counter()
+        dense, sparse = await asyncio.gather(
+            self.base.asearch(query, vector=vector, k=self.candidates, exact=exact),
+            self.base.alexical_search(query, vector, k=self.candidates),
+            return_exceptions=True,
+        )
+        timings["search_ms"] = _elapsed_ms(t0)
+        if isinstance(dense, Exception):
+            raise dense
+        if isinstance(sparse, Exception):
+            print(f"⚠️ Lexical search failed, using vector results only: {sparse}")
+            sparse = []
+        return self._fuse(query, dense, sparse, k or self.k, timings)
+
+    def _fuse(self, query, dense, sparse, k, timings):
+        t0 = time.perf_counter()
+        fused = reciprocal_rank_fusion([dense, sparse], self.rrf_k)
+        timings["fuse_ms"] = _elapsed_ms(t0)
+        if self.reranker is not None and fused:
+            t0 = time.perf_counter()
+            fused = self.reranker.rerank(query, fused)
+            timings["rerank_ms"] = _elapsed_ms(t0)
+        top = fused[:k]
+        dense_keys = {_doc_key(d) for d, _ in dense}
+        self._record(timings, sum(1 for d, _, _ in top if _doc_key(d) not in dense_keys))
+        return [(doc, distance) for doc, distance, _ in top]
+
+    def _record(self, timings, lexical_only):
+        with self._lock:
+            self.searches += 1
+            self.lexical_only += lexical_only
+            for stage, ms in timings.items():
+                total, n = self._stage_ms.get(stage, (0.0, 0))
+                self._stage_ms[stage] = (total + ms, n + 1)
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "searches": self.searches,
+                "lexical_only_hits": self.lexical_only,
+                "avg_ms": {stage: round(total / n, 2) for stage, (total, n) in self._stage_ms.items()},
+            }
+
+
+def make_retriever(vector_store, k: int = 3, hybrid: bool = None):
+    """Pick the retriever matching the configured backend (see `load_vector_store`)."""
+    from .local_index import LocalVectorStore
+
+    if isinstance(vector_store, LocalVectorStore):
+        base = LocalRetriever(vector_store, k=k)
+    else:
+        base = VectorRetriever(vector_store, k=k)
+    if not (HYBRID_SEARCH if hybrid is None else hybrid):
+        return base
+    return HybridRetriever(base, k=k, candidates=HYBRID_CANDIDATES, rrf_k=RRF_K, reranker=get_reranker(RERANKER))
+
+
+def _scored(rows):
+    return [
+        (Document(id=custom_id, page_content=doc or "", metadata=_metadata(meta)), float(distance))
+        for custom_id, doc, meta, distance in rows
+    ]
+
+
+def _metadata(value) -> dict:
+    if value is None:
+        return {}
+    return json.loads(value) if isinstance(value, str) else dict(value)
+
+
+# ------------------------------
+# 🚧 Retrieval gate
+# ------------------------------
+@dataclass
+class GateDecision:
+    sufficient: bool
+    best: Optional[float]
+    good_docs: int
+    reason: str
+
+
+class RetrievalGate:
+    """
+    Local context is sufficient when at least `min_docs` retrieved chunks are within
+    `max_distance` of the question. Best distances are kept in a rolling window and
+    their distribution is logged every `log_every` decisions to help tune thresholds.
+    """
+
+    def __init__(self, max_distance: float = RETRIEVAL_MAX_DISTANCE, min_docs: int = RETRIEVAL_MIN_DOCS,
+                 window: int = 500, log_every: int = 50):
+        self.max_distance = max_distance
+        self.min_docs = min_docs
+        self.log_every = log_every
+        self._best = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.decisions = 0
+        self.insufficient = 0
+
+    def decide(self, scored_docs) -> GateDecision:
+        distances = [score for _, score in scored_docs if score is not None]
+        best = min(distances, default=None)
+        good = sum(1 for d in distances if d <= self.max_distance)
+        if best is None:
+            decision = GateDecision(False, None, 0, "no documents retrieved")
+        elif good < self.min_docs:
+            decision = GateDecision(False, best, good, f"best distance {best:.3f} > {self.max_distance}")
+        else:
+            decision = GateDecision(True, best, good, f"{good} chunk(s) within {self.max_distance}")
+        self._record(decision)
+        return decision
+
+    def _record(self, decision: GateDecision):
+        with self._lock:
+            self.decisions += 1
+            if not decision.sufficient:
+                self.insufficient += 1
+            if decision.best is not None:
+                self._best.append(decision.best)
+            if self.log_every and self.decisions % self.log_every == 0:
+                print(f"📈 Retrieval gate: {self.distribution()}")
+
+    def distribution(self) -> dict:
+        values = sorted(self._best)
+        return {
+            "n": len(values),
+            "p10": percentile(values, 0.10),
+            "p50": percentile(values, 0.50),
+            "p90": percentile(values, 0.90),
+            "insufficient_rate": round(self.insufficient / self.decisions, 3) if self.decisions else 0.0,
+        }
@@ -0,0 +1,153 @@
+"""
+Per-question model routing for the "auto" model.
+Simple lookups are answered by Llama 3; a question goes to Nova Pro when it is long,
+asks for code, reads like a design / comparison / troubleshooting question, or the
+retrieved context is weak. A Llama 3 answer that looks poor can be regenerated on
+Nova Pro. Latency and Bedrock token usage are tracked per route.
+"""
+
+import re
+import threading
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Optional
+from .config import (
+    ROUTER_MAX_SIMPLE_WORDS,
+    ROUTER_CONFIDENT_DISTANCE,
+    ROUTER_ESCALATE,
+    ROUTER_MIN_ANSWER_WORDS,
+)
+from .tracing import percentile
+
+AUTO_MODEL = "auto"
+SIMPLE, HARD = "llama3", "nova"
+ROUTES = (SIMPLE, HARD)
+
+# Explicit code requests only: fenced code, "code snippet"-style nouns, or a verb asking for
+# code / a named language ("write a boto3 script", "give me the terraform"). Mentions of a
+# CLI flag or an SDK in a lookup question stay on the cheap route.
+_CODE_REQUEST = re.compile(
+    r"```"
+    r"|\b(code (snippet|sample|example)s?|sample code|example code)\b"
+    r"|\b(write|generate|create|implement|give me|show me|provide)\b[^.?!]{0,40}?"
+    r"\b(code|script|snippet|function|python|boto3|terraform|cloudformation|cdk|bash|sql|javascript|typescript)\b",
+    re.I,
+)
+_REASONING = re.compile(
+    r"\b(compare|comparison|versus|vs\.?|difference between|differences|trade-?offs?|pros and cons|design|"
+    r"architect\w*|migrat\w*|troubleshoot\w*|debug\w*|optimi[sz]\w*|best way|step[- ]by[- ]step|strategy)\b",
+    re.I,
+)
+_CODE_IN_ANSWER = re.compile(r"```|`[^`\n]+`|^(    |\t)\S", re.M)
+
+
+@dataclass
+class RouteDecision:
+    route: str
+    reasons: list = field(default_factory=list)
+    wants_code: bool = False
+
+    @property
+    def reason(self) -> str:
+        return ", ".join(self.reasons) or "simple lookup"
+
+
+class _RouteStats:
+    def __init__(self, window: int):
+        self.requests = 0
+        self.escalated = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.latencies = deque(maxlen=window)
+
+
+class ModelRouter:
+    """
+    Stands in for a chat model in `qa_chain`: `models` maps each route to its llm,
+    `route()` picks one per question after retrieval and `escalation_reason()` judges
+    a simple route's answer. Condensing follow-ups always uses the cheap model.
+    """
+
+    model_id = AUTO_MODEL
+
+    def __init__(self, models: dict, max_simple_words: int = ROUTER_MAX_SIMPLE_WORDS,
+                 confident_distance: float = ROUTER_CONFIDENT_DISTANCE, escalate: bool = ROUTER_ESCALATE,
+                 min_answer_words: int = ROUTER_MIN_ANSWER_WORDS, window: int = 500):
+        missing = [r for r in ROUTES if r not in models]
+        if missing:
+            raise ValueError(f"ModelRouter needs a model for every route; missing {missing}")
+        self.models = models
+        self.condense_llm = models[SIMPLE]
+        self.max_simple_words = max_simple_words
+        self.confident_distance = confident_distance
+        self.escalate = escalate
+        self.min_answer_words = min_answer_words
+        self._stats = {r: _RouteStats(window) for r in ROUTES}
+        self._reasons = Counter()
+        self._lock = threading.Lock()
+
+    def route(self, question: str, gate=None) -> RouteDecision:
+        """`gate` is the retrieval gate's decision (its `best` distance is the confidence signal)."""
+        reasons = []
+        words = len(question.split())
+        if words > self.max_simple_words:
+            reasons.append(f"long question ({words} words)")
+        wants_code = bool(_CODE_REQUEST.search(question))
+        if wants_code:
+            reasons.append("code request")
+        if _REASONING.search(question):
+            reasons.append("reasoning")
+        if question.count("?") > 1:
+            reasons.append("multi-part")
+        best = getattr(gate, "best", None)
+        if best is None:
+            reasons.append("no retrieved context")
+        elif best > self.confident_distance:
+            reasons.append(f"weak retrieval (best distance {best:.2f})")
+        decision = RouteDecision(HARD if reasons else SIMPLE, reasons, wants_code)
+        with self._lock:
+            self._reasons.update(r.split(" (")[0] for r in reasons)
+        return decision
+
+    def escalation_reason(self, decision: RouteDecision, answer: str, refused: bool = False) -> Optional[str]:
+        """Why a simple route's answer should be regenerated on the hard route, or None."""
+        if not self.escalate or decision.route != SIMPLE:
+            return None
+        if refused:
+            return "refusal"
+        words = len((answer or "").split())
+        if words < self.min_answer_words:
+            return f"short answer ({words} words)"
+        if decision.wants_code and not _CODE_IN_ANSWER.search(answer):
+            return "no code in answer"
+        return None
+
+    def record(self, route: str, latency_ms: float, usage: dict = None, escalated: bool = False):
+        """One generation on `route`: latency, Bedrock token usage, and whether it was escalated away."""
+        usage = usage or {}
+        with self._lock:
+            stats = self._stats[route]
+            stats.requests += 1
+            stats.escalated += escalated
+            stats.input_tokens += usage.get("input_tokens", 0)
+            stats.output_tokens += usage.get("output_tokens", 0)
+            stats.latencies.append(latency_ms)
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            total = sum(s.requests for s in self._stats.values())
+            routes = {}
+            for name, s in self._stats.items():
+                values = sorted(s.latencies)
+                routes[name] = {
+                    "requests": s.requests,
+                    "share": round(s.requests / total, 3) if total else 0.0,
+                    "escalated": s.escalated,
+                    "p50_ms": round(percentile(values, 0.50), 1) if values else None,
+                    "p95_ms": round(percentile(values, 0.95), 1) if values else None,
+                    "input_tokens": s.input_tokens,
+                    "output_tokens": s.output_tokens,
+                    "avg_output_tokens": round(s.output_tokens / s.requests, 1) if s.requests else 0.0,
+                }
+            return {"routes": routes, "reasons": dict(self._reasons.most_common())}
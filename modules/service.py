@@ -0,0 +1,344 @@
+"""
+Headless question answering over the shared pipelines (`pipeline.registry`).
+
+`QueryService` runs questions with at most `max_concurrency` in flight, all sharing
+the same model clients, vector store and Postgres pool. Batches are read lazily and
+results are yielded as they complete (JSONL in, JSONL out); `make_http_server()`
+exposes the same service over a small stdlib HTTP API. Batch questions are answered
+without conversation memory unless a record carries its own `session_id`.
+"""
+
+import json
+import time
+import threading
+from collections import deque
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from modules.config import (
+    QUERY_CONCURRENCY, QUERY_QUEUE_TIMEOUT_S, QUERY_DEFAULT_MODEL, DB_POOL_SIZE, DB_MAX_OVERFLOW,
+)
+from modules.models import generation_settings
+from modules.router import AUTO_MODEL, ROUTES
+from modules.tracing import percentile
+
+MODELS = ROUTES + (AUTO_MODEL,)
+_QUEUE_TIMEOUT = object()  # "use the service's queue timeout"; None means wait for a slot
+
+
+class ServiceBusy(RuntimeError):
+    """No worker slot became free within the queue timeout."""
+
+
+@dataclass
+class QueryRequest:
+    question: str
+    model: str = QUERY_DEFAULT_MODEL
+    max_tokens: int = 1024
+    temperature: float = 0.5
+    session_id: str = None
+    id: object = None
+    index: int = None
+
+    @classmethod
+    def from_record(cls, record, index: int = None, defaults: dict = None) -> "QueryRequest":
+        """
+        From a JSON object ({"question"} or {"query"} plus optional fields) or a bare string.
+        Unknown models and generation settings outside the UI's ranges raise ValueError.
+        """
+        if isinstance(record, Exception):
+            raise record
+        if isinstance(record, str):
+            record = {"question": record}
+        if not isinstance(record, dict):
+            raise ValueError("expected a JSON object or string")
+        fields = dict(defaults or {})
+        fields.update({k: v for k, v in record.items() if k in cls.__dataclass_fields__})
+        fields["question"] = str(record.get("question") or record.get("query") or "").strip()
+        if not fields["question"]:
+            raise ValueError("missing 'question'")
+        if fields.get("model", QUERY_DEFAULT_MODEL) not in MODELS:
+            raise ValueError(f"unknown model {fields['model']!r}; expected one of {list(MODELS)}")
+        fields["max_tokens"], fields["temperature"] = generation_settings(
+            fields.get("max_tokens", 1024), fields.get("temperature", 0.5)
+        )
+        fields["index"] = index
+        return cls(**fields)
+
+
+class QueryService:
+    def __init__(self, max_concurrency: int = QUERY_CONCURRENCY, queue_timeout_s: float = QUERY_QUEUE_TIMEOUT_S,
+                 registry=None):
+        if registry is None:
+            from modules.pipeline import registry
+        self.registry = registry
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_timeout_s = queue_timeout_s
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        if self.max_concurrency > DB_POOL_SIZE + DB_MAX_OVERFLOW:
+            print(f"⚠️ QUERY_CONCURRENCY={self.max_concurrency} exceeds the Postgres pool "
+                  f"({DB_POOL_SIZE}+{DB_MAX_OVERFLOW}); workers will queue on connections.")
+
+    # ---------------- slots ----------------
+    def _acquire(self, timeout):
+        if timeout is None:
+            self._slots.acquire()
+        elif not self._slots.acquire(timeout=timeout):
+            with self._lock:
+                self.rejected += 1
+            raise ServiceBusy(f"all {self.max_concurrency} workers busy for {timeout:.0f}s")
+        with self._lock:
+            self.in_flight += 1
+
+    def _release(self, started, ok):
+        with self._lock:
+            self.in_flight -= 1
+            self._latencies.append((time.perf_counter() - started) * 1000)
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+        self._slots.release()
+
+    # ---------------- answering ----------------
+    def stream(self, request: QueryRequest, timeout=_QUEUE_TIMEOUT):
+        """
+        Yield the pipeline's events for one question while holding a worker slot.
+        Waits at most `timeout` seconds for the slot (default: the queue timeout), or for
+        as long as it takes when `timeout` is None.
+        """
+        from modules.qa_chain import stream_response_with_prompt
+
+        self._acquire(self.queue_timeout_s if timeout is _QUEUE_TIMEOUT else timeout)
+        started, ok = time.perf_counter(), False
+        try:
+            pipeline = self.registry.get(request.model, request.max_tokens, request.temperature)
+            for kind, payload in stream_response_with_prompt(
+                pipeline.llm, pipeline.vector_store, request.question, session_id=request.session_id
+            ):
+                if kind == "done":
+                    ok = bool(payload.get("answer"))
+                yield kind, payload
+        finally:
+            self._release(started, ok)
+
+    def answer(self, request: QueryRequest, timeout=_QUEUE_TIMEOUT) -> dict:
+        """Answer one question; the result record carries `error` instead of raising (except ServiceBusy)."""
+        record = {"index": request.index, "id": request.id, "question": request.question, "model": request.model}
+        started, first_token = time.perf_counter(), None
+        try:
+            result = {}
+            for kind, payload in self.stream(request, timeout):
+                if kind == "token" and first_token is None:
+                    first_token = time.perf_counter()
+                elif kind == "done":
+                    result = payload
+            record.update(answer=result.get("answer", ""), sources=result.get("sources", []),
+                          trace_id=result.get("trace_id"))
+            if result.get("route"):
+                record.update(route=result["route"], route_reason=result.get("route_reason"))
+        except ServiceBusy:
+            raise
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+        record["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        if first_token is not None:
+            record["ttft_ms"] = round((first_token - started) * 1000, 1)
+        return record
+
+    def run_batch(self, records, defaults: dict = None):
+        """
+        Answer `records` (an iterable of JSON objects / strings, consumed lazily) and
+        yield result records in completion order; `index` is the input position.
+        At most 2 × max_concurrency records are read ahead.
+        """
+        pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="query")
+        pending = set()
+        try:
+            for index, record in enumerate(records):
+                try:
+                    request = QueryRequest.from_record(record, index, defaults)
+                except (TypeError, ValueError) as e:
+                    yield {"index": index, "error": f"invalid record: {e}"}
+                    continue
+                pending.add(pool.submit(self.answer, request, None))
+                if len(pending) >= 2 * self.max_concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from (f.result() for f in done)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from (f.result() for f in done)
+        finally:
+            for f in pending:
+                f.cancel()
+            pool.shutdown(wait=True)
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+        stats.update(p50_ms=_round(percentile(latencies, 0.50)), p95_ms=_round(percentile(latencies, 0.95)))
+        return stats
+
+
+def _round(value):
+    return round(value, 1) if value is not None else None
+
+
+def parse_jsonl(lines):
+    """
+    JSONL records; a line that isn't JSON is taken as a bare question, blank lines are
+    skipped and a malformed object is passed on as a ValueError (reported per record).
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            yield ValueError(f"malformed JSON: {e}") if line.startswith(("{", "[")) else line
+
+
+# ------------------------------
+# 🌐 HTTP API
+# ------------------------------
+class _Handler(BaseHTTPRequestHandler):
+    """
+    GET  /healthz   liveness, touches nothing
+    GET  /stats     service, pipeline registry and Postgres pool counters
+    POST /query     {"question", "model"?, "session_id"?, "stream"?} → result (NDJSON events if stream)
+    POST /batch     JSONL body → JSONL results as they complete
+    """
+
+    protocol_version = "HTTP/1.1"
+    service: QueryService = None
+    defaults: dict = None
+
+    def log_message(self, fmt, *args):
+        print(f"🌐 {self.address_string()} {fmt % args}")
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, default=str, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_stream(self, content_type="application/x-ndjson"):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_line(self, payload):
+        data = json.dumps(payload, default=str, ensure_ascii=False).encode("utf-8") + b"\n"
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _busy(self, e):
+        self._send_json(503, {"error": str(e)}, {"Retry-After": "5"})
+
+    def do_GET(self):
+        if self.path == "/healthz":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/stats":
+            from modules.db import pool_stats
+
+            self._send_json(200, {
+                "service": self.service.stats,
+                "pipelines": self.service.registry.stats,
+                "postgres": pool_stats(),
+            })
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path == "/query":
+            self._query()
+        elif self.path == "/batch":
+            self._batch()
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _query(self):
+        try:
+            record = json.loads(self._body() or b"{}")
+            request = QueryRequest.from_record(record, defaults=self.defaults)
+        except (TypeError, ValueError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        if not (isinstance(record, dict) and record.get("stream")):
+            try:
+                result = self.service.answer(request)
+            except ServiceBusy as e:
+                self._busy(e)
+                return
+            self._send_json(500 if "error" in result else 200, result)
+            return
+
+        events = self.service.stream(request)
+        try:
+            first = next(events)  # waits for a slot and builds the pipeline before any header is sent
+        except ServiceBusy as e:
+            self._busy(e)
+            return
+        except ValueError as e:  # e.g. unknown model
+            self._send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        self._start_stream()
+        try:
+            for kind, payload in _chain(first, events):
+                self._write_line({"event": kind, "data": payload})
+        except Exception as e:
+            self._write_line({"event": "error", "data": f"{type(e).__name__}: {e}"})
+        finally:
+            events.close()
+        self._end_stream()
+
+    def _batch(self):
+        lines = self._body().decode("utf-8", errors="replace").splitlines()
+        self._start_stream()
+        try:
+            for result in self.service.run_batch(parse_jsonl(lines), self.defaults):
+                self._write_line(result)
+        except Exception as e:  # headers are out: report in-band, still terminate the chunked body
+            self._write_line({"error": f"{type(e).__name__}: {e}"})
+        self._end_stream()
+
+
+def _chain(first, rest):
+    yield first
+    yield from rest
+
+
+def make_http_server(service: QueryService, host: str = "0.0.0.0", port: int = 8080, defaults: dict = None):
+    handler = type("QueryHandler", (_Handler,), {"service": service, "defaults": defaults or {}})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
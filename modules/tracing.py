@@ -0,0 +1,276 @@
+"""
+Lightweight per-request tracing.
+
+`trace()` opens a request; `span()` times a stage inside whichever trace is current
+(a no-op outside one), so library code can be instrumented unconditionally. Use
+`submit()` to hand work to a thread pool with the current span as its parent.
+Finished traces are kept in a small ring buffer for the Streamlit debug panel and
+exported as JSON lines and/or OpenTelemetry spans (`TRACE_EXPORT=json,otel`).
+"""
+
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+TRACE_EXPORT = {e.strip() for e in os.getenv("TRACE_EXPORT", "").lower().split(",") if e.strip()}
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", "")        # JSON lines file; empty = stdout
+TRACE_BUFFER = int(os.getenv("TRACE_BUFFER", "200"))    # finished traces kept for the debug panel
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "aws-rag-app")
+
+_current = contextvars.ContextVar("rag_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start", "end", "attrs", "status")
+
+    def __init__(self, trace, name, parent_id, attrs):
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.end = None
+        self.attrs = dict(attrs)
+        self.status = "ok"
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def fail(self, exc):
+        self.status = "error"
+        self.attrs["error"] = repr(exc)[:300]
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end or time.time()) - self.start) * 1000
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "offset_ms": round((self.start - self.trace.root.start) * 1000, 2),
+            "duration_ms": round(self.duration_ms, 2),
+            "status": self.status,
+            "attrs": self.attrs,
+        }
+
+
+class _NoopSpan:
+    def set(self, **attrs):
+        pass
+
+    def fail(self, exc):
+        pass
+
+
+NOOP = _NoopSpan()
+
+
+class Trace:
+    def __init__(self, name, attrs):
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []
+        self._lock = threading.Lock()
+        self.root = self.new_span(name, None, attrs)
+
+    def new_span(self, name, parent_id, attrs) -> Span:
+        span = Span(self, name, parent_id, attrs)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "start": self.root.start,
+            "duration_ms": round(self.root.duration_ms, 2),
+            "status": self.root.status,
+            "attrs": self.root.attrs,
+            "spans": [s.to_dict() for s in spans[1:]],
+        }
+
+
+def _reset(token):
+    try:
+        _current.reset(token)
+    except ValueError:  # resumed in another context (e.g. a generator handed across threads)
+        pass
+
+
+@contextmanager
+def trace(name: str, **attrs):
+    """Start a trace; its root span is current inside the block."""
+    tr = Trace(name, attrs)
+    token = _current.set(tr.root)
+    try:
+        yield tr.root
+    except Exception as e:
+        tr.root.fail(e)
+        raise
+    finally:
+        tr.root.end = time.time()
+        _reset(token)
+        _finish(tr)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a stage under the current span; does nothing when no trace is active."""
+    parent = _current.get()
+    if parent is None:
+        yield NOOP
+        return
+    s = parent.trace.new_span(name, parent.span_id, attrs)
+    token = _current.set(s)
+    try:
+        yield s
+    except Exception as e:
+        s.fail(e)
+        raise
+    finally:
+        s.end = time.time()
+        _reset(token)
+
+
+def annotate(**attrs):
+    """Attach attributes (token counts, cache hits, ...) to the current span, if any."""
+    current = _current.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+def current_trace_id():
+    current = _current.get()
+    return current.trace.trace_id if current is not None else None
+
+
+def submit(pool, fn, *args, **kwargs):
+    """`pool.submit` that carries the current trace/span into the worker thread."""
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+# ------------------------------
+# 📤 Export + recent traces
+# ------------------------------
+_recent = deque(maxlen=TRACE_BUFFER)
+_recent_lock = threading.Lock()
+_log_lock = threading.Lock()
+_otel_tracer = None
+
+
+def _finish(tr: Trace):
+    record = tr.to_dict()
+    with _recent_lock:
+        _recent.append(record)
+    if "json" in TRACE_EXPORT:
+        _export_json(record)
+    if "otel" in TRACE_EXPORT:
+        _export_otel(tr)
+
+
+def _export_json(record):
+    line = json.dumps(record, default=str, ensure_ascii=False)
+    if not TRACE_LOG_PATH:
+        print(line)
+        return
+    with _log_lock, open(TRACE_LOG_PATH, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+def _get_otel_tracer():
+    """OpenTelemetry is optional; an OTLP exporter is set up if the SDK is installed and nothing else is."""
+    global _otel_tracer
+    if _otel_tracer is None:
+        from opentelemetry import trace as otel_trace
+
+        try:
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+            if not isinstance(otel_trace.get_tracer_provider(), TracerProvider):
+                provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+                provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+                otel_trace.set_tracer_provider(provider)
+        except ImportError:
+            pass
+        _otel_tracer = otel_trace.get_tracer(SERVICE_NAME)
+    return _otel_tracer
+
+
+def _otel_value(value):
+    return value if isinstance(value, (str, bool, int, float)) else str(value)
+
+
+def _export_otel(tr: Trace):
+    """Replay the finished trace as OpenTelemetry spans, keeping the recorded timestamps."""
+    try:
+        from opentelemetry import trace as otel_trace
+
+        tracer = _get_otel_tracer()
+    except ImportError:
+        return
+    with tr._lock:
+        spans = list(tr.spans)
+    otel_spans = {}
+    for s in spans:  # parents are always created before their children
+        parent = otel_spans.get(s.parent_id)
+        ctx = otel_trace.set_span_in_context(parent) if parent is not None else None
+        o = tracer.start_span(
+            s.name,
+            context=ctx,
+            start_time=int(s.start * 1e9),
+            attributes={k: _otel_value(v) for k, v in s.attrs.items()},
+        )
+        if s.status == "error":
+            o.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR))
+        otel_spans[s.span_id] = o
+    for s in reversed(spans):
+        otel_spans[s.span_id].end(end_time=int((s.end or s.start) * 1e9))
+
+
+def recent_traces(n: int = 20) -> list:
+    with _recent_lock:
+        return list(_recent)[-n:]
+
+
+def find_trace(trace_id: str):
+    with _recent_lock:
+        for record in reversed(_recent):
+            if record["trace_id"] == trace_id:
+                return record
+    return None
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank `q` quantile of an already sorted list, or None if it is empty."""
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))] if sorted_values else None
+
+
+def stage_summary() -> dict:
+    """count / p50 / p95 / max duration (ms) per span name over the buffered traces."""
+    durations = {}
+    for record in recent_traces(TRACE_BUFFER):
+        durations.setdefault(record["name"], []).append(record["duration_ms"])
+        for s in record["spans"]:
+            durations.setdefault(s["name"], []).append(s["duration_ms"])
+    summary = {}
+    for name, values in durations.items():
+        values.sort()
+        summary[name] = {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 0.50), 1),
+            "p95_ms": round(percentile(values, 0.95), 1),
+            "max_ms": round(values[-1], 1),
+        }
+    return summary
@@ -1,6 +1,9 @@
 import streamlit as st
 from .ui_markdown import GLOBAL_CSS, HEADER_HTML, FOOTER_HTML
 from .ui_texts import TEXTS
+from .config import DEBUG_PANEL
+from .models import MAX_TOKENS_RANGE, TEMPERATURE_RANGE
+from . import tracing
 
 def inject_global_styles():
     st.markdown(GLOBAL_CSS, unsafe_allow_html=True)
@@ -11,13 +14,53 @@ def render_header():
 def render_footer():
     st.markdown(FOOTER_HTML, unsafe_allow_html=True)
 
+MODEL_CHOICES = {"auto": "model_auto", "llama3": "model_llama", "nova": "model_nova"}
+MODEL_NAMES = {"auto": "active_auto", "llama3": "active_llama", "nova": "active_nova"}
+
 def sidebar_controls():
     with st.sidebar:
         st.markdown(f"<div class='aws-side-title'>{TEXTS['sidebar_model_settings']}</div>", unsafe_allow_html=True)
-        max_tokens = st.slider("Max tokens:", 256, 2048, 1024, step=128)
-        temperature = st.slider("Temperature:", 0.0, 1.0, 0.5, step=0.1)
+        model = st.radio(TEXTS["choose_model"], list(MODEL_CHOICES), format_func=lambda m: TEXTS[MODEL_CHOICES[m]])
+        max_tokens = st.slider("Max tokens:", MAX_TOKENS_RANGE[0], MAX_TOKENS_RANGE[1], 1024, step=MAX_TOKENS_RANGE[2])
+        temperature = st.slider("Temperature:", TEMPERATURE_RANGE[0], TEMPERATURE_RANGE[1], 0.5, step=TEMPERATURE_RANGE[2])
 
         st.markdown(f"<div class='aws-side-title'>{TEXTS['sidebar_chat_controls']}</div>", unsafe_allow_html=True)
         cleared_chat = st.button(TEXTS["sidebar_clear"])
 
-    return max_tokens, temperature, cleared_chat
+        show_traces = False
+        if DEBUG_PANEL:
+            st.markdown(f"<div class='aws-side-title'>{TEXTS['sidebar_debug']}</div>", unsafe_allow_html=True)
+            show_traces = st.toggle(TEXTS["debug_toggle"], value=False)
+
+    return model, max_tokens, temperature, cleared_chat, show_traces
+
+def render_trace_panel(trace_id):
+    """Span table for one request plus p50/p95 per stage over the recent ones."""
+    record = tracing.find_trace(trace_id) if trace_id else None
+    with st.expander(TEXTS["debug_last_trace"], expanded=False):
+        if record:
+            st.caption(f"{record['trace_id']} · {record['duration_ms']:.0f} ms · {record['attrs']}")
+            rows = [
+                {
+                    "stage": s["name"],
+                    "start_ms": s["offset_ms"],
+                    "duration_ms": s["duration_ms"],
+                    "status": s["status"],
+                    "attrs": ", ".join(f"{k}={v}" for k, v in s["attrs"].items()),
+                }
+                for s in sorted(record["spans"], key=lambda s: s["offset_ms"])
+            ]
+            st.dataframe(rows, use_container_width=True, hide_index=True)
+        summary = tracing.stage_summary()
+        if summary:
+            st.markdown(f"**{TEXTS['debug_stage_summary']}**")
+            st.dataframe([{"stage": k, **v} for k, v in summary.items()], use_container_width=True, hide_index=True)
+
+def render_router_stats(stats):
+    """Requests, latency and Bedrock tokens per route of the "auto" model."""
+    if not stats:
+        return
+    with st.expander(TEXTS["debug_routes"], expanded=False):
+        st.dataframe([{"route": r, **v} for r, v in stats["routes"].items()], use_container_width=True, hide_index=True)
+        if stats["reasons"]:
+            st.caption(", ".join(f"{reason}: {n}" for reason, n in stats["reasons"].items()))
@@ -6,18 +6,27 @@ TEXTS = {
     "sidebar_model_settings": "⚙️ Model Settings",
     "sidebar_chat_controls": "💬 Chat Controls",
     "sidebar_clear": "🗑️ Clear Chat",
+    "sidebar_debug": "🔍 Debug",
+    "debug_toggle": "Show request traces",
+    "debug_last_trace": "Last request trace",
+    "debug_stage_summary": "Stage latency (recent requests)",
 
     # Model picker
-    "choose_model": "🤖 Choose Model",
-    "model_llama": "🦙 Use Llama 3",
-    "model_nova": "⚡ Use Nova Pro",
+    "choose_model": "🤖 Model",
+    "model_auto": "🧭 Auto (routed per question)",
+    "model_llama": "🦙 Llama 3",
+    "model_nova": "⚡ Nova Pro",
+    "active_auto": "Auto routing (Llama 3 / Nova Pro)",
     "active_llama": "Meta Llama 3 8B Instruct",
     "active_nova": "Amazon Nova Pro v1",
+    "answered_by": "Answered by",
+    "debug_routes": "Model routes",
 
     # Chat
     "chat_placeholder": "Ask your AWS question here…",
-    "select_model_tip": "Select a model above to start chatting.",
     "processing_text": "is processing...",
+    "fallback_text": "🌐 Checking the latest AWS documentation…",
+    "escalate_text": "⚡ Refining the answer with Nova Pro…",
     "sources_heading": "**Sources**",
     "no_response": "No response generated.",
     "error_prefix": "**Error:**",
@@ -1,30 +1,565 @@
 import os
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFDirectoryLoader
-from langchain_community.vectorstores import PGVector
-from .config import bedrock_embeddings, PG_CONNECTION_STRING
+import time
+import queue
+import shutil
+import resource
+import hashlib
+from pathlib import Path
+from dataclasses import dataclass, field
+from sqlalchemy import text
+from .config import (
+    get_bedrock_embeddings,
+    get_query_embeddings,
+    PG_CONNECTION_STRING,
+    EMBED_DIM,
+    EMBED_QUANTIZATION,
+    EMBED_RESCORE_CANDIDATES,
+    INGEST_WORKERS,
+    INGEST_EMBED_BATCH,
+    INGEST_QUEUE_PAGES,
+    INGEST_QUEUE_BATCHES,
+    VECTOR_BACKEND,
+    LOCAL_INDEX_PATH,
+    LOCAL_INDEX_RELOAD_S,
+)
+from .db import get_engine
+from .ingest import Batch, StreamingPipeline, start_parsers, iter_pdf_chunks
+from .ann_index import ensure_ann_index, ensure_fts_index, collection_uuid, index_name, ANN_KINDS
 
 COLLECTION_NAME = "aws_docs"
+DATA_DIR = "data"
+PDF_GLOB = "**/[!.]*.pdf"
+CHUNK_SIZE = 3000
+CHUNK_OVERLAP = 300
+MANIFEST_TABLE = "rag_ingest_manifest"
+INDEX_STATE_TABLE = "rag_index_state"
+MIGRATION_TABLE = "rag_embedding_migration"
 
-def data_ingestion():
-    if not os.path.exists("data") or not os.listdir("data"):
-        raise ValueError("Please add PDF files to the `data/` folder.")
-    loader = PyPDFDirectoryLoader("data")
-    documents = loader.load()
-    chunks = RecursiveCharacterTextSplitter(chunk_size=3000, chunk_overlap=300).split_documents(documents)
-    return chunks
-
-def create_vector_store(docs):
-    PGVector.from_documents(
-        documents=docs,
-        embedding=bedrock_embeddings,
+def data_ingestion(data_dir: str = None):
+    """
+    Chunks of every PDF in data/, yielded one page at a time (nothing is loaded up front).
+    An empty or missing folder raises ValueError here, before iteration starts.
+    """
+    data_dir = data_dir or DATA_DIR
+    if not os.path.exists(data_dir) or not os.listdir(data_dir):
+        raise ValueError(f"Please add PDF files to the `{data_dir}/` folder.")
+    return _iter_chunks(data_dir)
+
+def _iter_chunks(data_dir: str):
+    for path in sorted(Path(data_dir).glob(PDF_GLOB)):
+        for chunks in iter_pdf_chunks(str(path), CHUNK_SIZE, CHUNK_OVERLAP):
+            yield from chunks
+
+def _pgvector(embeddings, **kwargs):
+    """The collection as a LangChain PGVector store on the shared pool (imported on first use)."""
+    from langchain_community.vectorstores import PGVector
+
+    return PGVector(
+        embedding_function=embeddings,
         collection_name=COLLECTION_NAME,
         connection_string=PG_CONNECTION_STRING,
+        connection=get_engine(),  # shared pool instead of a private engine per store
+        **kwargs,
     )
 
+def create_vector_store(docs, batch_size: int = None, store=None):
+    """Embed and insert `docs` (any iterable) batch by batch, into PGVector unless `store` is given."""
+    if store is None:
+        store = _pgvector(get_bedrock_embeddings())
+    batch_size = batch_size or INGEST_EMBED_BATCH
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            store.add_documents(batch)
+            batch = []
+    if batch:
+        store.add_documents(batch)
+
+LOCAL_BACKENDS = ("faiss", "numpy")
+
 def load_vector_store():
-    return PGVector(
-        embedding_function=bedrock_embeddings,
-        collection_name=COLLECTION_NAME,
-        connection_string=PG_CONNECTION_STRING,
+    if VECTOR_BACKEND in LOCAL_BACKENDS:
+        if os.path.exists(os.path.join(LOCAL_INDEX_PATH, "manifest.json")):
+            from .local_index import LocalVectorStore
+            store = LocalVectorStore(
+                LOCAL_INDEX_PATH,
+                get_query_embeddings(),
+                COLLECTION_NAME,
+                backend=VECTOR_BACKEND,
+                reload_check_s=LOCAL_INDEX_RELOAD_S,
+                rescore_candidates=EMBED_RESCORE_CANDIDATES,
+            )
+            print(f"📦 Serving {store.index.count} vectors in-process ({store.index.backend}) from {LOCAL_INDEX_PATH}.")
+            return store
+        print(f"⚠️ VECTOR_BACKEND={VECTOR_BACKEND} but no export at {LOCAL_INDEX_PATH}; using PGVector.")
+    return _pgvector(get_query_embeddings())
+
+# ------------------------------
+# ♻️ Incremental ingestion
+# ------------------------------
+@dataclass
+class IngestStats:
+    files_seen: int = 0
+    files_unchanged: int = 0
+    files_parsed: int = 0
+    files_removed: int = 0
+    files_failed: int = 0
+    chunks_skipped: int = 0
+    chunks_embedded: int = 0
+    chunks_deleted: int = 0
+    indexes: str = ""
+    timings: dict = field(default_factory=dict)
+
+    def add_time(self, stage: str, seconds: float):
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def report(self) -> str:
+        counts = (
+            f"files: {self.files_seen} seen, {self.files_parsed} parsed, "
+            f"{self.files_unchanged} unchanged, {self.files_removed} removed, {self.files_failed} failed | "
+            f"chunks: {self.chunks_embedded} embedded, {self.chunks_skipped} skipped, "
+            f"{self.chunks_deleted} deleted"
+        )
+        stages = ", ".join(f"{k}={v:.2f}s" for k, v in self.timings.items())
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return f"{counts}\n🗂️ {self.indexes}\n⏱️ {stages}\n💾 peak RSS {peak_mb:.0f} MiB"
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _chunk_id(source: str, content: str) -> str:
+    """Content-addressed chunk id: identical text from the same file keeps its id across runs."""
+    return hashlib.sha256(f"{source}\0{content}".encode("utf-8")).hexdigest()
+
+
+def _ensure_manifest(conn):
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {MANIFEST_TABLE} ("
+        " collection TEXT NOT NULL,"
+        " source TEXT NOT NULL,"
+        " file_hash TEXT NOT NULL,"
+        " updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),"
+        " PRIMARY KEY (collection, source))"
+    ))
+
+
+def _load_manifest(conn) -> dict:
+    rows = conn.execute(
+        text(f"SELECT source, file_hash FROM {MANIFEST_TABLE} WHERE collection = :c"),
+        {"c": COLLECTION_NAME},
+    )
+    return {source: file_hash for source, file_hash in rows}
+
+
+def _ensure_source_index(conn):
+    """Chunk lookups by source stay index scans however large the collection grows."""
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS rag_embedding_source_idx "
+        "ON langchain_pg_embedding (collection_id, (cmetadata->>'source'))"
+    ))
+
+
+def _load_sources(conn) -> set:
+    """Sources that have chunks stored in the collection."""
+    rows = conn.execute(
+        text(
+            "SELECT DISTINCT e.cmetadata->>'source' FROM langchain_pg_embedding e "
+            "JOIN langchain_pg_collection c ON c.uuid = e.collection_id "
+            "WHERE c.name = :c AND e.cmetadata->>'source' IS NOT NULL"
+        ),
+        {"c": COLLECTION_NAME},
     )
+    return {source for (source,) in rows}
+
+
+def _load_chunk_ids(conn, source: str) -> set:
+    """Chunk ids stored in the collection for one source."""
+    rows = conn.execute(
+        text(
+            "SELECT e.custom_id FROM langchain_pg_embedding e "
+            "JOIN langchain_pg_collection c ON c.uuid = e.collection_id "
+            "WHERE c.name = :c AND e.cmetadata->>'source' = :s"
+        ),
+        {"c": COLLECTION_NAME, "s": source},
+    )
+    return {custom_id for (custom_id,) in rows}
+
+
+def _upsert_manifest(conn, entries):
+    if not entries:
+        return
+    conn.execute(
+        text(
+            f"INSERT INTO {MANIFEST_TABLE} (collection, source, file_hash) VALUES (:c, :s, :h) "
+            "ON CONFLICT (collection, source) DO UPDATE SET file_hash = EXCLUDED.file_hash, updated_at = now()"
+        ),
+        [{"c": COLLECTION_NAME, "s": s, "h": h} for s, h in entries],
+    )
+
+
+def _delete_from_manifest(conn, sources):
+    if not sources:
+        return
+    conn.execute(
+        text(f"DELETE FROM {MANIFEST_TABLE} WHERE collection = :c AND source = :s"),
+        [{"c": COLLECTION_NAME, "s": s} for s in sources],
+    )
+
+
+def _bump_index_version(conn):
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {INDEX_STATE_TABLE} ("
+        " collection TEXT PRIMARY KEY, version BIGINT NOT NULL, updated_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+    ))
+    conn.execute(
+        text(
+            f"INSERT INTO {INDEX_STATE_TABLE} (collection, version) VALUES (:c, 1) "
+            f"ON CONFLICT (collection) DO UPDATE SET version = {INDEX_STATE_TABLE}.version + 1, updated_at = now()"
+        ),
+        {"c": COLLECTION_NAME},
+    )
+
+
+def _check_dimension(conn):
+    """Refuse to mix dimensions: new chunks at EMBED_DIM next to vectors of another size."""
+    row = conn.execute(
+        text("SELECT vector_dims(e.embedding) FROM langchain_pg_embedding e "
+             "JOIN langchain_pg_collection c ON c.uuid = e.collection_id "
+             "WHERE c.name = :c AND vector_dims(e.embedding) <> :d LIMIT 1"),
+        {"c": COLLECTION_NAME, "d": EMBED_DIM},
+    ).fetchone()
+    if row:
+        raise ValueError(
+            f"'{COLLECTION_NAME}' stores {row[0]}-dim vectors but EMBED_DIM={EMBED_DIM}; "
+            "run `python build_index.py --migrate` (or --rebuild) first."
+        )
+
+
+def get_index_version() -> int:
+    """Monotonic counter bumped whenever ingestion changes the collection (0 if never indexed)."""
+    try:
+        with get_engine().connect() as conn:
+            row = conn.execute(
+                text(f"SELECT version FROM {INDEX_STATE_TABLE} WHERE collection = :c"), {"c": COLLECTION_NAME}
+            ).fetchone()
+        return row[0] if row else 0
+    except Exception:
+        return 0
+
+
+def incremental_ingestion(rebuild: bool = False, workers: int = None, batch_size: int = None,
+                          reindex: bool = False, purge: bool = False) -> IngestStats:
+    """
+    Sync `data/` into the collection, embedding only what changed.
+
+    Files whose sha256 matches the manifest are not even parsed. Changed and new files
+    are parsed page by page in worker processes and their chunks streamed through
+    bounded queues to the embedder and writer (see `ingest`), so memory stays flat:
+    only the list of stored sources is loaded up front, and a file's stored chunk ids
+    are fetched while it is being parsed. Only chunk ids not already stored are
+    embedded. Chunks of removed files and stale chunks of changed files are deleted. Finally the ANN index is created, or
+    rebuilt when its parameters changed, the collection was rebuilt or `reindex` is set,
+    along with the full-text index used by hybrid retrieval.
+
+    A `data/` folder without PDFs raises ValueError, since syncing it would delete every
+    indexed file; pass `purge` (or `rebuild`) to empty the collection deliberately.
+    """
+    started = time.perf_counter()
+    paths = [str(p) for p in sorted(Path(DATA_DIR).glob(PDF_GLOB)) if p.is_file()]
+    if not paths and not (purge or rebuild):
+        raise ValueError(f"Please add PDF files to the `{DATA_DIR}/` folder (or pass --purge to empty the index).")
+
+    stats = IngestStats()
+    workers = workers or INGEST_WORKERS
+    batch_size = batch_size or INGEST_EMBED_BATCH
+    engine = get_engine()
+    store = _pgvector(get_bedrock_embeddings(), pre_delete_collection=rebuild)
+
+    # 1) Hash files on disk and diff them against the manifest
+    t0 = time.perf_counter()
+    on_disk = {path: _file_sha256(path) for path in paths}
+    stats.files_seen = len(on_disk)
+    with engine.begin() as conn:
+        _ensure_manifest(conn)
+        _ensure_source_index(conn)
+        if rebuild:
+            conn.execute(text(f"DELETE FROM {MANIFEST_TABLE} WHERE collection = :c"), {"c": COLLECTION_NAME})
+        manifest = _load_manifest(conn)
+        stored_sources = _load_sources(conn)
+        if not rebuild:
+            _check_dimension(conn)
+    to_parse = {s: h for s, h in on_disk.items() if manifest.get(s) != h}
+    stats.files_unchanged = stats.files_seen - len(to_parse)
+    removed = [s for s in set(manifest) | stored_sources if s not in on_disk]
+    stats.add_time("hash+diff", time.perf_counter() - t0)
+
+    # 2) Drop chunks of files that no longer exist, one file at a time
+    t0 = time.perf_counter()
+    for source in removed:
+        if source not in stored_sources:
+            continue
+        with engine.connect() as conn:
+            stale = _load_chunk_ids(conn, source)
+        if stale:
+            store.delete(ids=list(stale), collection_only=True)
+            stats.chunks_deleted += len(stale)
+    with engine.begin() as conn:
+        _delete_from_manifest(conn, removed)
+    stats.files_removed = len(removed)
+    stats.add_time("delete", time.perf_counter() - t0)
+
+    # Stored chunk ids of the files being parsed right now (at most one per parser)
+    stored_ids = {}
+
+    def existing_ids(source):
+        if source not in stored_ids:
+            if source in stored_sources:
+                with engine.connect() as conn:
+                    stored_ids[source] = _load_chunk_ids(conn, source)
+            else:
+                stored_ids[source] = set()
+        return stored_ids[source]
+
+    # 3) Stream changed files: parser processes → chunks → embed batches → inserts
+    def embed(texts):
+        t = time.perf_counter()
+        vectors = store.embedding_function.embed_documents(texts)
+        stats.add_time("embed", time.perf_counter() - t)
+        return vectors
+
+    def write(batch, vectors):
+        t = time.perf_counter()
+        if batch.ids:
+            store.add_embeddings(texts=batch.texts, embeddings=vectors, metadatas=batch.metadatas, ids=batch.ids)
+            stats.chunks_embedded += len(batch.ids)
+        stale_ids = [cid for _, _, stale in batch.completed for cid in stale]
+        if stale_ids:
+            store.delete(ids=stale_ids, collection_only=True)
+            stats.chunks_deleted += len(stale_ids)
+        with engine.begin() as conn:
+            _upsert_manifest(conn, [(source, file_hash) for source, file_hash, _ in batch.completed])
+        stats.add_time("write", time.perf_counter() - t)
+
+    t0 = time.perf_counter()
+    if to_parse:
+        # Parsers first, so they start before this process spins up the embed/write threads
+        out, procs, tasks = start_parsers(
+            list(to_parse.items()), min(workers, len(to_parse)), CHUNK_SIZE, CHUNK_OVERLAP, INGEST_QUEUE_PAGES
+        )
+        pipeline = StreamingPipeline(embed, write, max_batches=INGEST_QUEUE_BATCHES)
+        batch, fresh_ids, running = Batch(), {}, len(procs)
+        try:
+            while running:
+                try:
+                    kind, source, payload = out.get(timeout=1.0)
+                except queue.Empty:
+                    if pipeline.failed:
+                        pipeline.close()  # raises
+                    if not any(p.is_alive() for p in procs):
+                        print("❌ Parser processes exited unexpectedly; unfinished files will be retried next run.")
+                        break
+                    continue
+                if kind == "exit":
+                    running -= 1
+                elif kind == "chunks":
+                    existing = existing_ids(source)
+                    seen = fresh_ids.setdefault(source, set())
+                    for content, metadata in payload:
+                        cid = _chunk_id(source, content)
+                        if cid in seen:
+                            continue
+                        seen.add(cid)
+                        if cid in existing:
+                            stats.chunks_skipped += 1
+                            continue
+                        batch.texts.append(content)
+                        batch.metadatas.append(metadata)
+                        batch.ids.append(cid)
+                    if len(batch.ids) >= batch_size:
+                        pipeline.submit(batch)
+                        batch = Batch()
+                elif kind == "file":
+                    stats.files_parsed += 1
+                    seen = fresh_ids.pop(source, set())
+                    # Manifest + stale deletes are applied after this batch is written
+                    batch.completed.append((source, payload, existing_ids(source) - seen))
+                    stored_ids.pop(source)
+                    print(f"📄 Parsed {source} ({len(seen)} chunks)")
+                else:
+                    fresh_ids.pop(source, None)
+                    stored_ids.pop(source, None)
+                    stats.files_failed += 1
+                    print(f"❌ Could not parse {source}: {payload}")
+            pipeline.submit(batch)
+            pipeline.close()
+        finally:
+            for p in procs:
+                if p.is_alive():
+                    p.terminate()
+                p.join()
+    stats.add_time("parse+embed (wall)", time.perf_counter() - t0)
+    if rebuild or stats.chunks_embedded or stats.chunks_deleted:
+        with engine.begin() as conn:
+            _bump_index_version(conn)
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        stats.indexes = "; ".join([
+            ensure_ann_index(conn, COLLECTION_NAME, rebuild=rebuild or reindex),
+            ensure_fts_index(conn, COLLECTION_NAME),
+        ])
+    stats.add_time("index", time.perf_counter() - t0)
+    stats.add_time("total", time.perf_counter() - started)
+    return stats
+
+
+# ------------------------------
+# 📦 Local (FAISS / NumPy) export
+# ------------------------------
+def export_local_index(path: str = None, backend: str = None, batch_size: int = 1000,
+                       quantization: str = None) -> dict:
+    """
+    Snapshot the collection into a `LocalIndex` directory for in-process search.
+    Rows are streamed from Postgres into memory-mapped files, written next to the
+    target and swapped in once complete, so running apps reload a finished export.
+    `quantization` (default EMBED_QUANTIZATION) adds the int8 / binary search codes.
+    """
+    from .local_index import LocalIndexWriter
+
+    path = path or LOCAL_INDEX_PATH
+    quantization = quantization or EMBED_QUANTIZATION
+    backend = backend or (VECTOR_BACKEND if VECTOR_BACKEND in LOCAL_BACKENDS else "faiss")
+    version = get_index_version()
+    with get_engine().connect() as conn:
+        uuid = collection_uuid(conn, COLLECTION_NAME)
+        if uuid is None:
+            raise ValueError(f"Collection '{COLLECTION_NAME}' not found — run build_index.py first.")
+        count, dim = conn.execute(
+            text("SELECT count(*), max(vector_dims(embedding)) FROM langchain_pg_embedding WHERE collection_id = :u"),
+            {"u": uuid},
+        ).one()
+        tmp = f"{path.rstrip(os.sep)}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        writer = LocalIndexWriter(tmp, count, dim or 0)
+        rows = conn.execution_options(stream_results=True, max_row_buffer=batch_size).execute(
+            text(
+                "SELECT custom_id, document, cmetadata, embedding::text FROM langchain_pg_embedding "
+                "WHERE collection_id = :u ORDER BY custom_id"
+            ),
+            {"u": uuid},
+        )
+        for custom_id, document, metadata, vector in rows:
+            writer.add(custom_id, document or "", metadata, vector[1:-1].split(","))
+    info = writer.close(backend=backend, quantization=quantization, collection=COLLECTION_NAME, index_version=version)
+
+    old = f"{path.rstrip(os.sep)}.old-{os.getpid()}"
+    if os.path.exists(path):
+        os.replace(path, old)
+    os.replace(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+    return info
+
+
+# ------------------------------
+# 🔁 Embedding dimension migration
+# ------------------------------
+def _vector_literal(vector) -> str:
+    return "[" + ",".join(map(str, vector)) + "]"
+
+
+def migrate_embeddings(batch_size: int = None) -> dict:
+    """
+    Re-embed the stored chunks of the collection at EMBED_DIM, without re-parsing PDFs.
+
+    New vectors are staged in MIGRATION_TABLE while the app keeps searching the old
+    ones; an interrupted run resumes from what is already staged. The swap is one
+    transaction: drop the ANN index, update the vectors, rebuild the index for the new
+    dimension and bump the index version (clears answer caches, flags local exports
+    as stale). Searches wait on the table lock during the swap; restart the app with
+    the new EMBED_DIM afterwards.
+    """
+    batch_size = batch_size or INGEST_EMBED_BATCH
+    embeddings = get_bedrock_embeddings()
+    engine = get_engine()
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        uuid = collection_uuid(conn, COLLECTION_NAME)
+        if uuid is None:
+            raise ValueError(f"Collection '{COLLECTION_NAME}' not found — run build_index.py first.")
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {MIGRATION_TABLE} ("
+            " custom_id TEXT PRIMARY KEY, collection_id UUID NOT NULL, dim INT NOT NULL, embedding vector NOT NULL)"
+        ))
+        # Leftovers of a run for another collection or target dimension are useless
+        conn.execute(text(f"DELETE FROM {MIGRATION_TABLE} WHERE collection_id <> :u OR dim <> :d"),
+                     {"u": uuid, "d": EMBED_DIM})
+        total, current = conn.execute(
+            text("SELECT count(*), count(*) FILTER (WHERE vector_dims(embedding) = :d) "
+                 "FROM langchain_pg_embedding WHERE collection_id = :u"),
+            {"u": uuid, "d": EMBED_DIM},
+        ).one()
+    stats = {"rows": total, "already_current": current, "embedded": 0, "swapped": 0}
+    if total == current:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {MIGRATION_TABLE}"))
+        stats["seconds"] = round(time.perf_counter() - started, 2)
+        return stats
+
+    # 1) Stage new vectors (resumable), streaming rows that still need one
+    def stage(ids, texts):
+        vectors = embeddings.embed_documents(texts)
+        if any(len(v) != EMBED_DIM for v in vectors):
+            raise ValueError(f"Embedding model returned {len(vectors[0])} dimensions, expected {EMBED_DIM}.")
+        with engine.begin() as conn:
+            conn.execute(
+                text(f"INSERT INTO {MIGRATION_TABLE} (custom_id, collection_id, dim, embedding) "
+                     "VALUES (:id, :u, :d, CAST(:v AS vector)) ON CONFLICT (custom_id) DO UPDATE "
+                     "SET embedding = EXCLUDED.embedding, dim = EXCLUDED.dim"),
+                [{"id": i, "u": uuid, "d": EMBED_DIM, "v": _vector_literal(v)} for i, v in zip(ids, vectors)],
+            )
+        stats["embedded"] += len(ids)
+        print(f"🔁 Re-embedded {stats['embedded']}/{total - current} chunks at {EMBED_DIM} dims")
+
+    with engine.connect() as conn:
+        rows = conn.execution_options(stream_results=True, max_row_buffer=batch_size).execute(
+            text(f"SELECT e.custom_id, e.document FROM langchain_pg_embedding e "
+                 f"WHERE e.collection_id = :u AND vector_dims(e.embedding) <> :d "
+                 f"AND NOT EXISTS (SELECT 1 FROM {MIGRATION_TABLE} m WHERE m.custom_id = e.custom_id)"),
+            {"u": uuid, "d": EMBED_DIM},
+        )
+        ids, texts = [], []
+        for custom_id, document in rows:
+            ids.append(custom_id)
+            texts.append(document or "")
+            if len(ids) >= batch_size:
+                stage(ids, texts)
+                ids, texts = [], []
+        if ids:
+            stage(ids, texts)
+
+    # 2) Swap in one transaction; the old index expression can't cover the new vectors
+    with engine.begin() as conn:
+        for kind in ANN_KINDS:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index_name(COLLECTION_NAME, kind)}"))
+        stats["swapped"] = conn.execute(
+            text(f"UPDATE langchain_pg_embedding e SET embedding = m.embedding FROM {MIGRATION_TABLE} m "
+                 "WHERE e.collection_id = :u AND e.custom_id = m.custom_id AND vector_dims(e.embedding) <> :d"),
+            {"u": uuid, "d": EMBED_DIM},
+        ).rowcount
+        left = conn.execute(
+            text("SELECT count(*) FROM langchain_pg_embedding WHERE collection_id = :u AND vector_dims(embedding) <> :d"),
+            {"u": uuid, "d": EMBED_DIM},
+        ).scalar()
+        if left:
+            raise RuntimeError(f"{left} chunks were added at the old dimension during the migration; run it again.")
+        stats["index"] = ensure_ann_index(conn, COLLECTION_NAME, rebuild=True)
+        _bump_index_version(conn)
+        conn.execute(text(f"DROP TABLE {MIGRATION_TABLE}"))
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    return stats
@@ -5,21 +5,125 @@ Falls back to https://docs.aws.amazon.com/ if PGVector has no relevant info.
 """
 
 import os
+import json
+import time
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, wait
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer, NavigableString
+from .cache import DiskCache, SingleFlight, cache_key, normalize_text
+from .config import COALESCE_INFLIGHT
+from .lazy import once
+from . import tracing
 
 SERP_API_KEY = os.getenv("SERPAPI_API_KEY")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
+FETCH_DEADLINE_S = float(os.getenv("WEB_FETCH_DEADLINE_S", "8"))   # overall budget for scraping
+FETCH_TIMEOUT_S = float(os.getenv("WEB_FETCH_TIMEOUT_S", "5"))     # per-request read timeout
+FETCH_PER_HOST = int(os.getenv("WEB_FETCH_PER_HOST", "4"))          # concurrent requests per host
+
+WEB_CACHE_PATH = os.getenv("WEB_CACHE_PATH", ".cache/web.sqlite")    # empty = no caching
+WEB_CACHE_MAX_ENTRIES = int(os.getenv("WEB_CACHE_MAX_ENTRIES", "5000"))
+SEARCH_TTL_S = float(os.getenv("WEB_SEARCH_TTL_S", "86400"))        # SerpAPI results per query
+PAGE_TTL_S = float(os.getenv("WEB_PAGE_TTL_S", "21600"))            # then revalidate via ETag/Last-Modified
+
+BROWSER_HEADERS = {
+    # Use a browser-like user agent to avoid basic blocking
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/115.0.0.0 Safari/537.36"
+    )
+}
+
+# -----------------------------------------------
+# 🔌 Shared HTTP session (keep-alive, pooled)
+# -----------------------------------------------
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16)
+session.mount("https://", _adapter)
+session.mount("http://", _adapter)
+
+_fetch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="fetch")
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+
+def _host_slot(url):
+    host = urlparse(url).netloc
+    with _host_slots_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(FETCH_PER_HOST)
+        return _host_slots[host]
+
+
+# -----------------------------------------------
+# 💾 On-disk cache for search results and pages
+# -----------------------------------------------
+# Opened on the first lookup, so importing this module touches no files
+@once
+def get_search_cache():
+    return DiskCache(WEB_CACHE_PATH, max_entries=WEB_CACHE_MAX_ENTRIES, table="serp_results") if WEB_CACHE_PATH else None
+
+
+@once
+def get_page_cache():
+    return DiskCache(WEB_CACHE_PATH, max_entries=WEB_CACHE_MAX_ENTRIES, table="doc_pages") if WEB_CACHE_PATH else None
+
+# Identical searches, page fetches and summaries already in flight are joined, not repeated
+_inflight = SingleFlight(COALESCE_INFLIGHT)
+
+_stats = {
+    "search_hits": 0, "search_misses": 0, "page_hits": 0, "page_revalidated": 0, "page_misses": 0,
+    "search_coalesced": 0, "page_coalesced": 0, "groq_coalesced": 0,
+}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def cache_stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
 # -----------------------------------------------
 # 🔍 Search AWS Docs via SerpAPI (Google Engine)
 # -----------------------------------------------
 def search_aws_docs(query, site="https://docs.aws.amazon.com/"):
     """Search AWS Docs pages for a given query using SerpAPI"""
+    with tracing.span("serpapi") as sp:
+        links, shared = _inflight.do(cache_key("serp", site, normalize_text(query)), _search_aws_docs, query, site, sp)
+        if shared:
+            _count("search_coalesced")
+            sp.set(coalesced=True)
+        sp.set(links=len(links))
+        return list(links)
+
+
+def _search_aws_docs(query, site, sp):
     if not SERP_API_KEY:
         print("⚠️ SERPAPI_API_KEY missing, skipping live search.")
         return []
 
+    key = cache_key("serp", site, normalize_text(query))
+    search_cache = get_search_cache()
+    if search_cache is not None:
+        entry = search_cache.peek(key)
+        if entry and time.time() - entry[1] <= SEARCH_TTL_S:
+            _count("search_hits")
+            sp.set(cache="hit")
+            links = json.loads(entry[0])
+            print(f"💾 {len(links)} AWS Docs links from search cache.")
+            return links
+    _count("search_misses")
+    sp.set(cache="miss")
+
     url = "https://serpapi.com/search.json"
     params = {
         "engine": "google",
@@ -28,11 +132,13 @@ def search_aws_docs(query, site="https://docs.aws.amazon.com/"):
     }
 
     try:
-        res = requests.get(url, params=params, timeout=15)
+        res = session.get(url, params=params, timeout=15)
         res.raise_for_status()
         data = res.json()
         links = [r["link"] for r in data.get("organic_results", []) if "link" in r]
         print(f"🔗 Found {len(links)} AWS Docs links via SerpAPI.")
+        if search_cache is not None and links:
+            search_cache.set(key, json.dumps(links[:3]).encode("utf-8"))
         return links[:3]
     except Exception as e:
         print(f"❌ SerpAPI search failed: {e}")
@@ -42,30 +148,138 @@ def search_aws_docs(query, site="https://docs.aws.amazon.com/"):
 # -----------------------------------------------
 # 📄 Scrape AWS Docs page content
 # -----------------------------------------------
-def fetch_page_content(url):
-    """Fetch paragraphs/lists from an AWS Docs web page robustly."""
+PAGE_CHAR_BUDGET = 6000
+MAIN_CONTENT_ID = "main-col-body"  # AWS Docs article body
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "nav", "header", "footer", "aside", "form", "button"}
+
+
+def _pick_parser():
     try:
-        # Use a browser-like user agent to avoid basic blocking
-        headers = {
-            "User-Agent": (
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/115.0.0.0 Safari/537.36"
-            )
-        }
-        res = requests.get(url, headers=headers, timeout=15)
+        import lxml  # noqa: F401
+        return "lxml"
+    except ImportError:
+        return "html.parser"
+
+
+HTML_PARSER = _pick_parser()
+
+
+def extract_page_text(html, budget=PAGE_CHAR_BUDGET):
+    """
+    Extract readable text from an AWS Docs page, each text node exactly once.
+    Only the main-content container is parsed when present, boilerplate subtrees are
+    skipped, and the walk stops as soon as `budget` characters are collected.
+    """
+    soup = root = None
+    if MAIN_CONTENT_ID in html:
+        soup = BeautifulSoup(html, HTML_PARSER, parse_only=SoupStrainer(id=MAIN_CONTENT_ID))
+        root = soup if soup.contents else None
+    if root is None:
+        soup = BeautifulSoup(html, HTML_PARSER)
+        root = soup.find("main") or soup.find(attrs={"role": "main"}) or soup.body or soup
+
+    parts, size = [], 0
+    stack = [root]
+    while stack and size < budget:
+        node = stack.pop()
+        if type(node) is NavigableString:
+            text = " ".join(node.split())
+            if text:
+                parts.append(text)
+                size += len(text) + 1
+        elif getattr(node, "name", None) and node.name not in SKIP_TAGS:
+            stack.extend(reversed(node.contents))
+    soup.decompose()
+    return " ".join(parts)[:budget]
+
+
+def fetch_page_content(url, timeout=15):
+    """Fetch paragraphs/lists from an AWS Docs web page robustly (cached, revalidated)."""
+    with tracing.span("fetch_page", url=url) as sp:
+        content, shared = _inflight.do(cache_key("page", url), _fetch_page_content, url, timeout, sp)
+        if shared:
+            _count("page_coalesced")
+            sp.set(coalesced=True)
+        sp.set(chars=len(content))
+        return content
+
+
+def _fetch_page_content(url, timeout, sp):
+    key = cache_key("page", url)
+    page_cache = get_page_cache()
+    cached = page_cache.peek(key) if page_cache is not None else None
+    entry = json.loads(cached[0]) if cached else None
+    if entry and time.time() - cached[1] <= PAGE_TTL_S:
+        _count("page_hits")
+        sp.set(cache="hit")
+        return entry["text"]
+
+    headers = dict(BROWSER_HEADERS)
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    try:
+        res = session.get(url, headers=headers, timeout=(3.05, timeout))
+        if res.status_code == 304 and entry:
+            _count("page_revalidated")
+            sp.set(cache="revalidated")
+            page_cache.touch(key)
+            return entry["text"]
         res.raise_for_status()
-        soup = BeautifulSoup(res.text, "html.parser")
-        # Target paragraphs and important lists/items
-        elements = soup.find_all(["p", "li", "div"])
-        content = " ".join(el.get_text(" ", strip=True) for el in elements)
+        _count("page_misses")
+        sp.set(cache="miss", bytes=len(res.content))
+        content = extract_page_text(res.text)
         print(f"✅ Scraped {len(content)} characters from {url}")
         if len(content) < 100:
             print("⚠️ Warning: Very little content scraped, page may be JavaScript-heavy or protected.")
-        return content[:6000]
+        elif page_cache is not None:
+            page_cache.set(key, json.dumps({
+                "text": content,
+                "etag": res.headers.get("ETag"),
+                "last_modified": res.headers.get("Last-Modified"),
+            }).encode("utf-8"))
+        return content
     except Exception as e:
         print(f"❌ Error fetching {url}: {e}")
-        return ""
+        sp.fail(e)
+        # A stale copy beats nothing when the docs site is slow or down
+        return entry["text"] if entry else ""
+
+
+def fetch_pages(urls, deadline_s=None):
+    """
+    Scrape `urls` concurrently over the shared session. Returns (url, text) pairs in
+    input order for the pages that finished within the overall deadline; slower
+    pages are dropped rather than waited for.
+    """
+    with tracing.span("scrape", pages=len(urls)) as sp:
+        pages = _fetch_pages(urls, FETCH_DEADLINE_S if deadline_s is None else deadline_s)
+        sp.set(fetched=len(pages))
+        return pages
+
+
+def _fetch_pages(urls, deadline_s):
+    deadline = time.monotonic() + deadline_s
+
+    def task(url):
+        slot = _host_slot(url)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not slot.acquire(timeout=remaining):
+            return ""
+        try:
+            remaining = deadline - time.monotonic()
+            return fetch_page_content(url, timeout=min(FETCH_TIMEOUT_S, max(remaining, 0.1)))
+        finally:
+            slot.release()
+
+    futures = [(u, tracing.submit(_fetch_pool, task, u)) for u in urls]
+    done, pending = wait([f for _, f in futures], timeout=max(0.0, deadline - time.monotonic()))
+    if pending:
+        print(f"⏱️ {len(pending)} page(s) missed the {deadline_s:.0f}s scrape deadline.")
+        tracing.annotate(missed_deadline=len(pending))
+    return [(u, f.result()) for u, f in futures if f in done and f.result()]
+
 
 # -----------------------------------------------
 # ⚡ Optional: Summarize scraped text via Groq
@@ -74,7 +288,15 @@ def summarize_with_groq(text):
     """Use Groq API to summarize scraped AWS Docs text"""
     if not GROQ_API_KEY:
         return text[:6000]
+    with tracing.span("groq", input_chars=len(text)) as sp:
+        summary, shared = _inflight.do(cache_key("groq", text), _summarize_with_groq, text, sp)
+        if shared:
+            _count("groq_coalesced")
+            sp.set(coalesced=True)
+        return summary
+
 
+def _summarize_with_groq(text, sp):
     try:
         url = "https://api.groq.com/openai/v1/chat/completions"
         headers = {"Authorization": f"Bearer {GROQ_API_KEY}"}
@@ -86,11 +308,15 @@ def summarize_with_groq(text):
             ],
             "temperature": 0.3,
         }
-        res = requests.post(url, headers=headers, json=payload, timeout=30)
+        res = session.post(url, headers=headers, json=payload, timeout=30)
         res.raise_for_status()
-        summary = res.json()["choices"][0]["message"]["content"]
+        data = res.json()
+        summary = data["choices"][0]["message"]["content"]
+        usage = data.get("usage") or {}
+        sp.set(input_tokens=usage.get("prompt_tokens"), output_tokens=usage.get("completion_tokens"))
         print("🧩 Groq summary complete.")
         return summary
     except Exception as e:
         print(f"⚠️ Groq summarization failed: {e}")
+        sp.fail(e)
         return text[:6000]
\ No newline at end of file
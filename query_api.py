@@ -0,0 +1,79 @@
+"""
+Answer questions without the Streamlit UI, sharing one set of pipelines.
+
+    python query_api.py batch questions.jsonl [-o answers.jsonl] [--concurrency 4] [--model auto]
+    python query_api.py serve [--host 0.0.0.0] [--port 8080] [--concurrency 4]
+
+Batch input is JSONL ({"question": ..., "id"?, "model"?, "session_id"?} or a plain
+question per line; "-" reads stdin). Answers are written as JSONL in completion order,
+each carrying its input `index`. `serve` exposes POST /query, POST /batch, GET /stats
+and GET /healthz (see modules/service.py).
+"""
+
+import sys
+import time
+import json
+import argparse
+from modules.config import QUERY_CONCURRENCY, QUERY_DEFAULT_MODEL
+from modules.service import QueryService, make_http_server, parse_jsonl
+
+
+def _batch(args, service, defaults):
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    sink = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    t0, done = time.perf_counter(), 0
+    try:
+        for result in service.run_batch(parse_jsonl(source), defaults):
+            sink.write(json.dumps(result, default=str, ensure_ascii=False) + "\n")
+            sink.flush()
+            done += 1
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    elapsed = time.perf_counter() - t0
+    print(f"✅ {done} answers in {elapsed:.1f} s ({done / elapsed if elapsed else 0:.2f} q/s). "
+          f"{service.stats}", file=sys.stderr)
+    print(f"🔧 Pipelines: {service.registry.stats}", file=sys.stderr)
+
+
+def _serve(args, service, defaults):
+    server = make_http_server(service, args.host, args.port, defaults)
+    print(f"🌐 Query API on http://{args.host}:{args.port} (concurrency {service.max_concurrency})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=QUERY_CONCURRENCY,
+                        help="questions answered at once (default: QUERY_CONCURRENCY)")
+    parser.add_argument("--model", default=QUERY_DEFAULT_MODEL, help="default model for records without one")
+    parser.add_argument("--max-tokens", type=int, default=1024)
+    parser.add_argument("--temperature", type=float, default=0.5)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch = commands.add_parser("batch", help="answer a JSONL file of questions")
+    batch.add_argument("input", help="JSONL questions, or - for stdin")
+    batch.add_argument("-o", "--output", default="-", help="JSONL answers (default: stdout)")
+
+    serve = commands.add_parser("serve", help="run the HTTP API")
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, default=8080)
+
+    args = parser.parse_args()
+    service = QueryService(max_concurrency=args.concurrency)
+    defaults = {"model": args.model, "max_tokens": args.max_tokens, "temperature": args.temperature}
+    if args.command == "batch":
+        _batch(args, service, defaults)
+    else:
+        _serve(args, service, defaults)
+
+
+if __name__ == "__main__":
+    main()